@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -28,6 +29,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'example.middleware.PerformanceMiddleware',  # Outermost so it times the whole request
+    'example.middleware.CompressionMiddleware',  # Inside PerformanceMiddleware so it records bytes on the wire
+    'example.middleware.LoadSheddingMiddleware',  # Refuses writes before they reach the database
+    'example.middleware.ReplicaStickinessMiddleware',  # Before anything that reads the database
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS Middleware
@@ -38,6 +43,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+ROOT_URLCONF = 'api.urls'
+
+# Requests issuing more SQL statements than this are logged as warnings
+QUERY_BUDGET = 25
+
+# /api/_metrics answers scrapers from these addresses, and anyone sending
+# "Authorization: Bearer <METRICS_TOKEN>" when the variable is set
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Set to False in production
 # Example for production setup:
@@ -45,6 +60,94 @@ CORS_ALLOW_ALL_ORIGINS = True  # Set to False in production
 #     "https://your-production-domain.com",
 # ]
 
+# REST framework settings
+REST_FRAMEWORK = {
+    # Keyset pagination on (created_at, id); no OFFSET scans or COUNT(*)
+    'DEFAULT_PAGINATION_CLASS': 'example.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # Bearer JWTs for API clients; sessions still work for the browsable API
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'example.authentication.CachedJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    # orjson-encoded JSON by default; MessagePack for Accept/Content-Type: application/msgpack
+    'DEFAULT_RENDERER_CLASSES': [
+        'example.renderers.FastJSONRenderer',
+        'example.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'example.parsers.FastJSONParser',
+        'example.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Token buckets for views with a throttle_scope in RATE_LIMIT['RATES']
+    'DEFAULT_THROTTLE_CLASSES': ['example.ratelimit.TokenBucketThrottle'],
+    # Anonymous clients are throttled by address. Behind N reverse proxies the
+    # client is the Nth address from the end of X-Forwarded-For; with 0 the
+    # header, which anyone can send, is ignored in favour of REMOTE_ADDR.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'SIGNING_KEY': SECRET_KEY,
+}
+
+# In-process cache of authenticated users (see example.authentication)
+PRINCIPAL_CACHE = {
+    'MAX_ENTRIES': 4096,
+    'TIMEOUT': 60,
+    'DENYLIST_REFRESH': 30,
+}
+
+# Response cache for read-heavy viewsets (see example.cache). The local
+# backend is per worker, invalidations included: after a write, other workers
+# may serve their cached copy for up to TIMEOUT seconds. Use
+# 'example.cache.DjangoCacheBackend' with OPTIONS {'alias': ...} to share
+# entries and invalidations between workers through a Django cache.
+RESPONSE_CACHE = {
+    'BACKEND': 'example.cache.LocalLRUBackend',
+    'OPTIONS': {'max_entries': 1024},
+    'TIMEOUT': 300,
+}
+
+# Responses of at least MIN_SIZE bytes are gzipped (see
+# example.middleware.CompressionMiddleware)
+COMPRESSION = {
+    'MIN_SIZE': 1024,
+}
+
+# Token-bucket limits on writes, per throttle_scope and user (or client IP for
+# anonymous requests); 'N/period' holds N tokens and refills N per period. The
+# buckets live in a memory-mapped file shared by every worker on the host (see
+# example.ratelimit). Creating users hashes a password, so it gets the
+# strictest limit.
+RATE_LIMIT = {
+    'BACKEND': 'example.ratelimit.SharedMemoryBuckets',
+    'OPTIONS': {'slots': 65536},
+    'RATES': {
+        'users': '20/hour',
+        'token': '30/min',
+        'feedback': '30/min',
+        'healthdata': '120/min',
+    },
+}
+
+# Per-worker overload limits past which writes are refused with 503 (see
+# example.middleware.LoadSheddingMiddleware). MAX_IN_FLIGHT only matters for
+# threaded or ASGI workers.
+LOAD_SHEDDING = {
+    'MAX_IN_FLIGHT': 64,
+    'P99_SECONDS': 2.5,
+    'WINDOW': 10,
+    'MIN_SAMPLES': 50,
+    'RETRY_AFTER': 5,
+}
+
 # Security settings
 SECURE_SSL_REDIRECT = not DEBUG  # Redirect all HTTP traffic to HTTPS in production
 SECURE_BROWSER_XSS_FILTER = True
@@ -62,11 +165,16 @@ CSRF_TRUSTED_ORIGINS = [
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 # ASGI settings
-ASGI_APPLICATION = 'calmBackend.asgi.application'
+ASGI_APPLICATION = 'api.asgi.application'
 
+# Every room batch for this process reaches its chat hub (example.chat.RoomHub)
+# through one channel; past 'capacity' waiting batches new ones are dropped and
+# counted in calm_ws_dropped_total. Channels' default of 100 is too small for a
+# busy process.
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        'BACKEND': 'example.layers.MeteredInMemoryChannelLayer',
+        'CONFIG': {'capacity': 1000},
     },
 }
 
@@ -88,9 +196,14 @@ TEMPLATES = [
 ]
 
 # WSGI settings
-WSGI_APPLICATION = 'calmBackend.wsgi.application'
+WSGI_APPLICATION = 'api.wsgi.app'
 
 # Database configuration (MySQL)
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before reuse.
+# Under ASGI each request runs its queries on a fresh thread, so set
+# DB_CONN_MAX_AGE=0 there instead of leaving idle connections behind.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -99,8 +212,31 @@ DATABASES = {
         'PASSWORD': '',  # MySQL password
         'HOST': '127.0.0.1',  # Database host
         'PORT': '3306',  # MySQL port
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# Read replicas: DB_REPLICA_HOSTS=host1,host2 adds "replica1", "replica2", ...
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+
+# DB_SQLITE_DIR=<dir> stands in for the above locally: <dir>/db.sqlite3 is the
+# primary, and "replica" is a read-only connection to the same file, so a
+# write routed to the replica fails instead of passing unnoticed.
+if os.environ.get('DB_SQLITE_DIR'):
+    SQLITE_PATH = Path(os.environ['DB_SQLITE_DIR']).resolve() / 'db.sqlite3'
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': SQLITE_PATH,
+                    'CONN_MAX_AGE': DB_CONN_MAX_AGE, 'CONN_HEALTH_CHECKS': True},
+        'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'file:{SQLITE_PATH}?mode=ro',
+                    'CONN_MAX_AGE': DB_CONN_MAX_AGE, 'CONN_HEALTH_CHECKS': True, 'TEST': {'MIRROR': 'default'}},
+    }
+
+# Safe reads made while serving requests go to these aliases (see example.db_router)
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['example.db_router.ReplicaRouter']
+# After a write, keep the client on the primary for this long (replication lag budget)
+REPLICA_PIN_SECONDS = 5
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -118,4 +254,8 @@ USE_TZ = True
 
 # Static files
 STATIC_URL = '/static/'
+
+# Uploaded files; profile picture thumbnails are cached under MEDIA_ROOT / 'thumbnails'
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,4 @@
+"""Settings for ``manage.py test``: the production settings, minus what the test client cannot satisfy."""
+from .settings import *  # noqa: F401,F403
+
+SECURE_SSL_REDIRECT = False
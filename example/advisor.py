@@ -0,0 +1,136 @@
+import re
+import time
+
+# Plan findings, worst first
+FULL_SCAN = 'full scan'
+INDEX_WALK = 'index walk'
+SORT = 'sort'
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?( USING (?:COVERING )?INDEX (\w+))?')
+SQLITE_SEARCH = re.compile(r'^SEARCH (?:TABLE )?"?(\w+)"?(?: AS \w+)? USING (?:COVERING )?(?:INDEX (\w+)|INTEGER PRIMARY KEY)')
+POSTGRES_NODE = re.compile(r'(Seq Scan|Index Scan|Index Only Scan|Bitmap Index Scan)(?: Backward)?(?: using (\w+))? on (\w+)')
+
+
+class Statement:
+    """A SELECT captured while serving a request, with the parameters it ran with."""
+
+    def __init__(self, alias, sql, params):
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+
+
+class StatementRecorder:
+    """``execute_wrapper`` keeping each distinct SELECT with its first parameters."""
+
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT') and sql not in self.statements:
+            self.statements[sql] = Statement(context['connection'].alias, sql, params)
+        return execute(sql, params, many, context)
+
+
+def explain(connection, sql, params):
+    """
+    The plan for ``sql`` as ``(table, finding or None, index used or None, detail)`` rows.
+
+    Only SQLite, MySQL/MariaDB and PostgreSQL plans are understood.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [_sqlite_step(row[-1]) for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}', params)
+        if connection.vendor == 'mysql':
+            names = [column[0].lower() for column in cursor.description]
+            return [_mysql_step(dict(zip(names, row))) for row in cursor.fetchall()]
+        if connection.vendor == 'postgresql':
+            return [_postgres_step(row[0]) for row in cursor.fetchall()]
+    raise NotImplementedError(f'No plan parser for {connection.vendor}')
+
+
+def _sqlite_step(detail):
+    if 'TEMP B-TREE' in detail:
+        return None, SORT, None, detail
+    match = SQLITE_SCAN.match(detail)
+    if match:
+        table, using, index = match.groups()
+        return table, INDEX_WALK if using else FULL_SCAN, index, detail
+    match = SQLITE_SEARCH.match(detail)
+    if match:
+        return match.group(1), None, match.group(2), detail
+    return None, None, None, detail
+
+
+def _mysql_step(row):
+    access, extra = row.get('type'), row.get('extra') or ''
+    finding = FULL_SCAN if access == 'ALL' else INDEX_WALK if access == 'index' else None
+    if finding is None and 'filesort' in extra:
+        finding = SORT
+    detail = f"type={access} key={row.get('key')} rows={row.get('rows')} {extra}".strip()
+    return row.get('table'), finding, row.get('key'), detail
+
+
+def _postgres_step(line):
+    match = POSTGRES_NODE.search(line)
+    if match:
+        node, index, table = match.groups()
+        return table, FULL_SCAN if node == 'Seq Scan' else None, index, line.strip()
+    if line.strip().lstrip('-> ').startswith('Sort '):
+        return None, SORT, None, line.strip()
+    return None, None, None, line.strip()
+
+
+def table_indexes(connection, table):
+    """``{name: [columns]}`` for every index on ``table`` in the live database."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return {name: info['columns'] for name, info in constraints.items() if info['index'] or info['primary_key']}
+
+
+def covering_index(indexes, columns):
+    """The name of an index whose leading columns are ``columns``, or None."""
+    for name, indexed in indexes.items():
+        if indexed[:len(columns)] == list(columns):
+            return name
+    return None
+
+
+def suggest_columns(model, filters, ordering):
+    """
+    Columns for a composite index serving equality ``filters`` then ``ordering``.
+
+    ``filters`` and ``ordering`` are model field names (``-`` prefixes are
+    ignored); the primary key is appended as the keyset tiebreaker.
+    """
+    columns = []
+    for name in [*filters, *(field.lstrip('-') for field in ordering), model._meta.pk.name]:
+        column = model._meta.get_field(name).column
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+def time_statement(connection, statement, repeat):
+    """Median seconds to run and fetch ``statement`` over ``repeat`` runs."""
+    samples = []
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(statement.sql, statement.params)
+            cursor.fetchall()
+            samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def analyze(connection, table):
+    """Refresh the planner's statistics for ``table``."""
+    quoted = connection.ops.quote_name(table)
+    statement = f'ANALYZE TABLE {quoted}' if connection.vendor == 'mysql' else f'ANALYZE {quoted}'
+    with connection.cursor() as cursor:
+        cursor.execute(statement)
+        if connection.vendor == 'mysql':
+            cursor.fetchall()
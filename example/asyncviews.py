@@ -0,0 +1,123 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured, ValidationError as DjangoValidationError
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.permissions import BasePermission
+
+from . import views
+from .fastpath import compile_serializer
+from .renderers import FastJSONRenderer
+
+
+class AsyncReadView(View):
+    """
+    Native async ``list``/``retrieve`` for a read-heavy viewset.
+
+    The viewset's queryset, serializer, ``filterset_fields`` and paginator
+    are reused; rows come from the async ORM (``aiterator``/``aget``) and
+    go through the fast-path converters, so the response body matches the
+    sync endpoint. Under ASGI the event loop is free while the database
+    works, and a process can hold many requests in flight.
+
+    The viewset's authenticators, permission classes and ``get_queryset()``
+    apply as on the sync endpoint; they run in a worker thread, as they may
+    query the database. Only exact matches on ``filterset_fields`` plus
+    ``cursor``/``page_size`` are supported; searches, ``?near=`` and the
+    other extras stay on the sync endpoints, as does the response cache.
+    """
+    viewset = None
+    http_method_names = ['get', 'head', 'options']
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        self.fast = compile_serializer(self.viewset.serializer_class)
+        if self.fast is None:
+            raise ImproperlyConfigured(f'{self.viewset.__name__} has no fast-path serializer.')
+
+    async def get(self, request, pk=None):
+        action = 'list' if pk is None else 'retrieve'
+        viewset = self.viewset(action_map={'get': action, 'head': action}, args=(),
+                               kwargs={} if pk is None else {'pk': pk}, format_kwarg=None)
+        request = viewset.request = viewset.initialize_request(request)
+        try:
+            queryset = await sync_to_async(self.authorize)(viewset, request)
+            queryset = self.filter_queryset(queryset, request.query_params)
+            if pk is not None:
+                return self.render(await self.retrieve(viewset, request, queryset, pk))
+            return self.render(await self.list(request, queryset))
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            response = self.render(detail, status=exc.status_code)
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                # As APIView.handle_exception: 401 needs a challenge, otherwise it is a 403
+                challenge = viewset.get_authenticate_header(request)
+                if challenge:
+                    response['WWW-Authenticate'] = challenge
+                else:
+                    response.status_code = exceptions.PermissionDenied.status_code
+            return response
+
+    @staticmethod
+    def authorize(viewset, request):
+        """Authenticate, check the viewset's permissions and return its queryset."""
+        viewset.perform_authentication(request)
+        viewset.check_permissions(request)
+        return viewset.get_queryset()
+
+    async def retrieve(self, viewset, request, queryset, pk):
+        try:
+            row = await self.fast.values(queryset).aget(pk=pk)
+        except queryset.model.DoesNotExist:
+            raise NotFound('No %s matches the given query.' % queryset.model._meta.object_name)
+        if any(type(permission).has_object_permission is not BasePermission.has_object_permission
+               for permission in viewset.get_permissions()):
+            # Object checks need the model instance, not the fast-path row
+            await sync_to_async(viewset.check_object_permissions)(request, await queryset.aget(pk=pk))
+        return self.fast.to_representation([row])[0]
+
+    async def list(self, request, queryset):
+        paginator = self.viewset.pagination_class()
+        field, _ = paginator.get_ordering(request, queryset, self)
+        page_queryset = paginator.get_page_queryset(self.fast.values(queryset, extra=(field, 'id')), request, self)
+        if page_queryset is None:
+            return self.fast.to_representation([row async for row in self.fast.values(queryset).aiterator()])
+        paginator.set_page([row async for row in page_queryset.aiterator()])
+        return paginator.get_paginated_response(self.fast.to_representation(paginator.page)).data
+
+    def filter_queryset(self, queryset, params):
+        """Exact-match filtering on the viewset's ``filterset_fields``."""
+        for name in getattr(self.viewset, 'filterset_fields', ()):
+            if name not in params:
+                continue
+            field = queryset.model._meta.get_field(name)
+            target = field.target_field if field.is_relation else field
+            try:
+                value = target.to_python(params[name])
+            except DjangoValidationError:
+                raise ValidationError({name: ['Enter a valid value.']})
+            if field.choices and value not in dict(field.flatchoices):
+                raise ValidationError({name: [f'Select a valid choice. {value} is not one of the available choices.']})
+            queryset = queryset.filter(**{field.attname: value})
+        return queryset
+
+    @staticmethod
+    def render(data, status=200):
+        return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+class AsyncProfessionalView(AsyncReadView):
+    viewset = views.ProfessionalViewSet
+
+
+class AsyncClinicView(AsyncReadView):
+    viewset = views.ClinicViewSet
+
+
+class AsyncAppointmentView(AsyncReadView):
+    viewset = views.AppointmentViewSet
+
+
+class AsyncHealthDataView(AsyncReadView):
+    viewset = views.HealthDataViewSet
@@ -0,0 +1,210 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken, User
+
+DEFAULTS = {
+    'MAX_ENTRIES': 4096,
+    # Bounds how long another worker can keep serving a changed or deleted user
+    'TIMEOUT': 60,
+    # How often each worker picks up tokens revoked by other workers
+    'DENYLIST_REFRESH': 30,
+}
+
+
+class PrincipalCache:
+    """
+    In-process TTL cache of ``User`` rows keyed by the token's user id.
+
+    Callers get a copy, so a view mutating ``request.user`` cannot change what
+    the next request sees. ``forget`` is called from the ``User`` save and
+    delete signals; it also bumps ``generation`` so a lookup that started
+    before the change does not store the stale row afterwards.
+    """
+
+    def __init__(self, max_entries=4096, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._entries.get(user_id)
+            if item is None:
+                return None
+            expires, user = item
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        return copy.copy(user)
+
+    def set(self, user_id, user, generation):
+        if self.timeout <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[user_id] = (time.monotonic() + self.timeout, copy.copy(user))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+class Denylist:
+    """
+    The ids (``jti``) of revoked tokens that have not expired yet.
+
+    Each worker keeps the set in memory and reads only rows added since its
+    last refresh, at most every ``refresh_interval`` seconds, so checking a
+    token costs no query. Tokens revoked in this worker apply immediately;
+    other workers see them within one interval. Entries are dropped once the
+    token would have been rejected as expired anyway.
+    """
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._expiry = {}
+        self._last_id = 0
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        self.refresh()
+        return jti in self._expiry
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expiry[jti] = expires_at.timestamp()
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._checked is not None and now - self._checked < self.refresh_interval:
+            return
+        with self._lock:
+            self._checked = now
+            rows = (RevokedToken.objects.filter(id__gt=self._last_id).order_by('id')
+                    .values_list('id', 'jti', 'expires_at'))
+            for pk, jti, expires_at in rows:
+                self._expiry[jti] = expires_at.timestamp()
+                self._last_id = pk
+            cutoff = time.time()
+            for jti in [jti for jti, expires in self._expiry.items() if expires < cutoff]:
+                del self._expiry[jti]
+
+    def clear(self):
+        with self._lock:
+            self._expiry.clear()
+            self._last_id = 0
+            self._checked = None
+
+
+_principals = None
+_denylist = None
+
+
+def get_principal_cache():
+    global _principals
+    if _principals is None:
+        config = {**DEFAULTS, **getattr(settings, 'PRINCIPAL_CACHE', {})}
+        _principals = PrincipalCache(config['MAX_ENTRIES'], config['TIMEOUT'])
+    return _principals
+
+
+def get_denylist():
+    global _denylist
+    if _denylist is None:
+        config = {**DEFAULTS, **getattr(settings, 'PRINCIPAL_CACHE', {})}
+        _denylist = Denylist(config['DENYLIST_REFRESH'])
+    return _denylist
+
+
+@receiver(setting_changed)
+def reset_caches(setting, **kwargs):
+    global _principals, _denylist
+    if setting == 'PRINCIPAL_CACHE':
+        _principals = _denylist = None
+
+
+def forget_principal(user_id):
+    get_principal_cache().forget(user_id)
+
+
+def revoke(token):
+    """Denylist a validated token until it expires."""
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    jti = token[api_settings.JTI_CLAIM]
+    RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+    RevokedToken.objects.filter(expires_at__lt=datetime.now(dt_timezone.utc)).delete()
+    get_denylist().add(jti, expires_at)
+
+
+def check_not_revoked(token):
+    if token.get(api_settings.JTI_CLAIM) in get_denylist():
+        raise InvalidToken('Token has been revoked.')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Bearer JWT authentication for ``example.User``.
+
+    The signature and expiry are checked locally, the token id against the
+    in-process denylist, and the user comes from the principal cache, so a
+    client that is already known authenticates without touching the database.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The API's accounts are example.User, not the admin's AUTH_USER_MODEL
+        self.user_model = User
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        check_not_revoked(token)
+        return token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        principals = get_principal_cache()
+        user = principals.get(user_id)
+        if user is None:
+            generation = principals.generation
+            user = super().get_user(validated_token)
+            principals.set(user_id, user, generation)
+        return user
+
+
+def user_for_token(raw_token):
+    """The user a raw access token authenticates, or an ``AnonymousUser``."""
+    backend = CachedJWTAuthentication()
+    try:
+        return backend.get_user(backend.get_validated_token(raw_token))
+    except (AuthenticationFailed, TokenError):
+        return AnonymousUser()
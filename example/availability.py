@@ -0,0 +1,62 @@
+from datetime import timedelta
+from itertools import groupby
+
+from .models import Appointment
+
+
+def free_intervals(busy, window_start, window_end):
+    """
+    Sweep ``busy`` ``(start, end)`` pairs, sorted by start, and return the
+    gaps left inside ``[window_start, window_end)``.
+
+    Overlapping and touching appointments are merged as the sweep advances,
+    so the cost is linear in the number of appointments.
+    """
+    free = []
+    cursor = window_start
+    for start, end in busy:
+        if start > cursor:
+            free.append((cursor, min(start, window_end)))
+        cursor = max(cursor, end)
+        if cursor >= window_end:
+            return free
+    free.append((cursor, window_end))
+    return free
+
+
+def split_slots(intervals, length):
+    """Cut free intervals into back-to-back slots of ``length``, dropping remainders."""
+    slots = []
+    for start, end in intervals:
+        while start + length <= end:
+            slots.append((start, start + length))
+            start += length
+    return slots
+
+
+def availability(professional_ids, window_start, window_end, slot_minutes=None):
+    """
+    Return ``{professional_id: [(start, end), ...]}`` of free time in the window.
+
+    All appointments for the given professionals are read with a single range
+    query ordered by ``(professional, start_time)`` and merged per professional.
+    """
+    professional_ids = list(professional_ids)
+    rows = (
+        Appointment.objects.blocking()
+        .overlapping(window_start, window_end)
+        .filter(professional_id__in=professional_ids)
+        .order_by('professional_id', 'start_time')
+        .values_list('professional_id', 'start_time', 'end_time')
+    )
+
+    free = {
+        professional_id: free_intervals(((start, end) for _, start, end in group), window_start, window_end)
+        for professional_id, group in groupby(rows.iterator(), key=lambda row: row[0])
+    }
+    result = {pk: free.get(pk, [(window_start, window_end)]) for pk in professional_ids}
+
+    if slot_minutes:
+        length = timedelta(minutes=slot_minutes)
+        result = {pk: split_slots(intervals, length) for pk, intervals in result.items()}
+    return result
@@ -0,0 +1,211 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import override_settings
+
+
+@contextmanager
+def throwaway_database(verbosity=0):
+    """
+    Run the block against a freshly created test database.
+
+    Benchmarks generate large synthetic tables, so they never touch the
+    configured database; the copy is destroyed afterwards. Replica routing
+    is switched off, as the replica aliases still point at the real data.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        with override_settings(DATABASE_REPLICAS=[]):
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of ``samples`` (``q`` in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    return {
+        'n': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# Rows per model at --scale 1; everything else is derived from these
+BASE_COUNTS = {
+    'users': 20_000,
+    'profiles': 10_000,
+    'professionals': 1_000,
+    'clinics': 5_000,
+    'health_data': 2_000_000,
+    'assessments': 200_000,
+    'appointments': 300_000,
+    'feedback': 50_000,
+    'chat_messages': 200_000,
+}
+FIRST_NAMES = ['Ada', 'Ben', 'Cleo', 'Dev', 'Eli', 'Fay', 'Gus', 'Hana', 'Ivo', 'Jun', 'Kai', 'Lena', 'Milo', 'Noor']
+LAST_NAMES = ['Okafor', 'Park', 'Quinn', 'Rossi', 'Silva', 'Tanaka', 'Usman', 'Vega', 'Weber', 'Xu', 'Young']
+SPECIALIZATIONS = ['Therapist', 'Psychiatrist', 'Counselor', 'Psychologist', 'Social Worker']
+MOODS = ['Calm', 'Happy', 'Anxious', 'Sad', 'Tired', 'Irritable', 'Hopeful']
+SYMPTOMS = ['', '', 'Headache', 'Insomnia', 'Fatigue', 'Nausea', 'Restlessness']
+STATUSES = ['scheduled'] * 6 + ['completed'] * 3 + ['cancelled']
+
+
+def scaled_counts(scale):
+    return {name: max(1, int(count * scale)) for name, count in BASE_COUNTS.items()}
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let ``bulk_create`` keep the ``created_at``/``updated_at`` values it is given."""
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seed_dataset(counts, rng, batch_size=5000, days=365, log=None):
+    """
+    Fill the database with synthetic rows using ``bulk_create``.
+
+    Timestamps are spread over the last ``days`` days and foreign keys are
+    drawn at random, so filters, cursors and rollups see realistic shapes.
+    Returns the seconds spent per model.
+    """
+    from django.utils import timezone
+
+    from . import scoring
+    from .models import (Appointment, Assessment, ChatMessage, Clinic, Feedback, HealthData, Professional, Profile,
+                         User)
+
+    now = timezone.now()
+    span = days * 86400
+
+    def when():
+        return now - timezone.timedelta(seconds=rng.randrange(span))
+
+    def insert(model, total, build):
+        started = time.perf_counter()
+        with explicit_timestamps(model):
+            for offset in range(0, total, batch_size):
+                batch = [build(offset + i) for i in range(min(batch_size, total - offset))]
+                if model is Assessment:
+                    # bulk_create skips save(), which is where assessments are scored
+                    scoring.score_assessments(batch)
+                model.objects.bulk_create(batch)
+        elapsed = time.perf_counter() - started
+        if log is not None:
+            log(f'{model._meta.verbose_name_plural}: {total:,} rows in {elapsed:.1f} s')
+        return elapsed
+
+    def user(i):
+        created = when()
+        return User(name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', email=f'user{i}@example.com',
+                    password='!', created_at=created, updated_at=created)
+
+    timings = {'users': insert(User, counts['users'], user)}
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+
+    def professional(i):
+        created = when()
+        return Professional(user_id=user_ids[i], specialization=rng.choice(SPECIALIZATIONS), bio='Seeded',
+                            created_at=created, updated_at=created)
+
+    def profile(i):
+        created = when()
+        # Profiles belong to the users after the professionals
+        return Profile(user_id=user_ids[-1 - i], bio='Seeded', location=rng.choice(LAST_NAMES) + 'ville',
+                       profile_picture='', privacy_settings='Public', created_at=created, updated_at=created)
+
+    professionals = min(counts['professionals'], len(user_ids))
+    timings['professionals'] = insert(Professional, professionals, professional)
+    timings['profiles'] = insert(Profile, min(counts['profiles'], len(user_ids)), profile)
+    professional_ids = list(Professional.objects.order_by('pk').values_list('pk', flat=True))
+
+    def clinic(i):
+        lat, lng = round(rng.uniform(24.0, 49.0), 6), round(rng.uniform(-125.0, -66.0), 6)
+        created = when()
+        return Clinic(name=f'{rng.choice(LAST_NAMES)} Clinic {i}', address=f'{i} Main St', phone='555-0100',
+                      email=f'clinic{i}@example.com', latitude=lat, longitude=lng,
+                      created_at=created, updated_at=created)
+
+    def health_data(i):
+        return HealthData(user_id=rng.choice(user_ids), mood=rng.choice(MOODS), symptoms=rng.choice(SYMPTOMS),
+                          created_at=when())
+
+    def assessment(i):
+        instrument = scoring.INSTRUMENTS[rng.choice(['PHQ-9', 'GAD-7'])]
+        # Skewed towards low answers, as real screenings are
+        answers = [min(instrument.item_max, int(rng.expovariate(1.2))) for _ in range(instrument.items)]
+        return Assessment(user_id=rng.choice(user_ids), type=instrument.name, responses=bytes(answers),
+                          created_at=when())
+
+    def appointment(i):
+        start = when().replace(minute=0, second=0, microsecond=0)
+        created = start - timezone.timedelta(days=rng.randrange(1, 30))
+        return Appointment(user_id=rng.choice(user_ids), professional_id=rng.choice(professional_ids),
+                           start_time=start, end_time=start + timezone.timedelta(minutes=50),
+                           status=rng.choice(STATUSES), created_at=created, updated_at=created)
+
+    def feedback(i):
+        return Feedback(user_id=rng.choice(user_ids), message=f'Feedback {i}', created_at=when())
+
+    def chat_message(i):
+        sender = rng.choice(user_ids[:100])
+        return ChatMessage(room=f'{sender}-{professional_ids[sender % len(professional_ids)]}', sender_id=sender,
+                           body=f'Message {i}', created_at=when())
+
+    for name, model, build in (('clinics', Clinic, clinic), ('health_data', HealthData, health_data),
+                               ('assessments', Assessment, assessment), ('appointments', Appointment, appointment),
+                               ('feedback', Feedback, feedback), ('chat_messages', ChatMessage, chat_message)):
+        timings[name] = insert(model, counts[name], build)
+    return timings
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Regressions of ``results`` against ``baseline`` (both ``bench_api`` JSON).
+
+    Latency and throughput may drift by ``tolerance`` (a fraction) before
+    they count; any rise in the mean number of queries counts.
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((name, metric, previous[metric], current[metric]))
+        if current['rps'] < previous['rps'] * (1 - tolerance):
+            regressions.append((name, 'rps', previous['rps'], current['rps']))
+        if current['queries_mean'] > previous['queries_mean'] + 0.01:
+            regressions.append((name, 'queries_mean', previous['queries_mean'], current['queries_mean']))
+    return regressions
@@ -0,0 +1,190 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+DEFAULTS = {
+    'BACKEND': 'example.cache.LocalLRUBackend',
+    'OPTIONS': {},
+    'TIMEOUT': 300,
+}
+
+
+class LocalLRUBackend:
+    """
+    In-process LRU store; entries are per worker and bounded by ``max_entries``.
+
+    Generations are per worker as well: a write handled by one worker does
+    not invalidate the others' entries, which they keep serving for up to
+    ``timeout`` seconds. Use ``DjangoCacheBackend`` where that matters.
+    """
+
+    def __init__(self, max_entries=1024, timeout=300):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, entry = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generations(self, labels):
+        return tuple(self._generations.get(label, 0) for label in labels)
+
+    def bump(self, label):
+        with self._lock:
+            self._generations[label] = self._generations.get(label, 0) + 1
+
+
+class DjangoCacheBackend:
+    """
+    Store shared through a Django cache alias (e.g. memcached or Redis), so
+    every worker sees the same entries and invalidations.
+    """
+
+    def __init__(self, alias='default', timeout=300, key_prefix='response-cache'):
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        return self.cache.get(f'{self.key_prefix}:{key}')
+
+    def set(self, key, entry):
+        self.cache.set(f'{self.key_prefix}:{key}', entry, self.timeout)
+
+    def generations(self, labels):
+        keys = [f'{self.key_prefix}:gen:{label}' for label in labels]
+        stored = self.cache.get_many(keys)
+        return tuple(stored.get(key, 0) for key in keys)
+
+    def bump(self, label):
+        key = f'{self.key_prefix}:gen:{label}'
+        # Generations must outlive the entries that embed them
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        config = {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+        _backend = import_string(config['BACKEND'])(timeout=config['TIMEOUT'], **config['OPTIONS'])
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    global _backend
+    if setting == 'RESPONSE_CACHE':
+        _backend = None
+
+
+def invalidate(model):
+    get_backend().bump(model._meta.label_lower)
+
+
+class CachedResponseMixin:
+    """
+    Cache rendered ``list``/``retrieve`` responses with strong ETags.
+
+    Keys cover the scheme, host and path (pagination links are absolute),
+    the sorted query parameters, the ``Accept`` header, the user when
+    ``cache_per_user`` is set, and a generation counter for each model in
+    ``cache_dependencies``. Saving or deleting one of those models bumps its
+    generation (see ``example.signals``), so stale entries are never served
+    again and age out of the LRU. A matching ``If-None-Match`` is answered
+    with 304 straight from the cache. HTML from the browsable API is never
+    cached, as it embeds the user's name and CSRF token.
+    """
+    cache_dependencies = ()
+    cache_per_user = False
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request) or super().retrieve(request, *args, **kwargs)
+
+    def get_cache_dependencies(self):
+        return [model._meta.label_lower for model in (self.queryset.model, *self.cache_dependencies)]
+
+    def get_response_cache_key(self, request):
+        labels = self.get_cache_dependencies()
+        params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+        scope = request.user.pk if self.cache_per_user else '*'
+        parts = (
+            request.build_absolute_uri(request.path), params, request.META.get('HTTP_ACCEPT', ''), scope,
+            list(zip(labels, get_backend().generations(labels))),
+        )
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def cached_response(self, request):
+        self._response_cache_key = None
+        if request.accepted_renderer.media_type == 'text/html':
+            return None
+        self._response_cache_key = self.get_response_cache_key(request)
+        entry = get_backend().get(self._response_cache_key)
+        if entry is None:
+            return None
+        etag, content_type, content = entry
+        if etag in self.if_none_match(request):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        self._response_cache_key = None
+        return response
+
+    @staticmethod
+    def if_none_match(request):
+        # Weak comparison: CompressionMiddleware sends the tag back as W/"..."
+        tags = (tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(','))
+        return {tag[2:] if tag.startswith('W/') else tag for tag in tags}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_response_cache_key', None)
+        if key is None or not isinstance(response, Response) or response.status_code != 200:
+            return response
+
+        response.render()
+        etag = '"%s"' % hashlib.sha256(response.content).hexdigest()[:32]
+        get_backend().set(key, (etag, response['Content-Type'], response.content))
+        response['ETag'] = etag
+        if etag in self.if_none_match(request):
+            not_modified = HttpResponseNotModified()
+            not_modified['ETag'] = etag
+            return not_modified
+        return response
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import re
+import weakref
+from collections import deque
+
+from django.db import IntegrityError, transaction
+
+from .metrics import REGISTRY
+from .models import ChatMessage, Professional
+
+logger = logging.getLogger(__name__)
+# Room names are "<user id>-<professional id>": one conversation per patient and professional
+ROOM_RE = re.compile(r'^(\d{1,18})-(\d{1,18})$')
+
+
+def parse_room(name):
+    """Return ``(user_id, professional_id)`` for a room name, or None."""
+    match = ROOM_RE.match(name or '')
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def room_name(user_id, professional_id):
+    return f'{user_id}-{professional_id}'
+
+
+def group_name(user_id, professional_id):
+    return f'chat_{user_id}_{professional_id}'
+
+
+def is_member(user, user_id, professional_id):
+    """The patient and the professional are the only members of their room."""
+    if user is None or not user.is_authenticated:
+        return False
+    if user.pk == user_id:
+        return Professional.objects.filter(pk=professional_id).exists()
+    return Professional.objects.filter(pk=professional_id, user_id=user.pk).exists()
+
+
+def save_messages(messages):
+    """Insert a batch of ``ChatMessage`` rows, one by one if the batch is rejected."""
+    try:
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create(messages)
+    except IntegrityError:
+        # Typically a sender deleted since the message arrived; keep the rest
+        for message in messages:
+            try:
+                with transaction.atomic():
+                    message.save(force_insert=True)
+            except IntegrityError:
+                logger.warning('Dropping chat message for room %s from missing sender %s',
+                               message.room, message.sender_id)
+
+
+class Outbox:
+    """
+    Bounded FIFO drained by a single task that hands everything queued so far
+    (up to ``max_batch`` items) to ``send`` in one call.
+
+    While a send is in flight new items pile up and leave together in the
+    next batch, so bursts are coalesced without adding latency when idle.
+    ``put`` never waits: it returns False once ``maxsize`` items are queued,
+    and the caller decides what to do with a consumer that cannot keep up.
+    """
+
+    def __init__(self, send, maxsize=1000, max_batch=100):
+        self.send = send
+        self.maxsize = maxsize
+        self.max_batch = max_batch
+        self._items = deque()
+        self._task = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, items):
+        if len(self._items) + len(items) > self.maxsize:
+            return False
+        self._items.extend(items)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._drain())
+        return True
+
+    async def _drain(self):
+        while self._items:
+            count = min(len(self._items), self.max_batch)
+            await self.send([self._items.popleft() for _ in range(count)])
+
+    async def flush(self):
+        """Wait until everything queued so far has been sent."""
+        if self._task is not None:
+            await self._task
+
+    async def close(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class WriteBehind:
+    """
+    Buffer rows and hand them to the async ``write`` in batches, once
+    ``max_rows`` are pending or ``max_delay`` seconds after the first one.
+
+    A failed write is logged and its rows are put back and retried
+    ``max_delay`` seconds later, so a database hiccup delays history instead
+    of losing it. After ``max_retries`` failures in a row the pending rows
+    are dropped, so an outage cannot grow the buffer without bound.
+    """
+
+    def __init__(self, write, max_rows=200, max_delay=0.5, max_retries=5):
+        self.write = write
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.rows = []
+        self.failures = 0
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.max_rows and not self.failures:
+            asyncio.ensure_future(self.flush())
+        else:
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_delay, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            rows, self.rows = self.rows, []
+            if not rows:
+                return
+            try:
+                await self.write(rows)
+            except Exception:
+                self.failures += 1
+                if self.failures > self.max_retries:
+                    logger.exception('Dropping %d buffered rows after %d failed writes', len(rows), self.failures)
+                    self.failures = 0
+                else:
+                    logger.exception('Writing %d buffered rows failed; retrying in %s s', len(rows), self.max_delay)
+                    self.rows[:0] = rows
+            else:
+                self.failures = 0
+            if self.rows:
+                self._schedule()
+
+
+class RoomHub:
+    """
+    Process-local fan-out for chat rooms.
+
+    The hub owns one channel-layer channel per process and joins each room's
+    group once, however many local sockets are in the room. A published batch
+    therefore costs the layer one send per process instead of one per socket;
+    the hub hands it to every local member's ``deliver`` from here.
+    """
+
+    def __init__(self, channel_layer):
+        self.channel_layer = channel_layer
+        self.rooms = {}
+        self.channel_name = None
+        self._reader = None
+        self._lock = asyncio.Lock()
+
+    async def join(self, group, member):
+        async with self._lock:
+            if self.channel_name is None:
+                self.channel_name = await self.channel_layer.new_channel('chat-hub.')
+        self.rooms.setdefault(group, set()).add(member)
+        # Re-adding on every join also refreshes the layer's group expiry
+        await self.channel_layer.group_add(group, self.channel_name)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.ensure_future(self._read())
+
+    async def leave(self, group, member):
+        members = self.rooms.get(group)
+        if members is None:
+            return
+        members.discard(member)
+        if not members:
+            del self.rooms[group]
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if not self.rooms and self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+    async def publish(self, group, messages):
+        await self.channel_layer.group_send(group, {'type': 'chat.batch', 'group': group, 'messages': messages})
+
+    async def _read(self):
+        while True:
+            event = await self.channel_layer.receive(self.channel_name)
+            for member in list(self.rooms.get(event['group'], ())):
+                member.deliver(event['messages'])
+
+
+_loop_locals = weakref.WeakKeyDictionary()
+
+
+def loop_local(key, factory):
+    """One ``factory()`` result per running event loop and ``key``."""
+    values = _loop_locals.setdefault(asyncio.get_running_loop(), {})
+    if key not in values:
+        values[key] = factory()
+    return values[key]
+
+
+def get_hub(channel_layer):
+    """The hub for ``channel_layer`` on the running event loop."""
+    return loop_local(('hub', id(channel_layer)), lambda: RoomHub(channel_layer))
@@ -0,0 +1,100 @@
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# One line of ``python -X importtime`` output
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)\s*$')
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def parse_importtime(stderr):
+    """
+    ``{module: (self_us, cumulative_us)}`` from ``-X importtime`` output.
+
+    Lines that are not import timings (warnings, tracebacks) are skipped.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, name = match.groups()
+        modules[name] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def by_package(modules):
+    """Seconds of import time spent in each top-level package."""
+    totals = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        totals[name.partition('.')[0]] += self_us
+    return {package: total / 1e6 for package, total in totals.items()}
+
+
+def run_probe(paths, python=None, env=None):
+    """
+    Start a fresh interpreter, import the WSGI app and serve ``paths`` once each.
+
+    Returns the child's timings plus ``wall`` (process start to exit, as seen
+    from here) and ``imports`` (the parsed ``-X importtime`` profile).
+    """
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [python or sys.executable, '-X', 'importtime', '-m', 'example.coldstart', *paths],
+        cwd=PROJECT_DIR, env={**os.environ, **(env or {})}, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if completed.returncode:
+        raise RuntimeError(f'cold-start probe failed:\n{completed.stderr[-2000:]}')
+    result = json.loads(completed.stdout.splitlines()[-1])
+    result['wall'] = wall
+    result['imports'] = parse_importtime(completed.stderr)
+    return result
+
+
+def _serve(app, path):
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '443', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost', 'HTTP_X_FORWARDED_PROTO': 'https', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'https', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    status = []
+    body = app(environ, lambda value, headers, exc_info=None: status.append(value))
+    try:
+        size = sum(len(chunk) for chunk in body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return int(status[0].split()[0]), size
+
+
+def main(paths):
+    # Runs in the child: time what a serverless cold start does, in order
+    started = time.perf_counter()
+    from api.wsgi import app
+    imported = time.perf_counter()
+    responses = []
+    for path in paths:
+        request_started = time.perf_counter()
+        status, size = _serve(app, path)
+        responses.append({'path': path, 'status': status, 'bytes': size,
+                          'seconds': time.perf_counter() - request_started})
+    print(json.dumps({
+        'import': imported - started,
+        'first_response': imported - started + responses[0]['seconds'] if responses else None,
+        'responses': responses,
+        'modules': len(sys.modules),
+    }))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,28 +1,92 @@
+import asyncio
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import DEFAULT_CHANNEL_LAYER, get_channel_layer
+
+from . import chat
+from .models import ChatMessage
+from .metrics import timed_handler
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    One conversation per ``ws/chat/<user id>-<professional id>/`` room.
+
+    Messages are published to the room in batches through the process's
+    ``RoomHub``, and each socket receives whatever has queued up for it as
+    one frame: ``{"message": ...}`` for a single message or
+    ``{"messages": [...]}`` for several. A client that lets more than
+    ``outbox_size`` messages pile up is disconnected with 1013 (try again
+    later) instead of holding memory for it.
+
+    Messages are saved as ``ChatMessage`` rows through a write-behind buffer
+    shared by the process's sockets: one ``bulk_create`` per
+    ``history_batch_size`` messages or ``history_delay`` seconds, run in the
+    database thread, and flushed whenever a socket disconnects.
+    """
+    outbox_size = 1000
+    max_batch = 100
+    dropped = False
+    # Sockets get no layer channel of their own (an unknown alias disables it);
+    # the process's RoomHub is the only reader of the room groups
+    channel_layer_alias = None
+    hub_layer_alias = DEFAULT_CHANNEL_LAYER
+    history_batch_size = 200
+    history_delay = 0.5
+
     async def connect(self):
-        self.room_group_name = 'chat_room'
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        room = chat.parse_room(self.scope['url_route']['kwargs'].get('room'))
+        if room is None or not await database_sync_to_async(chat.is_member)(self.scope.get('user'), *room):
+            await self.close(code=4403)
+            return
+
+        self.room = chat.room_name(*room)
+        self.room_group_name = chat.group_name(*room)
+        self.history = chat.loop_local('history', lambda: chat.WriteBehind(
+            database_sync_to_async(chat.save_messages), self.history_batch_size, self.history_delay))
+        self.hub = chat.get_hub(get_channel_layer(self.hub_layer_alias))
+        self.outbox = chat.Outbox(self.send_frame, self.outbox_size, self.max_batch)
+        self.publisher = chat.Outbox(self.publish, self.outbox_size, self.max_batch)
+        await self.hub.join(self.room_group_name, self)
         await self.accept()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if not hasattr(self, 'room_group_name'):
+            return
+        await self.hub.leave(self.room_group_name, self)
+        await self.publisher.flush()
+        await self.outbox.close()
+        await self.history.flush()
 
+    @timed_handler('chat', direction='in')
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         message = text_data_json['message']
+        if not isinstance(message, str):
+            await self.send(text_data=json.dumps({'error': 'Messages must be strings.'}))
+            return
+
+        self.history.add(ChatMessage(room=self.room, sender_id=self.scope['user'].pk, body=message))
+        if not self.publisher.put([message]):
+            self.drop()
+
+    async def publish(self, messages):
+        await self.hub.publish(self.room_group_name, messages)
+
+    def deliver(self, messages):
+        # Called by the hub for every batch published to this room
+        if not self.outbox.put(messages):
+            self.drop()
+
+    def drop(self):
+        if not self.dropped:
+            self.dropped = True
+            asyncio.ensure_future(self.close(code=1013))
 
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message
-            }
-        )
-
-    async def chat_message(self, event):
-        message = event['message']
-        await self.send(text_data=json.dumps({'message': message}))
+    @timed_handler('chat', direction='out')
+    async def send_frame(self, messages):
+        if len(messages) == 1:
+            await self.send(text_data=json.dumps({'message': messages[0]}))
+        else:
+            await self.send(text_data=json.dumps({'messages': messages}))
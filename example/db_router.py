@@ -0,0 +1,69 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class ReadState:
+    """
+    Routing state for one request.
+
+    ``pinned`` starts True for unsafe methods and for clients that wrote
+    recently, and flips to True at the first write; from then on every read
+    in the request goes to the primary.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_read_state', default=None)
+
+
+def activate(state):
+    return _state.set(state)
+
+
+def deactivate(token):
+    _state.reset(token)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+class ReplicaRouter:
+    """
+    Send reads made while serving a request to a random replica from
+    ``DATABASE_REPLICAS``, and everything else to the primary.
+
+    Reads stay on the primary outside requests (management commands,
+    signals fired by them), inside transactions, and for the rest of a
+    request once it has written anything, so a client always reads its own
+    writes. ``ReplicaStickinessMiddleware`` carries that last guarantee over
+    to the client's next requests.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        aliases = replicas()
+        if state is None or state.pinned or not aliases:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+import re
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .fastpath import compile_serializer
+from .permissions import IsProfessional
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Flush CSV/NDJSON output once this many characters are buffered
+FLUSH_SIZE = 64 * 1024
+# Spreadsheets run CSV cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+NUMBER = re.compile(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?')
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Accept any ``Accept`` header for file downloads (exports, pictures); the
+    file itself is written by the view, so only error payloads pass through
+    here.
+    """
+    media_type = '*/*'
+    format = 'export'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+def csv_cell(value):
+    """Defuse text a spreadsheet would evaluate; signed numbers are left as they are."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def csv_chunks(names, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for row in rows:
+        writer.writerow([csv_cell(value) for value in row])
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(names, rows):
+    parts, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(names, row)), ensure_ascii=False, separators=(',', ':'))
+        parts.append(line)
+        size += len(line) + 1
+        if size >= FLUSH_SIZE:
+            yield ('\n'.join(parts) + '\n').encode()
+            parts, size = [], 0
+    if parts:
+        yield ('\n'.join(parts) + '\n').encode()
+
+
+def file_chunks(file):
+    with file:
+        yield from iter(lambda: file.read(FLUSH_SIZE), b'')
+
+
+async def async_chunks(chunks):
+    """
+    Hand a chunk generator to an ASGI server one chunk at a time.
+
+    Django consumes a synchronous iterator under ASGI by reading it whole
+    into a list first. Each chunk is pulled here on the thread the
+    request's ORM calls run on, so batches are still read as they are sent.
+    """
+    chunks = iter(chunks)
+    done = object()
+    while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+        yield chunk
+
+
+def xlsx_file(names, rows, title):
+    """
+    Write the rows to an anonymous temporary file with openpyxl's write-only
+    workbook, which keeps one row in memory at a time.
+
+    An XLSX file is a zip archive whose directory comes last, so it has to be
+    complete before the first byte can be sent.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(names)
+    for row in rows:
+        cells = []
+        for value in row:
+            if isinstance(value, str):
+                value = ILLEGAL_CHARACTERS_RE.sub('', value)
+                if value.startswith('='):
+                    # Store user text verbatim rather than as a formula
+                    cell = WriteOnlyCell(sheet, value)
+                    cell.data_type = 's'
+                    value = cell
+            cells.append(value)
+        sheet.append(cells)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+class ExportMixin:
+    """
+    ``GET export/csv|ndjson|xlsx/`` streams every row matching the view's
+    filters, in primary key order. Professionals export across patients;
+    anyone else gets only the rows whose ``export_owner_field`` is them.
+
+    Rows are read in keyset batches of ``export_chunk_size`` and converted
+    with the fast-path converters, so values are formatted exactly as in the
+    API and memory does not grow with the table, under WSGI and ASGI alike.
+    """
+    export_chunk_size = 2000
+    export_owner_field = 'user'
+
+    @action(detail=False, methods=['get'], url_path='export/(?P<export_format>csv|ndjson|xlsx)',
+            url_name='export', renderer_classes=[JSONRenderer, ExportRenderer],
+            permission_classes=[permissions.IsAuthenticated])
+    def export(self, request, export_format):
+        queryset = self.filter_queryset(self.get_export_queryset())
+        names, rows = self.export_rows(queryset)
+        model_name = queryset.model._meta.model_name
+        filename = f'{model_name}-{timezone.now():%Y%m%d}.{export_format}'
+
+        # ASGIRequest carries the connection scope; WSGI servers iterate the response themselves
+        asgi = getattr(request._request, 'scope', None) is not None
+        if export_format == 'xlsx':
+            output = xlsx_file(names, rows, model_name)
+            if not asgi:
+                return FileResponse(output, as_attachment=True, filename=filename, content_type=CONTENT_TYPES['xlsx'])
+            # FileResponse would be read into memory as well
+            chunks = file_chunks(output)
+        elif export_format == 'csv':
+            chunks = csv_chunks(names, rows)
+        else:
+            chunks = ndjson_chunks(names, rows)
+        if asgi:
+            chunks = async_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def get_export_queryset(self):
+        queryset = self.get_queryset()
+        if IsProfessional().has_permission(self.request, self):
+            return queryset
+        return queryset.filter(**{self.export_owner_field: self.request.user})
+
+    def export_rows(self, queryset):
+        serializer_class = self.get_serializer_class()
+        fast = compile_serializer(serializer_class)
+        if fast is not None:
+            return fast.names, fast.iter_tuples(queryset, self.export_chunk_size)
+
+        # Serializers the fast path cannot compile go through DRF a batch at a time
+        serializer = serializer_class(context=self.get_serializer_context())
+        names = [name for name, field in serializer.fields.items() if not field.write_only]
+
+        def rows():
+            last = None
+            ordered = queryset.order_by('pk')
+            while True:
+                batch = list((ordered if last is None else ordered.filter(pk__gt=last))[:self.export_chunk_size])
+                if not batch:
+                    return
+                for instance in batch:
+                    data = serializer.to_representation(instance)
+                    yield tuple(data[name] for name in names)
+                last = batch[-1].pk
+        return names, rows()
@@ -0,0 +1,168 @@
+import functools
+
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Field types whose to_representation returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.ReadOnlyField,
+)
+UNSUPPORTED_FIELDS = (
+    serializers.FileField,
+    serializers.SerializerMethodField,
+    serializers.HyperlinkedRelatedField,
+    serializers.ManyRelatedField,
+    serializers.BaseSerializer,
+)
+
+
+class FastSerializer:
+    """
+    Serialize ``values_list`` tuples with converters precompiled from a
+    ``ModelSerializer``, skipping model instances and per-row field lookups.
+
+    Output matches ``ModelSerializer(many=True).data`` once rendered; only
+    flat, context-free fields are supported (see ``compile_serializer``).
+    """
+
+    def __init__(self, names, columns, factories):
+        self.names = names
+        self.columns = columns
+        self.factories = factories
+
+    def values(self, queryset, extra=()):
+        """``queryset.values()`` with the serializer's columns plus ``extra`` keys."""
+        return queryset.values(*self.columns, *(name for name in extra if name not in self.columns))
+
+    def subset(self, names):
+        """A copy that outputs only ``names``, in this serializer's order."""
+        keep = [index for index, name in enumerate(self.names) if name in names]
+        return FastSerializer([self.names[index] for index in keep], [self.columns[index] for index in keep],
+                              [self.factories[index] for index in keep])
+
+    def converters(self):
+        # Bound per call so request state such as the active timezone is honoured
+        return [factory() for factory in self.factories]
+
+    def to_representation(self, rows):
+        items = tuple(zip(self.names, self.columns, self.converters()))
+        return [
+            {name: None if row[column] is None else convert(row[column]) for name, column, convert in items}
+            for row in rows
+        ]
+
+    def iter_tuples(self, queryset, chunk_size=2000):
+        """
+        Iterate converted rows as tuples in ``names`` order, ``chunk_size`` at a time.
+
+        Batches are keyed on ``pk`` rather than one long cursor so memory stays
+        flat on backends that buffer whole result sets (MySQL without
+        server-side cursors).
+        """
+        queryset = queryset.order_by('pk').values_list('pk', *self.columns)
+        # Bound now: a streamed response iterates after the view has returned
+        converters = self.converters()
+
+        def rows():
+            last = None
+            while True:
+                batch = list((queryset if last is None else queryset.filter(pk__gt=last))[:chunk_size])
+                if not batch:
+                    return
+                for pk, *row in batch:
+                    yield tuple(None if value is None else convert(value) for convert, value in zip(converters, row))
+                last = batch[-1][0]
+        return rows()
+
+
+def _passthrough(value):
+    return value
+
+
+def _passthrough_factory():
+    return _passthrough
+
+
+def _datetime_factory(field):
+    """
+    Mirror ``DateTimeField.to_representation`` for ISO 8601 output, with the
+    timezone looked up once per call rather than once per row.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return lambda: field.to_representation
+
+    def factory():
+        tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+        def convert(value):
+            if isinstance(value, str):
+                return value
+            if tz is not None:
+                value = value.astimezone(tz) if timezone.is_aware(value) else field.enforce_timezone(value)
+            text = value.isoformat()
+            return text[:-6] + 'Z' if text.endswith('+00:00') else text
+        return convert
+    return factory
+
+
+@functools.lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    """
+    Build a ``FastSerializer`` for ``serializer_class`` or return None when a
+    field needs a model instance or request context.
+    """
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    names, columns, factories = [], [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, UNSUPPORTED_FIELDS) or field.source == '*' or '.' in field.source:
+            return None
+        model_field = model._meta.get_field(field.source)
+        if isinstance(field, PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                return None
+            factory = _passthrough_factory
+        elif type(field) in PASSTHROUGH_FIELDS:
+            factory = _passthrough_factory
+        elif type(field) is serializers.DateTimeField:
+            factory = _datetime_factory(field)
+        else:
+            factory = functools.partial(getattr, field, 'to_representation')
+        names.append(name)
+        columns.append(model_field.attname)
+        factories.append(factory)
+    return FastSerializer(names, columns, factories)
+
+
+class FastListMixin:
+    """
+    Opt-in fast path for read-only list responses.
+
+    Rows come from ``.values()`` and go through precompiled converters instead
+    of model instances and ``ModelSerializer`` machinery. Viewsets whose
+    serializer cannot be compiled fall back to the regular ``list``.
+    """
+
+    def get_fast_serializer(self):
+        return compile_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer()
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is None:
+            return Response(fast.to_representation(fast.values(queryset).iterator()))
+
+        field, _ = self.paginator.get_ordering(request, queryset, self)
+        page = self.paginator.paginate_queryset(fast.values(queryset, extra=(field, 'id')), request, view=self)
+        return self.get_paginated_response(fast.to_representation(page))
@@ -0,0 +1,22 @@
+from django_filters.rest_framework import DjangoFilterBackend
+
+
+class CachedFilterBackend(DjangoFilterBackend):
+    """
+    ``DjangoFilterBackend`` that builds each view's FilterSet class once.
+
+    django-filter generates a FilterSet class from ``filterset_fields`` on
+    every request. The fields are fixed per view, so the class is built on
+    the first request that needs it and reused afterwards.
+    """
+
+    _filterset_classes = {}
+
+    def get_filterset_class(self, view, queryset=None):
+        key = (type(view), queryset.model if queryset is not None else None)
+        try:
+            return self._filterset_classes[key]
+        except KeyError:
+            filterset_class = super().get_filterset_class(view, queryset)
+            self._filterset_classes[key] = filterset_class
+            return filterset_class
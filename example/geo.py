@@ -0,0 +1,94 @@
+import heapq
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Clinics are bucketed into a fixed lat/lng grid; the cell id is stored on the
+# row (Clinic.geo_cell) and indexed, so a radius query only touches the cells
+# overlapping its bounding box.
+CELL_DEGREES = 0.25
+LAT_CELLS = int(180 / CELL_DEGREES)
+LNG_CELLS = int(360 / CELL_DEGREES)
+
+# Above this many cells an IN list stops paying off and the query falls back
+# to the latitude/longitude bounding box alone.
+MAX_CELLS = 400
+
+
+def cell_for(lat, lng):
+    row = min(int((float(lat) + 90) // CELL_DEGREES), LAT_CELLS - 1)
+    col = int((float(lng) + 180) // CELL_DEGREES) % LNG_CELLS
+    return row * LNG_CELLS + col
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Return ``(min_lat, max_lat, lng_ranges)`` enclosing the circle.
+
+    ``lng_ranges`` is split in two when the box crosses the antimeridian and
+    covers every longitude when it reaches a pole.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    min_lat = lat - math.degrees(angular)
+    max_lat = lat + math.degrees(angular)
+    if min_lat <= -90 or max_lat >= 90 or math.sin(angular) >= math.cos(math.radians(lat)):
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+
+    delta = math.degrees(math.asin(math.sin(angular) / math.cos(math.radians(lat))))
+    west, east = lng - delta, lng + delta
+    if west < -180:
+        return min_lat, max_lat, [(west + 360, 180.0), (-180.0, east)]
+    if east > 180:
+        return min_lat, max_lat, [(west, 180.0), (-180.0, east - 360)]
+    return min_lat, max_lat, [(west, east)]
+
+
+def cells_for_box(min_lat, max_lat, lng_ranges):
+    rows = range(cell_for(min_lat, 0) // LNG_CELLS, cell_for(max_lat, 0) // LNG_CELLS + 1)
+    cols = []
+    for west, east in lng_ranges:
+        first, last = cell_for(0, west) % LNG_CELLS, cell_for(0, min(east, 180 - 1e-9)) % LNG_CELLS
+        cols.extend(range(first, last + 1))
+    if len(rows) * len(cols) > MAX_CELLS:
+        return None
+    return [row * LNG_CELLS + col for row in rows for col in cols]
+
+
+def within(queryset, lat, lng, radius_km):
+    """
+    Narrow ``queryset`` to rows inside the circle's bounding box.
+
+    Uses the indexed grid cell when the box is small enough and always adds
+    the exact latitude/longitude range so the haversine pass sees few rows.
+    """
+    min_lat, max_lat, lng_ranges = bounding_box(lat, lng, radius_km)
+    cells = cells_for_box(min_lat, max_lat, lng_ranges)
+    if cells is not None:
+        queryset = queryset.filter(geo_cell__in=cells)
+
+    lng_filter = Q()
+    for west, east in lng_ranges:
+        lng_filter |= Q(longitude__gte=west, longitude__lte=east)
+    return queryset.filter(lng_filter, latitude__gte=min_lat, latitude__lte=max_lat)
+
+
+def nearest(queryset, lat, lng, radius_km, limit):
+    """
+    Return up to ``limit`` ``(distance_km, obj)`` pairs within ``radius_km``,
+    closest first.
+    """
+    candidates = []
+    for obj in within(queryset, lat, lng, radius_km):
+        distance = haversine_km(lat, lng, float(obj.latitude), float(obj.longitude))
+        if distance <= radius_km:
+            candidates.append((distance, obj.pk, obj))
+    return [(distance, obj) for distance, _, obj in heapq.nsmallest(limit, candidates)]
@@ -0,0 +1,195 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+SIZES = (64, 256, 512)
+FORMATS = {'jpg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp')}
+# Variant names look like "256.webp"
+VARIANTS = tuple(f'{size}.{ext}' for size in SIZES for ext in FORMATS)
+# Refuse to decode anything larger; a small file can expand to gigabytes of pixels
+MAX_PIXELS = 40_000_000
+# Formats originals are kept in once stripped; anything else is stored as PNG
+ORIGINAL_FORMATS = {'JPEG': {'quality': 95}, 'PNG': {'optimize': True}, 'WEBP': {'quality': 95}}
+# Seconds a request waits for a variant being rendered before answering 503
+RENDER_WAIT = 1
+# Seconds a client should wait before asking again for a variant still rendering
+RETRY_AFTER = 5
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.RLock()
+_pending = {}
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def content_hash(file):
+    """SHA-256 of an uploaded or stored file, leaving it rewound."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(65536), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def cache_root():
+    return Path(getattr(settings, 'THUMBNAIL_ROOT', Path(settings.MEDIA_ROOT) / 'thumbnails'))
+
+
+def variant_path(digest, variant):
+    return cache_root() / digest[:2] / f'{digest}-{variant}'
+
+
+def content_type(variant):
+    return FORMATS[variant.rsplit('.', 1)[1]][1]
+
+
+def decode_clean(source):
+    """
+    Decode ``source`` into ``(image, format)``: the picture turned upright
+    from its EXIF orientation and copied into a fresh image, so no EXIF, GPS
+    or ICC data survives.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(source) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise InvalidImage('Image is too large.')
+            original_format = image.format
+            image = ImageOps.exif_transpose(image)
+            mode = 'RGBA' if image.mode in ('RGBA', 'LA') or 'transparency' in image.info else 'RGB'
+            clean = Image.new(mode, image.size)
+            clean.paste(image.convert(mode))
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise InvalidImage(str(exc))
+    return clean, original_format
+
+
+def strip_metadata(file):
+    """
+    Re-encode an uploaded picture without its metadata (location included).
+
+    Returns a ``ContentFile`` to store instead of ``file``, in the same
+    format (PNG for formats outside ``ORIGINAL_FORMATS``) and upright, so
+    clients no longer need the orientation tag.
+    """
+    file.seek(0)
+    clean, fmt = decode_clean(file)
+    name = file.name
+    if fmt not in ORIGINAL_FORMATS or (fmt == 'JPEG' and clean.mode != 'RGB'):
+        fmt = 'PNG'
+        name = f'{os.path.splitext(name)[0]}.png'
+    output = io.BytesIO()
+    clean.save(output, fmt, **ORIGINAL_FORMATS[fmt])
+    return ContentFile(output.getvalue(), name=os.path.basename(name))
+
+
+def render_variants(source, digest):
+    """
+    Decode ``source`` once and write every variant for ``digest`` to the cache.
+
+    The picture is cleaned by ``decode_clean``, then each variant is
+    center-cropped to a square; files are written under a temporary name
+    and renamed into place so readers never see partial output.
+    """
+    from PIL import Image, ImageOps
+
+    clean, _ = decode_clean(source)
+    directory = variant_path(digest, VARIANTS[0]).parent
+    directory.mkdir(parents=True, exist_ok=True)
+    for size in SIZES:
+        thumbnail = ImageOps.fit(clean, (size, size), Image.Resampling.LANCZOS)
+        for ext, (fmt, _) in FORMATS.items():
+            output = thumbnail.convert('RGB') if fmt == 'JPEG' and thumbnail.mode != 'RGB' else thumbnail
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as handle:
+                    output.save(handle, fmt, quality=85, optimize=fmt == 'JPEG', method=4)
+                os.replace(tmp, variant_path(digest, f'{size}.{ext}'))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'THUMBNAIL_WORKERS', min(4, os.cpu_count() or 1))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+        return _executor
+
+
+def submit(fn, *args):
+    """
+    Run ``fn(*args)`` on the thumbnail pool, away from the request.
+
+    Failures are logged, since nobody waits on the future, and the pool
+    thread's database connection is closed afterwards.
+    """
+    return get_executor().submit(_run_job, fn, args)
+
+
+def _run_job(fn, args):
+    from django.db import connection
+
+    try:
+        return fn(*args)
+    except Exception:
+        logger.exception('Image job %s failed', fn.__qualname__)
+        raise
+    finally:
+        connection.close()
+
+
+def ensure_variants(storage, name, digest):
+    """
+    Return a future that completes once the variants for ``digest`` exist.
+
+    Rendering happens on the thumbnail pool (Pillow releases the GIL while
+    decoding and resizing), and concurrent requests for the same picture
+    share one job.
+    """
+    with _executor_lock:
+        future = _pending.get(digest)
+        if future is None:
+            future = _pending[digest] = get_executor().submit(_render_file, storage, name, digest)
+            future.add_done_callback(lambda done: _forget(digest, done))
+    return future
+
+
+def _forget(digest, future):
+    with _executor_lock:
+        if _pending.get(digest) is future:
+            del _pending[digest]
+
+
+def _render_file(storage, name, digest):
+    with storage.open(name, 'rb') as source:
+        render_variants(source, digest)
+
+
+def get_variant(profile, variant, timeout=RENDER_WAIT):
+    """
+    Path of the cached ``variant`` for the profile's picture, rendering it on
+    first use. Raises ``concurrent.futures.TimeoutError`` if rendering takes
+    longer than ``timeout`` seconds; the job carries on in the background.
+    """
+    picture = profile.profile_picture
+    path = variant_path(profile.profile_picture_hash, variant)
+    if not path.exists():
+        ensure_variants(picture.storage, picture.name, profile.profile_picture_hash).result(timeout)
+    return path
@@ -0,0 +1,23 @@
+# Referenced only from settings.CHANNEL_LAYERS, so the WSGI entry point never imports Channels
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+from .metrics import REGISTRY
+
+
+class MeteredInMemoryChannelLayer(InMemoryChannelLayer):
+    """
+    ``InMemoryChannelLayer`` that counts the messages it drops.
+
+    A send to a channel already holding ``capacity`` messages raises
+    ``ChannelFull``, which ``group_send`` swallows, so a slow reader loses
+    room batches without a trace; each one is counted in
+    ``calm_ws_dropped_total`` instead.
+    """
+
+    async def send(self, channel, message):
+        try:
+            await super().send(channel, message)
+        except ChannelFull:
+            REGISTRY.inc('calm_ws_dropped_total', {'channel': channel.partition('.')[0]})
+            raise
@@ -0,0 +1,187 @@
+import io
+import json
+import platform
+import random
+import re
+import resource
+import time
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from example import bench
+from example.models import ChatMessage, User
+from example.urls import router
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+# Share of requests per operation, for endpoints that support it
+OPERATIONS = {'list': 0.4, 'filter': 0.25, 'detail': 0.25, 'search': 0.1}
+PAGE_SIZES = (20, 50, 100)
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database with synthetic data and replay a mixed read workload against every '
+            'router endpoint, reporting throughput, latency, queries and memory. Use DB_SQLITE_DIR to run '
+            'offline on SQLite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.05,
+                            help='Fraction of the full data set (1 = 2M health data rows, 300k appointments).')
+        parser.add_argument('--requests', type=int, default=3000, help='Requests in the measured replay.')
+        parser.add_argument('--warmup', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare with a previous --output file.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed latency/throughput drift against the baseline, as a fraction.')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        counts = bench.scaled_counts(options['scale'])
+        with bench.throwaway_database(), override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False):
+            started = time.perf_counter()
+            timings = bench.seed_dataset(counts, rng, log=self.stdout.write)
+            # Derived tables that signals keep up to date outside bulk_create
+            call_command('rebuild_search_index', stdout=io.StringIO())
+            call_command('healthdata_trends', stdout=io.StringIO())
+            seed_seconds = time.perf_counter() - started
+            self.stdout.write(f'Seeded in {seed_seconds:.1f} s')
+
+            plan = self.build_plan(rng, options['warmup'] + options['requests'])
+            client = self.make_client()
+            rss_before = self.peak_rss_mb()
+            self.replay(client, plan[:options['warmup']])
+            started = time.perf_counter()
+            samples = self.replay(client, plan[options['warmup']:])
+            wall = time.perf_counter() - started
+
+        results = {
+            'meta': {
+                'scale': options['scale'], 'requests': options['requests'], 'seed': options['seed'],
+                'database': connection.vendor, 'python': platform.python_version(), 'django': django.get_version(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            },
+            'seed': {'rows': counts, 'seconds': {name: round(value, 3) for name, value in timings.items()},
+                     'total_seconds': round(seed_seconds, 3)},
+            'overall': self.summarize([sample for rows in samples.values() for sample in rows], wall),
+            'endpoints': {name: self.summarize(rows) for name, rows in sorted(samples.items())},
+            'memory': {'peak_rss_mb_before_replay': rss_before, 'peak_rss_mb': self.peak_rss_mb()},
+        }
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                regressions = bench.compare(results, json.load(handle), options['tolerance'])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.WARNING(f'{name}: {metric} {before:.2f} -> {after:.2f}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+
+    def make_client(self):
+        # A patient with a chat room, authenticated the way API clients are
+        room = ChatMessage.objects.values_list('room', flat=True).first()
+        user = User.objects.get(pk=int(room.split('-')[0])) if room else User.objects.first()
+        return Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def build_plan(self, rng, total):
+        """``(endpoint name, path, params)`` for every request, drawn up front so runs are comparable."""
+        room = ChatMessage.objects.values_list('room', flat=True).first()
+        endpoints = []
+        for prefix, viewset, basename in router.registry:
+            if basename == 'chat-message':
+                # One room's ids are scattered, so draw from the ids themselves
+                pks = list(viewset.queryset.filter(room=room).values_list('pk', flat=True)[:1000])
+            else:
+                low, high = self.pk_range(viewset.queryset)
+                pks = range(low, high + 1) if low is not None else []
+            endpoints.append((basename, viewset, pks))
+        user_low, user_high = self.pk_range(User.objects.all())
+
+        plan = []
+        for _ in range(total):
+            basename, viewset, pks = rng.choice(endpoints)
+            kwargs = {'room': room} if basename == 'chat-message' else {}
+            operations = ['list']
+            if pks:
+                operations.append('detail')
+            if 'user' in getattr(viewset, 'filterset_fields', ()):
+                operations.append('filter')
+            if getattr(viewset, 'search_fields', None):
+                operations.append('search')
+            operation = rng.choices(operations, [OPERATIONS[name] for name in operations])[0]
+
+            if operation == 'detail':
+                path, params = reverse(f'{basename}-detail', kwargs={**kwargs, 'pk': rng.choice(pks)}), {}
+            else:
+                path, params = reverse(f'{basename}-list', kwargs=kwargs), {'page_size': rng.choice(PAGE_SIZES)}
+                if operation == 'filter':
+                    params['user'] = rng.randint(user_low, user_high)
+                elif operation == 'search':
+                    params['search'] = rng.choice(bench.LAST_NAMES + bench.SPECIALIZATIONS[:2])
+            plan.append((f'{basename}:{operation}', path, params))
+        return plan
+
+    @staticmethod
+    def pk_range(queryset):
+        pks = queryset.values_list('pk', flat=True)
+        return pks.order_by('pk').first(), pks.order_by('-pk').first()
+
+    @staticmethod
+    def replay(client, plan):
+        samples = {}
+        for name, path, params in plan:
+            started = time.perf_counter()
+            response = client.get(path, params)
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 500:
+                raise CommandError(f'{path} {params} returned {response.status_code}')
+            match = QUERIES.search(response.get('Server-Timing', ''))
+            samples.setdefault(name, []).append(
+                (elapsed, int(match.group(1)) if match else 0, len(response.content), response.status_code)
+            )
+        return samples
+
+    @staticmethod
+    def summarize(rows, wall=None):
+        latencies = [row[0] for row in rows]
+        stats = bench.summarize(latencies)
+        return {
+            'n': len(rows),
+            'rps': round(len(rows) / (wall or sum(latencies) or 1), 1),
+            'mean_ms': round(stats['mean_ms'], 3),
+            'p50_ms': round(stats['p50_ms'], 3),
+            'p99_ms': round(stats['p99_ms'], 3),
+            'queries_mean': round(sum(row[1] for row in rows) / len(rows), 2) if rows else 0,
+            'queries_max': max((row[1] for row in rows), default=0),
+            'bytes_mean': round(sum(row[2] for row in rows) / len(rows)) if rows else 0,
+            'errors': sum(1 for row in rows if row[3] >= 400),
+        }
+
+    @staticmethod
+    def peak_rss_mb():
+        # ru_maxrss is in kilobytes on Linux
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    def report(self, results):
+        self.stdout.write(f"{'endpoint':<28}{'n':>6}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+                          f"{'queries':>9}{'bytes':>9}{'4xx':>5}")
+        rows = list(results['endpoints'].items()) + [('overall', results['overall'])]
+        for name, stats in rows:
+            self.stdout.write(f"{name:<28}{stats['n']:>6}{stats['rps']:>9.1f}{stats['p50_ms']:>9.2f}"
+                              f"{stats['p99_ms']:>9.2f}{stats['queries_mean']:>9.2f}{stats['bytes_mean']:>9}"
+                              f"{stats['errors']:>5}")
+        memory = results['memory']
+        self.stdout.write(f"peak RSS {memory['peak_rss_mb']:.1f} MB "
+                          f"({memory['peak_rss_mb_before_replay']:.1f} MB before the replay)")
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from example.bench import summarize, throwaway_database
+from example.models import Appointment, Clinic, HealthData, Professional, User
+
+ENDPOINTS = ('healthdata', 'appointment', 'clinic', 'professional')
+
+
+class Command(BaseCommand):
+    help = 'Compare sync viewsets and their async variants under concurrent load through the ASGI handler.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='healthdata')
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per run.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+        parser.add_argument('--db-latency-ms', type=float, default=1.0,
+                            help='Added to every query to stand in for a network round trip to MySQL.')
+
+    def handle(self, *args, **options):
+        delay = options['db_latency_ms'] / 1000
+
+        def slow_down(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(connection, **kwargs):
+            connection.execute_wrappers.append(slow_down)
+
+        with throwaway_database(), override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False):
+            self.seed(options['rows'])
+            if delay:
+                connection_created.connect(add_latency)
+            try:
+                app = get_asgi_application()
+                for concurrency in options['concurrency']:
+                    for kind in ('sync', 'async'):
+                        prefix = 'async-' if kind == 'async' else ''
+                        path = reverse(f"{prefix}{options['endpoint']}-list")
+                        # A fresh loop rather than async_to_sync, which would pin every
+                        # request's ORM calls to this thread as a real server does not
+                        latencies, elapsed = asyncio.run(self.load(app, path, options['requests'], concurrency))
+                        stats = summarize(latencies)
+                        self.stdout.write(
+                            f"{kind:>5} x{concurrency:<4} {len(latencies) / elapsed:8,.0f} req/s, "
+                            f"p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms"
+                        )
+            finally:
+                connection_created.disconnect(add_latency)
+
+    @staticmethod
+    def seed(count, batch_size=5000):
+        user = User.objects.create(name='Bench', email='bench@example.com', password='x')
+        professional = Professional.objects.create(user=user, specialization='Therapist', bio='')
+        start = timezone.now()
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            HealthData.objects.bulk_create(HealthData(user=user, mood='Calm', symptoms='') for _ in range(size))
+            Clinic.objects.bulk_create(
+                Clinic(name=f'Clinic {offset + i}', address='1 Main St', phone='555-0100',
+                       email=f'clinic{offset + i}@example.com', latitude=40.7, longitude=-74.0)
+                for i in range(size)
+            )
+            Appointment.objects.bulk_create(
+                Appointment(user=user, professional=professional, status='scheduled',
+                            start_time=start + timezone.timedelta(hours=offset + i),
+                            end_time=start + timezone.timedelta(hours=offset + i, minutes=30))
+                for i in range(size)
+            )
+
+    async def load(self, app, path, total, concurrency):
+        latencies = []
+        remaining = [total]
+
+        async def client():
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                started = time.perf_counter()
+                status = await self.get(app, path)
+                latencies.append(time.perf_counter() - started)
+                assert status == 200, f'{path} returned {status}'
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - started
+
+    @staticmethod
+    async def get(app, path):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        requested = asyncio.Event()
+        status = []
+
+        async def receive():
+            if requested.is_set():
+                # Never disconnect; Django stops listening once the response is sent
+                await asyncio.Future()
+            requested.set()
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await app(scope, receive, send)
+        return status[0]
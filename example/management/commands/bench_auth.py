@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from example import authentication
+from example.bench import summarize, throwaway_database
+from example.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request authentication cost: session cookie, JWT, and JWT with the principal cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--path', default=None, help='Endpoint to request (default: the feedback list).')
+
+    def handle(self, *args, **options):
+        with throwaway_database(), override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False):
+            path = options['path'] or reverse('feedback-list')
+            # Sessions log in the admin's AUTH_USER_MODEL; tokens carry example.User
+            admin_user = get_user_model().objects.create_user(username='bench', password='x')
+            user = User.objects.create_user(email='bench@example.com', name='Bench', password='x')
+
+            session = Client()
+            session.force_login(admin_user)
+            bearer = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+            uncached = {'TIMEOUT': 0}
+            for name, client, principal_cache in (('session', session, {}), ('jwt', bearer, uncached),
+                                                  ('jwt_cached', bearer, {})):
+                with override_settings(PRINCIPAL_CACHE=principal_cache):
+                    self.run_case(name, client, path, options['requests'])
+
+    def run_case(self, name, client, path, count):
+        authentication.get_principal_cache().clear()
+        assert client.get(path).status_code == 200, f'{name}: {path} did not return 200'
+        samples, queries = [], 0
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                client.get(path)
+                samples.append(time.perf_counter() - start)
+            queries += len(context.captured_queries)
+        stats = summarize(samples)
+        self.stdout.write(
+            f"{name:>10}: {queries / count:.2f} queries/request, mean {stats['mean_ms']:.3f} ms, "
+            f"p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms over {count} requests"
+        )
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import random
+import time
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.core.management.base import BaseCommand
+
+from example.bench import summarize, throwaway_database
+from example.consumer import ChatConsumer
+from example.metrics import REGISTRY
+from example.models import ChatMessage, Professional, User
+
+
+class Command(BaseCommand):
+    help = 'Load-test ChatConsumer with simulated sockets (messages/sec and delivery latency).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=2000)
+        parser.add_argument('--rooms', type=int, default=100)
+        parser.add_argument('--messages', type=int, default=2000, help='Messages sent across all rooms.')
+        parser.add_argument('--rate', type=float, default=500,
+                            help='Messages sent per second; 0 sends as fast as possible.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # Runs against the configured CHANNEL_LAYERS, capacity included
+        REGISTRY.clear()
+        with throwaway_database():
+            rooms = self.seed_rooms(options['rooms'])
+            result = async_to_sync(self.run)(rooms, options['sockets'], options['messages'], options['rate'],
+                                              random.Random(options['seed']))
+            saved = ChatMessage.objects.count()
+        stats = summarize(result['latencies'])
+        self.stdout.write(
+            f"{options['sockets']} sockets in {len(rooms)} rooms: sent {options['messages']}, "
+            f"delivered {len(result['latencies'])} in {result['frames']} frames over {result['elapsed']:.2f} s "
+            f"({len(result['latencies']) / result['elapsed']:,.0f} msg/s)"
+        )
+        self.stdout.write(f"latency: mean {stats['mean_ms']:.2f} ms, p50 {stats['p50_ms']:.2f} ms, "
+                          f"p99 {stats['p99_ms']:.2f} ms; {saved} messages saved")
+        dropped = REGISTRY.get('calm_ws_dropped_total', channel='chat-hub')
+        if dropped:
+            self.stdout.write(self.style.WARNING(
+                f'{dropped:.0f} room batches dropped by the full channel layer; raise its capacity'))
+
+    @staticmethod
+    def seed_rooms(count):
+        pro_user = User.objects.create(name='Bench Pro', email='pro@example.com', password='x')
+        professional = Professional.objects.create(user=pro_user, specialization='Therapist', bio='')
+        patients = User.objects.bulk_create(
+            User(name=f'Patient {i}', email=f'patient{i}@example.com', password='x') for i in range(count)
+        )
+        return [(patient, f'{patient.pk}-{professional.pk}') for patient in patients]
+
+    async def run(self, rooms, socket_count, message_count, rate, rng):
+        sockets = []
+        for i in range(socket_count):
+            user, room = rooms[i % len(rooms)]
+            scope = {'type': 'websocket', 'path': f'/ws/chat/{room}/', 'headers': [], 'subprotocols': [],
+                     'user': user, 'url_route': {'args': (), 'kwargs': {'room': room}}}
+            communicator = ApplicationCommunicator(ChatConsumer.as_asgi(), scope)
+            await communicator.send_input({'type': 'websocket.connect'})
+            sockets.append((room, communicator))
+        for _, communicator in sockets:
+            assert (await communicator.receive_output(5))['type'] == 'websocket.accept'
+
+        members = {}
+        for room, communicator in sockets:
+            members.setdefault(room, []).append(communicator)
+        plan = [rng.choice(list(members)) for _ in range(message_count)]
+        expected = {id(c): 0 for _, c in sockets}
+        for room in plan:
+            for communicator in members[room]:
+                expected[id(communicator)] += 1
+
+        latencies, frames = [], [0]
+
+        async def drain(communicator):
+            remaining = expected[id(communicator)]
+            while remaining > 0:
+                try:
+                    event = await communicator.receive_output(30)
+                except asyncio.TimeoutError:
+                    # The rest was dropped by a full channel layer (reported in handle())
+                    return
+                now = time.perf_counter()
+                body = json.loads(event['text'])
+                batch = body['messages'] if 'messages' in body else [body['message']]
+                frames[0] += 1
+                latencies.extend(now - float(sent) for sent in batch)
+                remaining -= len(batch)
+
+        started = time.perf_counter()
+        receivers = [asyncio.ensure_future(drain(c)) for _, c in sockets]
+        for i, room in enumerate(plan):
+            text = json.dumps({'message': repr(time.perf_counter())})
+            await rng.choice(members[room]).send_input({'type': 'websocket.receive', 'text': text})
+            if rate:
+                delay = started + (i + 1) / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % 50 == 0:
+                await asyncio.sleep(0)
+        await asyncio.gather(*receivers)
+        elapsed = time.perf_counter() - started
+
+        for _, communicator in sockets:
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(5)
+        return {'latencies': latencies, 'frames': frames[0], 'elapsed': elapsed}
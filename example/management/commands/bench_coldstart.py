@@ -0,0 +1,81 @@
+import json
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from example import coldstart
+
+
+class Command(BaseCommand):
+    help = ('Measure serverless cold starts: start fresh interpreters that import api.wsgi and serve one request, '
+            'reporting time to first response and an import-time profile per module and package.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10, help='Cold starts to measure.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Request to serve after the import; repeat for more (default: /api/_metrics).')
+        parser.add_argument('--top', type=int, default=25, help='Modules and packages to list.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/api/_metrics']
+        # Discarded: compiles any stale bytecode so every measured start reads the same __pycache__
+        coldstart.run_probe(paths)
+        runs = [coldstart.run_probe(paths) for _ in range(options['repeat'])]
+        for run in runs:
+            for response in run['responses']:
+                if response['status'] >= 500:
+                    raise CommandError(f"{response['path']} returned {response['status']}")
+
+        def median(key):
+            return statistics.median(run[key] for run in runs)
+
+        # Per module and package, the median over runs (missing counts as 0)
+        names = {name for run in runs for name in run['imports']}
+        modules = {
+            name: {
+                'self_s': statistics.median(run['imports'].get(name, (0, 0))[0] for run in runs) / 1e6,
+                'cumulative_s': statistics.median(run['imports'].get(name, (0, 0))[1] for run in runs) / 1e6,
+            }
+            for name in names
+        }
+        package_runs = [coldstart.by_package(run['imports']) for run in runs]
+        packages = {
+            package: statistics.median(totals.get(package, 0.0) for totals in package_runs)
+            for package in {package for totals in package_runs for package in totals}
+        }
+        results = {
+            'repeat': options['repeat'],
+            'paths': paths,
+            'wall_s': median('wall'),
+            'import_s': median('import'),
+            'first_response_s': median('first_response'),
+            'modules_loaded': median('modules'),
+            'responses': [
+                {'path': path, 'status': runs[-1]['responses'][index]['status'],
+                 'seconds': statistics.median(run['responses'][index]['seconds'] for run in runs)}
+                for index, path in enumerate(paths)
+            ],
+            'packages': dict(sorted(packages.items(), key=lambda item: -item[1])),
+            'modules': dict(sorted(modules.items(), key=lambda item: -item[1]['self_s'])),
+        }
+        self.report(results, options['top'])
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def report(self, results, top):
+        self.stdout.write(
+            f"median of {results['repeat']} cold starts: process {results['wall_s'] * 1000:.0f} ms, "
+            f"import api.wsgi {results['import_s'] * 1000:.0f} ms, "
+            f"first response {results['first_response_s'] * 1000:.0f} ms, {results['modules_loaded']:.0f} modules"
+        )
+        for response in results['responses']:
+            self.stdout.write(f"  {response['path']}: {response['status']} in {response['seconds'] * 1000:.1f} ms")
+        self.stdout.write(f"\n{'package':<40}{'self ms':>10}")
+        for package, seconds in list(results['packages'].items())[:top]:
+            self.stdout.write(f'{package:<40}{seconds * 1000:>10.1f}')
+        self.stdout.write(f"\n{'module':<60}{'self ms':>10}{'cumul. ms':>11}")
+        for name, stats in list(results['modules'].items())[:top]:
+            self.stdout.write(f"{name:<60}{stats['self_s'] * 1000:>10.1f}{stats['cumulative_s'] * 1000:>11.1f}")
@@ -0,0 +1,59 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from example import geo
+from example.bench import summarize, throwaway_database, timed
+from example.models import Clinic
+
+
+class Command(BaseCommand):
+    help = 'Benchmark nearest-clinic search against a full scan on synthetic clinics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clinics', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--radius-km', type=float, default=25.0)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with throwaway_database():
+            self.seed_clinics(rng, options['clinics'])
+            points = [self.random_point(rng) for _ in range(options['queries'])]
+            radius, limit = options['radius_km'], options['limit']
+
+            def indexed(lat, lng):
+                return geo.nearest(Clinic.objects.all(), lat, lng, radius, limit)
+
+            def full_scan(lat, lng):
+                # What clients do today: fetch every clinic and rank them locally
+                rows = Clinic.objects.values_list('id', 'latitude', 'longitude')
+                hits = [(geo.haversine_km(lat, lng, float(a), float(b)), pk) for pk, a, b in rows]
+                return sorted(hit for hit in hits if hit[0] <= radius)[:limit]
+
+            for name, func in (('indexed', indexed), ('full_scan', full_scan)):
+                samples = [timed(lambda: func(lat, lng), 1)[0] for lat, lng in points]
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"{name:>10}: mean {stats['mean_ms']:.2f} ms, p50 {stats['p50_ms']:.2f} ms, "
+                    f"p99 {stats['p99_ms']:.2f} ms over {stats['n']} queries"
+                )
+
+    @staticmethod
+    def random_point(rng):
+        # Roughly the continental US, so clinics cluster the way real ones do
+        return rng.uniform(24.0, 49.0), rng.uniform(-125.0, -66.0)
+
+    def seed_clinics(self, rng, count, batch_size=5000):
+        for start in range(0, count, batch_size):
+            clinics = []
+            for i in range(start, min(start + batch_size, count)):
+                lat, lng = (round(value, 6) for value in self.random_point(rng))
+                clinics.append(Clinic(
+                    name=f'Clinic {i}', address=f'{i} Main St', phone='555-0100',
+                    email=f'clinic{i}@example.com', latitude=lat, longitude=lng,
+                ))
+            Clinic.objects.bulk_create(clinics)
+        self.stdout.write(f'Seeded {count} clinics')
@@ -0,0 +1,131 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from example import bench
+from example.models import Appointment, HealthData
+from example.renderers import MSGPACK_MEDIA_TYPE, FastJSONRenderer, MessagePackRenderer
+from example.serializers import AppointmentSerializer, HealthDataSerializer
+
+DATASETS = {
+    'healthdata': (HealthData, HealthDataSerializer),
+    'appointment': (Appointment, AppointmentSerializer),
+}
+
+
+def _decoders():
+    import msgpack
+    import orjson
+
+    return {'json': json.loads, 'orjson': orjson.loads, 'msgpack': msgpack.unpackb}
+
+
+class Command(BaseCommand):
+    help = ('Compare the JSON (DRF), JSON (orjson) and MessagePack renderers on HealthData and Appointment lists: '
+            'encode time, CPU time and bytes with and without gzip, then the same lists served over HTTP.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.01,
+                            help='Fraction of the bench_api data set to seed (1 = 2M health data rows).')
+        parser.add_argument('--rows', type=int, nargs='+', default=[50, 500, 5000],
+                            help='List sizes to encode; HTTP pages are capped at the paginator maximum.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        formats = {
+            'json': (JSONRenderer(), 'application/json'),
+            'orjson': (FastJSONRenderer(), 'application/json'),
+            'msgpack': (MessagePackRenderer(), MSGPACK_MEDIA_TYPE),
+        }
+        decoders = _decoders()
+        rng = random.Random(options['seed'])
+        encode, http = [], []
+        with bench.throwaway_database(), override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False):
+            bench.seed_dataset(bench.scaled_counts(options['scale']), rng, log=self.stdout.write)
+            for dataset, (model, serializer_class) in DATASETS.items():
+                for rows in options['rows']:
+                    queryset = model.objects.order_by('-created_at', '-pk')[:rows]
+                    data = serializer_class(queryset, many=True).data
+                    reference = json.loads(formats['json'][0].render(data))
+                    for name, (renderer, _) in formats.items():
+                        row = self.measure_encode(renderer, data, decoders[name], options['repeat'])
+                        if decoders[name](renderer.render(data)) != reference:
+                            raise CommandError(f'{name} output for {dataset} decodes differently from JSON.')
+                        encode.append({'dataset': dataset, 'rows': len(data), 'format': name, **row})
+
+            client = Client()
+            for dataset in DATASETS:
+                url = reverse(f'{dataset}-list')
+                for rows in sorted({min(rows, 500) for rows in options['rows']}):
+                    for name, (_, media_type) in formats.items():
+                        if name == 'json':
+                            continue  # Served by FastJSONRenderer; the encode table has the difference
+                        for encoding in ('identity', 'gzip'):
+                            http.append({'dataset': dataset, 'rows': rows, 'format': name, 'encoding': encoding,
+                                         **self.measure_http(client, url, rows, media_type, encoding,
+                                                             options['repeat'])})
+
+        results = {'scale': options['scale'], 'repeat': options['repeat'], 'encode': encode, 'http': http}
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    @staticmethod
+    def measure_encode(renderer, data, decode, repeat):
+        content = renderer.render(data)
+        cpu_started = time.process_time()
+        wall = bench.timed(lambda: renderer.render(data), repeat)
+        cpu = (time.process_time() - cpu_started) / repeat
+        compressed = compress_string(content)
+        return {
+            'encode_ms': round(statistics.median(wall) * 1000, 3),
+            'cpu_ms': round(cpu * 1000, 3),
+            'decode_ms': round(statistics.median(bench.timed(lambda: decode(content), repeat)) * 1000, 3),
+            'gzip_ms': round(statistics.median(bench.timed(lambda: compress_string(content), repeat)) * 1000, 3),
+            'bytes': len(content),
+            'gzip_bytes': len(compressed),
+        }
+
+    @staticmethod
+    def measure_http(client, url, rows, media_type, encoding, repeat):
+        headers = {'HTTP_ACCEPT': media_type, 'HTTP_ACCEPT_ENCODING': encoding}
+        samples, response = [], None
+        cpu_started = time.process_time()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url, {'page_size': rows}, **headers)
+            samples.append(time.perf_counter() - started)
+        cpu = (time.process_time() - cpu_started) / repeat
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        return {
+            'p50_ms': round(statistics.median(samples) * 1000, 3),
+            'cpu_ms': round(cpu * 1000, 3),
+            'wire_bytes': len(response.content),
+            'content_encoding': response.get('Content-Encoding', 'identity'),
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{'dataset':<12}{'rows':>6} {'format':<8}{'encode ms':>10}{'cpu ms':>9}{'decode ms':>10}"
+                          f"{'bytes':>10}{'gzip ms':>9}{'gzip bytes':>11}")
+        for row in results['encode']:
+            self.stdout.write(f"{row['dataset']:<12}{row['rows']:>6} {row['format']:<8}{row['encode_ms']:>10.2f}"
+                              f"{row['cpu_ms']:>9.2f}{row['decode_ms']:>10.2f}{row['bytes']:>10}"
+                              f"{row['gzip_ms']:>9.2f}{row['gzip_bytes']:>11}")
+        self.stdout.write(f"\n{'dataset':<12}{'rows':>6} {'format':<8}{'encoding':<10}{'p50 ms':>9}{'cpu ms':>9}"
+                          f"{'wire bytes':>11}")
+        for row in results['http']:
+            self.stdout.write(f"{row['dataset']:<12}{row['rows']:>6} {row['format']:<8}{row['content_encoding']:<10}"
+                              f"{row['p50_ms']:>9.2f}{row['cpu_ms']:>9.2f}{row['wire_bytes']:>11}")
@@ -0,0 +1,63 @@
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from example.bench import throwaway_database, timed
+from example.fastpath import compile_serializer
+from example.models import HealthData, User
+from example.serializers import HealthDataSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare ModelSerializer and the fast path on large HealthData lists (rows/sec and peak memory).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        fast = compile_serializer(HealthDataSerializer)
+        renderer = JSONRenderer()
+        with throwaway_database():
+            user = User.objects.create(name='Bench', email='bench@example.com', password='x')
+            seeded = 0
+            for count in sorted(options['rows']):
+                self.seed(user, seeded, count)
+                seeded = count
+                queryset = HealthData.objects.order_by('-created_at', '-pk')
+
+                def model_path():
+                    return renderer.render(HealthDataSerializer(queryset.all(), many=True).data)
+
+                def fast_path():
+                    return renderer.render(fast.to_representation(fast.values(queryset).iterator()))
+
+                if model_path() != fast_path():
+                    raise CommandError('Fast path output differs from HealthDataSerializer.')
+                for name, func in (('serializer', model_path), ('fastpath', fast_path)):
+                    seconds, peak = self.measure(func, options['repeat'])
+                    self.stdout.write(
+                        f'{count:>8} rows {name:>10}: {count / seconds:>10,.0f} rows/s, '
+                        f'{seconds * 1000:8.1f} ms, peak {peak / 2 ** 20:7.1f} MiB'
+                    )
+
+    @staticmethod
+    def measure(func, repeat):
+        # Best wall time without tracing; peak memory from one traced run
+        best = min(timed(func, repeat))
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return best, peak
+
+    def seed(self, user, start, stop, batch_size=5000):
+        for offset in range(start, stop, batch_size):
+            HealthData.objects.bulk_create([
+                HealthData(user=user, mood=f'mood {i % 7}', symptoms='headache, fatigue')
+                for i in range(offset, min(offset + batch_size, stop))
+            ])
+        self.stdout.write(f'Seeded {stop} rows')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from example.models import Clinic
+
+
+class Command(BaseCommand):
+    help = 'Recompute Clinic.geo_cell from latitude/longitude, or check it with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report stale cells without writing.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            stale = [pk for pk, _ in Clinic.objects.stale_geo_cells(options['chunk_size'])]
+            if stale:
+                raise CommandError(f'{len(stale)} clinics have a stale geo_cell, first ids: {stale[:20]}')
+            self.stdout.write(self.style.SUCCESS('Every clinic geo_cell matches its coordinates.'))
+            return
+        with transaction.atomic():
+            changed = Clinic.objects.refresh_geo_cells(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed geo_cell for {changed} clinics.'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from example import trends
+from example.models import HealthTrend
+
+
+class Command(BaseCommand):
+    help = 'Backfill the HealthData trend rollups from raw rows, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Compare rollups with raw rows without writing.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify(options['chunk_size'])
+        else:
+            self.backfill(options['chunk_size'])
+
+    def backfill(self, chunk_size):
+        users = 0
+        with transaction.atomic():
+            HealthTrend.objects.all().delete()
+            for user_id, counts in trends.recompute(chunk_size):
+                HealthTrend.objects.bulk_create([
+                    HealthTrend(user_id=user_id, period=period, bucket=bucket, kind=kind, value=value, count=count)
+                    for (_, period, bucket, kind, value), count in counts.items()
+                ], batch_size=chunk_size)
+                users += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt trend rollups for {users} users.'))
+
+    def verify(self, chunk_size):
+        mismatched, seen = [], set()
+        for user_id, counts in trends.recompute(chunk_size):
+            seen.add(user_id)
+            if trends.stored(user_id) != counts:
+                mismatched.append(user_id)
+        stored_users = HealthTrend.objects.values_list('user_id', flat=True).distinct()
+        mismatched.extend(user_id for user_id in stored_users.iterator() if user_id not in seen)
+        if mismatched:
+            raise CommandError(f'Trend rollups differ from raw rows for users: {sorted(set(mismatched))}')
+        self.stdout.write(self.style.SUCCESS(f'Trend rollups match raw rows for {len(seen)} users.'))
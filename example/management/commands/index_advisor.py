@@ -0,0 +1,255 @@
+import io
+import json
+import random
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, models
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from example import advisor, bench
+from example.models import ChatMessage, Professional, User
+from example.pagination import KeysetPagination
+from example.urls import router
+
+# Query parameters some viewsets filter on outside filterset_fields: name -> (model sampled, field it narrows)
+EXTRA_FILTERS = {'feedback': {'professional': (Professional, 'user')}}
+
+
+class Case:
+    """One request replayed for the analysis, and what an index for it would be keyed on."""
+
+    def __init__(self, name, model, path, params, filters=(), ordering=()):
+        self.name = name
+        self.model = model
+        self.path = path
+        self.params = params
+        self.filters = list(filters)
+        self.ordering = list(ordering)
+        self.statements = []
+        self.plans = []
+
+
+class Command(BaseCommand):
+    help = ('Replay the list, filter, search and ordering requests of every router viewset against seeded data, '
+            'EXPLAIN the SQL they issue and report full scans, sorts and suggested composite indexes. '
+            'With --compare, time each index the plans use or suggest with and without it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.01,
+                            help='Fraction of the bench_api data set to seed (1 = 2M health data rows).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=7, help='Runs per timed statement (median is kept).')
+        parser.add_argument('--compare', action='store_true',
+                            help='Time the affected statements with and without each index.')
+        parser.add_argument('--output', help='Write the report to this JSON file.')
+        parser.add_argument('--sql', action='store_true',
+                            help='Print CREATE INDEX statements for model indexes missing from the configured '
+                                 'database, instead of analysing.')
+
+    def handle(self, *args, **options):
+        if options['sql']:
+            return self.missing_index_sql()
+
+        rng = random.Random(options['seed'])
+        with bench.throwaway_database(), override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False):
+            bench.seed_dataset(bench.scaled_counts(options['scale']), rng, log=self.stdout.write)
+            call_command('rebuild_search_index', stdout=io.StringIO())
+            for model in apps.get_app_config('example').get_models():
+                advisor.analyze(connection, model._meta.db_table)
+
+            cases = self.build_cases(rng)
+            client = self.make_client()
+            for case in cases:
+                self.capture(client, case)
+            suggestions = self.suggest(cases)
+            comparisons = self.compare(cases, suggestions, options['repeat']) if options['compare'] else []
+
+        report = {
+            'database': connection.vendor,
+            'scale': options['scale'],
+            'cases': [
+                {'case': case.name, 'params': case.params,
+                 'findings': [{'table': table, 'finding': finding, 'detail': detail}
+                              for table, finding, _, detail in self.findings(case)],
+                 'indexes_used': sorted(self.indexes_used(case))}
+                for case in cases
+            ],
+            'suggestions': [{'table': model._meta.db_table, 'columns': columns, 'covered_by': covered,
+                             'cases': names} for (model, columns), (covered, names) in suggestions.items()],
+            'comparisons': comparisons,
+        }
+        self.report(report)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2, default=str)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def make_client(self):
+        room = ChatMessage.objects.values_list('room', flat=True).first()
+        user = User.objects.get(pk=int(room.split('-')[0])) if room else User.objects.first()
+        return Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def build_cases(self, rng):
+        room = ChatMessage.objects.values_list('room', flat=True).first()
+        default_ordering = [KeysetPagination.ordering]
+        cases = []
+        for prefix, viewset, basename in router.registry:
+            model = viewset.queryset.model
+            path = reverse(f'{basename}-list', kwargs={'room': room} if basename == 'chat-message' else {})
+            cases.append(Case(f'{basename}:list', model, path, {}, ordering=default_ordering))
+
+            filterset_fields = getattr(viewset, 'filterset_fields', None) or ()
+            if isinstance(filterset_fields, dict):
+                filterset_fields = [name for name, lookups in filterset_fields.items() if 'exact' in lookups]
+            for field in filterset_fields:
+                value = self.sample(model, field, rng)
+                if value is not None:
+                    cases.append(Case(f'{basename}:filter:{field}', model, path, {field: value}, [field],
+                                      default_ordering))
+            for param, (sampled, field) in EXTRA_FILTERS.get(basename, {}).items():
+                value = self.sample(sampled, 'pk', rng)
+                if value is not None:
+                    cases.append(Case(f'{basename}:filter:{param}', model, path, {param: value}, [field],
+                                      default_ordering))
+            if getattr(viewset, 'search_fields', None):
+                term = rng.choice(bench.LAST_NAMES + bench.SPECIALIZATIONS[:2])
+                cases.append(Case(f'{basename}:search', model, path, {'search': term}))
+            for field in getattr(viewset, 'ordering_fields', None) or ():
+                cases.append(Case(f'{basename}:order:{field}', model, path, {'ordering': field}, ordering=[field]))
+        return cases
+
+    @staticmethod
+    def sample(model, field, rng):
+        values = list(model.objects.exclude(**{f'{field}__isnull': True}).order_by('pk')
+                      .values_list(field, flat=True)[:500])
+        return rng.choice(values) if values else None
+
+    def capture(self, client, case):
+        recorder = advisor.StatementRecorder()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = client.get(case.path, case.params)
+        if response.status_code >= 400:
+            self.stdout.write(self.style.WARNING(f'{case.name}: {case.path} returned {response.status_code}'))
+        table = connection.ops.quote_name(case.model._meta.db_table)
+        # The statements reading the viewset's own table are the ones an index on it can help
+        case.statements = [statement for statement in recorder.statements.values()
+                           if f'FROM {table}' in statement.sql]
+        case.plans = [advisor.explain(connections[statement.alias], statement.sql, statement.params)
+                      for statement in case.statements]
+
+    @staticmethod
+    def findings(case):
+        for plan in case.plans:
+            for table, finding, index, detail in plan:
+                # Walking an index in order is what an unfiltered keyset page should do
+                if finding == advisor.INDEX_WALK and not case.filters:
+                    continue
+                if finding is not None:
+                    yield table, finding, index, detail
+
+    @staticmethod
+    def indexes_used(case):
+        return {index for plan in case.plans for _, _, index, _ in plan if index}
+
+    def suggest(self, cases):
+        """``{(model, columns): (existing index with those leading columns or None, case names)}``."""
+        suggestions = {}
+        for case in cases:
+            if not (case.filters or case.ordering) or not list(self.findings(case)):
+                continue
+            columns = tuple(advisor.suggest_columns(case.model, case.filters, case.ordering))
+            key = (case.model, columns)
+            if key not in suggestions:
+                indexes = advisor.table_indexes(connection, case.model._meta.db_table)
+                suggestions[key] = (advisor.covering_index(indexes, columns), [])
+            suggestions[key][1].append(case.name)
+        return suggestions
+
+    def compare(self, cases, suggestions, repeat):
+        """
+        Time the statements each index serves with and without it.
+
+        Declared indexes the plans use are dropped and restored; suggested
+        indexes that do not exist yet are created and dropped again.
+        """
+        candidates = {}
+        for case in cases:
+            declared = {index.name: index for index in case.model._meta.indexes}
+            for name in self.indexes_used(case) & set(declared):
+                candidates.setdefault((case.model, name), (declared[name], True, []))[2].append(case)
+        for (model, columns), (covered, names) in suggestions.items():
+            if covered is None:
+                name = f'advisor_{len(candidates)}_{model._meta.model_name}'[:30]
+                index = models.Index(fields=self.field_names(model, columns), name=name)
+                affected = [case for case in cases if case.name in names]
+                candidates[(model, index.name)] = (index, False, affected)
+
+        comparisons = []
+        for (model, name), (index, exists, affected) in candidates.items():
+            statements = [statement for case in affected for statement in case.statements]
+            timings = {'with' if exists else 'without': self.time_all(statements, repeat)}
+            self.toggle(model, index, add=not exists)
+            timings['without' if exists else 'with'] = self.time_all(statements, repeat)
+            self.toggle(model, index, add=exists)
+            comparisons.append({
+                'table': model._meta.db_table, 'index': name, 'declared': exists,
+                'columns': [model._meta.get_field(field).column for field in index.fields],
+                'cases': [case.name for case in affected],
+                'without_ms': round(timings['without'] * 1000, 3), 'with_ms': round(timings['with'] * 1000, 3),
+            })
+        return comparisons
+
+    @staticmethod
+    def toggle(model, index, add):
+        with connection.schema_editor() as editor:
+            (editor.add_index if add else editor.remove_index)(model, index)
+        advisor.analyze(connection, model._meta.db_table)
+
+    @staticmethod
+    def field_names(model, columns):
+        by_column = {field.column: field.name for field in model._meta.concrete_fields}
+        return [by_column[column] for column in columns]
+
+    @staticmethod
+    def time_all(statements, repeat):
+        return sum(advisor.time_statement(connections[statement.alias], statement, repeat)
+                   for statement in statements)
+
+    def missing_index_sql(self):
+        # The example app has no migrations; this is the DDL to bring an existing database up to the models
+        for model in apps.get_app_config('example').get_models():
+            existing = advisor.table_indexes(connection, model._meta.db_table)
+            missing = [index for index in model._meta.indexes if index.name not in existing]
+            if not missing:
+                continue
+            with connection.schema_editor(collect_sql=True) as editor:
+                for index in missing:
+                    editor.add_index(model, index)
+            for statement in editor.collected_sql:
+                self.stdout.write(statement)
+
+    def report(self, report):
+        for case in report['cases']:
+            if case['findings']:
+                self.stdout.write(f"{case['case']} {case['params'] or ''}")
+                for finding in case['findings']:
+                    self.stdout.write(f"  {finding['finding']:<11} {finding['detail']}")
+        self.stdout.write('\nSuggested composite indexes:')
+        for suggestion in report['suggestions']:
+            note = f"covered by {suggestion['covered_by']}" if suggestion['covered_by'] else 'missing'
+            self.stdout.write(f"  {suggestion['table']}({', '.join(suggestion['columns'])}): {note}; "
+                              f"{', '.join(suggestion['cases'])}")
+        if report['comparisons']:
+            self.stdout.write(f"\n{'index':<34}{'without ms':>12}{'with ms':>10}{'speedup':>9}  cases")
+            for row in report['comparisons']:
+                speedup = row['without_ms'] / row['with_ms'] if row['with_ms'] else float('inf')
+                self.stdout.write(f"{row['index']:<34}{row['without_ms']:>12.2f}{row['with_ms']:>10.2f}"
+                                  f"{speedup:>8.1f}x  {', '.join(row['cases'])}")
@@ -0,0 +1,22 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from example import search
+from example.models import SearchTerm
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SearchTerm token index used by IndexedSearchFilter.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for label in search.INDEXED_FIELDS:
+            model = apps.get_model(label)
+            with transaction.atomic():
+                SearchTerm.objects.filter(model=label).delete()
+                search.index_queryset(model.objects.all(), chunk_size=options['chunk_size'])
+            self.stdout.write(f'Indexed {model._meta.verbose_name_plural}')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,265 @@
+import bisect
+import functools
+import math
+import threading
+import time
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUANTILES = (0.5, 0.95, 0.99)
+# Histograms that also get estimated quantile gauges on /api/_metrics
+SUMMARIZED = {'calm_http_request_duration_seconds', 'calm_ws_handler_duration_seconds'}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the bucket it falls in."""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class RollingHistogram:
+    """
+    ``Histogram`` of the last ``window`` seconds, kept as ``slices`` rotating
+    sub-histograms so old observations age out without storing samples.
+    """
+
+    def __init__(self, buckets, window=10.0, slices=10):
+        self.buckets = buckets
+        self.width = window / slices
+        self._slices = [(None, Histogram(buckets)) for _ in range(slices)]
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        epoch = int(time.monotonic() // self.width)
+        index = epoch % len(self._slices)
+        with self._lock:
+            started, histogram = self._slices[index]
+            if started != epoch:
+                histogram = Histogram(self.buckets)
+                self._slices[index] = (epoch, histogram)
+            histogram.observe(value)
+
+    def snapshot(self):
+        """The observations still inside the window, merged into one ``Histogram``."""
+        epoch = int(time.monotonic() // self.width)
+        merged = Histogram(self.buckets)
+        with self._lock:
+            for started, histogram in self._slices:
+                if started is not None and epoch - started < len(self._slices):
+                    merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                    merged.sum += histogram.sum
+                    merged.count += histogram.count
+        return merged
+
+
+class Registry:
+    """
+    In-process metric store rendered in the Prometheus text format.
+
+    Each worker keeps its own numbers; scrape every worker (or sum them)
+    to get the whole picture.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = defaultdict(float)
+        self._help = {}
+
+    def describe(self, name, kind, help_text, buckets=None):
+        self._help[name] = (kind, help_text, buckets)
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._help[name][2])
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[name, tuple(sorted(labels.items()))] += amount
+
+    def get(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        return self._histograms.get(key) or self._counters.get(key)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, _) in sorted(self._help.items()):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                if kind == 'counter':
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                series = sorted((labels, h) for (metric, labels), h in self._histograms.items() if metric == name)
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(labels)} {_number(histogram.sum)}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+                if series and name in SUMMARIZED:
+                    quantile_name = f'{name}_quantile'
+                    lines.append(f'# HELP {quantile_name} Estimated p50/p95/p99 of {name}.')
+                    lines.append(f'# TYPE {quantile_name} gauge')
+                    for labels, histogram in series:
+                        for q in QUANTILES:
+                            lines.append(f'{quantile_name}{_labels(labels, quantile=q)} '
+                                         f'{_number(histogram.quantile(q))}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+REGISTRY = Registry()
+REGISTRY.describe('calm_http_request_duration_seconds', 'histogram', 'Request latency per route.', LATENCY_BUCKETS)
+REGISTRY.describe('calm_http_request_phase_seconds', 'histogram', 'Time per request phase and route.',
+                  LATENCY_BUCKETS)
+REGISTRY.describe('calm_http_request_queries', 'histogram', 'SQL statements per request and route.',
+                  QUERY_BUCKETS)
+REGISTRY.describe('calm_http_response_size_bytes', 'histogram', 'Response body size per route.', SIZE_BUCKETS)
+REGISTRY.describe('calm_http_rejected_total', 'counter', 'Requests refused by rate limits or load shedding.')
+REGISTRY.describe('calm_ws_messages_total', 'counter', 'WebSocket messages per consumer and direction.')
+REGISTRY.describe('calm_ws_dropped_total', 'counter', 'Channel layer messages dropped because the channel was full.')
+REGISTRY.describe('calm_ws_handler_duration_seconds', 'histogram', 'WebSocket handler latency.', LATENCY_BUCKETS)
+
+
+class RequestTimer:
+    """
+    Phase marks for one request; SQL time is read from the request's
+    ``QueryRecorder`` so database work is not double counted.
+    """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._view_started = None
+
+    def start_auth(self):
+        self._auth_started = time.perf_counter()
+
+    def end_auth(self):
+        self.phases['auth'] = time.perf_counter() - self._auth_started
+        self._view_started = (time.perf_counter(), self.recorder.duration)
+
+    def end_view(self):
+        if self._view_started is not None:
+            started, db_before = self._view_started
+            elapsed = time.perf_counter() - started
+            self.phases['serialize'] = max(0.0, elapsed - (self.recorder.duration - db_before))
+        self._render_started = time.perf_counter()
+
+    def end_render(self, *args):
+        self.phases['render'] = time.perf_counter() - self._render_started
+
+    def finish(self):
+        self.phases['db'] = self.recorder.duration
+        self.phases['total'] = time.perf_counter() - self.started
+        return self.phases
+
+    def header(self):
+        parts = []
+        for phase, seconds in self.phases.items():
+            desc = f';desc="{self.recorder.count} queries"' if phase == 'db' else ''
+            parts.append(f'{phase};dur={seconds * 1000:.2f}{desc}')
+        return ', '.join(parts)
+
+
+class PhaseTimingMixin:
+    """Mark the auth/permission and view phases for ``PerformanceMiddleware``."""
+
+    def initial(self, request, *args, **kwargs):
+        timer = getattr(request, 'server_timing', None)
+        if timer is None:
+            return super().initial(request, *args, **kwargs)
+        timer.start_auth()
+        try:
+            super().initial(request, *args, **kwargs)
+        finally:
+            timer.end_auth()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        timer = getattr(request, 'server_timing', None)
+        if timer is not None:
+            timer.end_view()
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if timer is not None:
+            if getattr(response, 'is_rendered', True):
+                timer.end_render()
+            else:
+                response.add_post_render_callback(timer.end_render)
+        return response
+
+
+def timed_handler(consumer, direction=None):
+    """
+    Decorate an async consumer handler to count its messages and record
+    its latency in the WebSocket metrics.
+    """
+    def decorator(handler):
+        labels = {'consumer': consumer, 'handler': handler.__name__}
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                REGISTRY.observe('calm_ws_handler_duration_seconds', labels, time.perf_counter() - started)
+                if direction is not None:
+                    REGISTRY.inc('calm_ws_messages_total', {'consumer': consumer, 'direction': direction})
+        return wrapper
+    return decorator
@@ -0,0 +1,253 @@
+import logging
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+
+from . import db_router
+from .metrics import LATENCY_BUCKETS, REGISTRY, RequestTimer, RollingHistogram
+from .queries import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+# Metric labels come from a fixed set: any other verb a client sends is
+# counted as 'other', so requests cannot grow the registry without bound
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+
+class PerformanceMiddleware:
+    """
+    Time each request, record its SQL, and publish the numbers.
+
+    Adds a ``Server-Timing`` header (auth, serialize, render, db, total),
+    feeds the per-route histograms served on ``/api/_metrics`` and logs a
+    warning when a request runs more SQL statements than ``QUERY_BUDGET``,
+    which is how a list endpoint whose query count grows with the page size
+    shows up long before it shows up as latency.
+
+    Runs natively under ASGI as well, so async views are not pushed onto a
+    thread by the outermost middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            request.server_timing = timer = RequestTimer(recorder)
+            response = self.get_response(request)
+        return self.publish(request, response, timer, recorder)
+
+    async def __acall__(self, request):
+        # Connections are per thread: wrap the ones in this request's ORM
+        # thread, which every thread-sensitive sync_to_async call shares
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            request.server_timing = timer = RequestTimer(recorder)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.publish(request, response, timer, recorder)
+
+    def publish(self, request, response, timer, recorder):
+        phases = timer.finish()
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match is not None else 'unmatched'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REGISTRY.observe('calm_http_request_duration_seconds', {'route': route, 'method': method}, phases['total'])
+        for phase, seconds in phases.items():
+            if phase != 'total':
+                REGISTRY.observe('calm_http_request_phase_seconds', {'route': route, 'phase': phase}, seconds)
+        REGISTRY.observe('calm_http_request_queries', {'route': route}, recorder.count)
+        if not response.streaming:
+            REGISTRY.observe('calm_http_response_size_bytes', {'route': route}, len(response.content))
+        response['Server-Timing'] = timer.header()
+
+        budget = getattr(settings, 'QUERY_BUDGET', 25)
+        if recorder.count > budget:
+            logger.warning('%s %s ran %d queries (budget %d)', request.method, request.path, recorder.count, budget)
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Gzip large bodies of compressible types for clients that accept it.
+
+    Bodies under ``COMPRESSION['MIN_SIZE']`` bytes are sent as they are:
+    the gzip framing and CPU cost outweigh what they would save. Images and
+    XLSX files are already compressed and are never touched. Streaming
+    exports are compressed chunk by chunk. Django's middleware does the
+    work, including its BREACH length padding and weakening the ``ETag``.
+    """
+    defaults = {'MIN_SIZE': 1024}
+    compressible_types = ('application/json', 'application/msgpack', 'application/x-ndjson')
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').partition(';')[0].strip()
+        if not (content_type.startswith('text/') or content_type in self.compressible_types):
+            return response
+        config = {**self.defaults, **getattr(settings, 'COMPRESSION', {})}
+        if not response.streaming and len(response.content) < config['MIN_SIZE']:
+            return response
+        return super().process_response(request, response)
+
+
+class LoadSheddingMiddleware:
+    """
+    Refuse writes with 503 and ``Retry-After`` while this worker is overloaded.
+
+    Overloaded means more than ``MAX_IN_FLIGHT`` requests in progress, or a
+    p99 latency above ``P99_SECONDS`` over the last ``WINDOW`` seconds once
+    ``MIN_SAMPLES`` requests have been seen. Reads are still served: shedding
+    the writes is what lets the database, and so the latency, recover.
+    Refused and throttled requests do no work and are left out of the
+    window, where they would hide the latency of the rest.
+    """
+    sync_capable = True
+    async_capable = True
+    defaults = {
+        'MAX_IN_FLIGHT': 64,
+        'P99_SECONDS': 2.5,
+        'WINDOW': 10,
+        'MIN_SAMPLES': 50,
+        'RETRY_AFTER': 5,
+    }
+    skipped_statuses = {429, 503}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        config = self.config()
+        self.latency = RollingHistogram(LATENCY_BUCKETS, window=config['WINDOW'])
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def config(self):
+        return {**self.defaults, **getattr(settings, 'LOAD_SHEDDING', {})}
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        refused = self.refuse(request)
+        if refused is not None:
+            return refused
+        started = self.enter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.leave()
+        return self.record(response, started)
+
+    async def __acall__(self, request):
+        refused = self.refuse(request)
+        if refused is not None:
+            return refused
+        started = self.enter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.leave()
+        return self.record(response, started)
+
+    def refuse(self, request):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        config = self.config()
+        reason = None
+        if self.in_flight >= config['MAX_IN_FLIGHT']:
+            reason = 'in_flight'
+        else:
+            window = self.latency.snapshot()
+            if window.count >= config['MIN_SAMPLES'] and window.quantile(0.99) > config['P99_SECONDS']:
+                reason = 'latency'
+        if reason is None:
+            return None
+        REGISTRY.inc('calm_http_rejected_total', {'reason': reason, 'scope': 'write'})
+        response = JsonResponse({'detail': 'The service is overloaded; retry later.'}, status=503)
+        response['Retry-After'] = str(math.ceil(config['RETRY_AFTER']))
+        return response
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record(self, response, started):
+        if response.status_code not in self.skipped_statuses:
+            self.latency.observe(time.perf_counter() - started)
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Give ``ReplicaRouter`` its per-request state.
+
+    Unsafe methods are pinned to the primary from the start. A response to
+    a request that wrote sets a cookie that pins the client's following
+    requests for ``REPLICA_PIN_SECONDS``, which should cover replication
+    lag, so a client never reads from a replica that is behind its writes.
+    """
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'db_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.request_state(request)
+        token = db_router.activate(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.deactivate(token)
+        return self.stick(response, state)
+
+    async def __acall__(self, request):
+        state = self.request_state(request)
+        token = db_router.activate(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.deactivate(token)
+        return self.stick(response, state)
+
+    def request_state(self, request):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return db_router.ReadState(pinned=True)
+        try:
+            until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            until = 0
+        return db_router.ReadState(pinned=until > time.time())
+
+    def stick(self, response, state):
+        if state.wrote:
+            seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+            response.set_cookie(self.cookie_name, f'{time.time() + seconds:.3f}', max_age=seconds,
+                                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax')
+        return response
@@ -1,5 +1,15 @@
+import functools
+import logging
+import os
+import uuid
+
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import geo, images, scoring
+
+logger = logging.getLogger(__name__)
 
 
 # User Manager
@@ -34,6 +44,7 @@ class User(AbstractBaseUser):
 
     class Meta:
         db_table = 'user_table'
+        indexes = [models.Index(fields=['created_at', 'id'], name='user_created_id_idx')]
 
 
 # Profile Model
@@ -42,12 +53,55 @@ class Profile(models.Model):
     bio = models.TextField()
     location = models.CharField(max_length=255)
     profile_picture = models.ImageField(upload_to='profiles/')
+    # SHA-256 of the stored (stripped) picture; keys its cached thumbnails
+    profile_picture_hash = models.CharField(max_length=64, blank=True, editable=False)
     privacy_settings = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'profile_table'
+        indexes = [models.Index(fields=['created_at', 'id'], name='profile_created_id_idx')]
+
+    def save(self, *args, **kwargs):
+        picture = self.profile_picture
+        staged = None
+        if picture and not picture._committed:
+            # Phone pictures carry the GPS position they were taken at. The
+            # upload is parked under a name nothing links to and only becomes
+            # the profile picture once strip_picture() has re-encoded it on
+            # the thumbnail pool; until then the previous picture stays.
+            extension = os.path.splitext(picture.name)[1].lower()
+            staged = picture.storage.save(
+                picture.field.generate_filename(self, f'incoming/{uuid.uuid4().hex}{extension}'), picture)
+            previous = Profile.objects.filter(pk=self.pk).values_list('profile_picture', 'profile_picture_hash')
+            self.profile_picture, self.profile_picture_hash = previous.first() or ('', '')
+        elif not picture:
+            self.profile_picture_hash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'profile_picture' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'profile_picture_hash'}
+        super().save(*args, **kwargs)
+        if staged is not None:
+            transaction.on_commit(functools.partial(images.submit, Profile.strip_picture, self.pk, staged),
+                                  using=kwargs.get('using'))
+
+    @classmethod
+    def strip_picture(cls, pk, staged):
+        """Store the staged upload without its metadata and make it profile ``pk``'s picture."""
+        field = cls._meta.get_field('profile_picture')
+        storage = field.storage
+        try:
+            with storage.open(staged, 'rb') as source:
+                clean = images.strip_metadata(source)
+        except images.InvalidImage:
+            logger.warning('Discarding profile picture upload %s that could not be decoded', staged)
+        else:
+            name = storage.save(field.generate_filename(None, clean.name), clean)
+            digest = images.content_hash(clean)
+            if not cls.objects.filter(pk=pk).update(profile_picture=name, profile_picture_hash=digest):
+                storage.delete(name)
+        storage.delete(staged)
 
 
 # Assessment Model
@@ -55,10 +109,27 @@ class Assessment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     type = models.CharField(max_length=255)
     result = models.TextField()
+    # Item answers for the instruments in example.scoring, one byte per item
+    responses = models.BinaryField(blank=True, default=b'')
+    # Computed from responses on save; empty for free-text results
+    score = models.SmallIntegerField(null=True, blank=True, editable=False)
+    severity = models.CharField(max_length=24, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'assessment_table'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='assessment_created_id_idx'),
+            # "Scores of at least X for this instrument since Y" and the cohort histograms
+            models.Index(fields=['type', 'created_at', 'score'], name='assessment_type_time_score_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        scoring.score_assessments([self])
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'type', 'responses'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'score', 'severity', 'result'}
+        super().save(*args, **kwargs)
 
 
 # Health Data Model
@@ -70,6 +141,31 @@ class HealthData(models.Model):
 
     class Meta:
         db_table = 'health_data_table'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='health_data_created_id_idx'),
+            # ?user= pages without sorting the user's entries (see the index_advisor command)
+            models.Index(fields=['user', 'created_at', 'id'], name='health_data_user_created_idx'),
+        ]
+
+
+# Health Trend Model: per-user rollup of HealthData counts, kept in step by signals
+class HealthTrend(models.Model):
+    PERIODS = ('day', 'week', 'month')
+    MOOD = 'mood'
+    SYMPTOM = 'symptom'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    period = models.CharField(max_length=5)
+    bucket = models.DateField()
+    kind = models.CharField(max_length=7)
+    value = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'health_trend_table'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'bucket', 'kind', 'value'], name='health_trend_unique'),
+        ]
 
 
 # Feedback Model
@@ -80,6 +176,7 @@ class Feedback(models.Model):
 
     class Meta:
         db_table = 'feedback_table'
+        indexes = [models.Index(fields=['created_at', 'id'], name='feedback_created_id_idx')]
 
 
 # Professional Model
@@ -92,8 +189,25 @@ class Professional(models.Model):
 
     class Meta:
         db_table = 'professional_table'
+        indexes = [models.Index(fields=['created_at', 'id'], name='professional_created_id_idx')]
+
+
+
+# Cancelled appointments no longer occupy the professional's time
+CANCELLED_STATUSES = ('cancelled', 'canceled')
 
 
+# Appointment QuerySet
+class AppointmentQuerySet(models.QuerySet):
+    def blocking(self):
+        queryset = self
+        for status in CANCELLED_STATUSES:
+            queryset = queryset.exclude(status__iexact=status)
+        return queryset
+
+    def overlapping(self, start, end):
+        return self.filter(start_time__lt=end, end_time__gt=start)
+
 
 # Appointment Model
 class Appointment(models.Model):
@@ -105,8 +219,55 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         db_table = 'appointment_table'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='appointment_created_id_idx'),
+            # Range-overlap checks at booking time and availability sweeps
+            models.Index(fields=['professional', 'start_time', 'end_time'], name='appointment_pro_time_idx'),
+            # ?professional= pages in keyset order
+            models.Index(fields=['professional', 'created_at', 'id'], name='appointment_pro_created_idx'),
+        ]
+
+    @property
+    def is_blocking(self):
+        return self.status.lower() not in CANCELLED_STATUSES
+
+
+# Clinic QuerySet: keeps geo_cell in step with bulk writes that bypass save()
+class ClinicQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for clinic in objs:
+            clinic.geo_cell = geo.cell_for(clinic.latitude, clinic.longitude)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def update(self, **kwargs):
+        # Covers bulk_update() too. New coordinates may be expressions, so the
+        # cells are recomputed from what was written.
+        if not {'latitude', 'longitude'} & set(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            self.model.objects.filter(pk__in=pks).refresh_geo_cells()
+        return rows
+
+    def stale_geo_cells(self, chunk_size=2000):
+        """Yield ``(pk, cell)`` for rows whose stored ``geo_cell`` does not match their coordinates."""
+        rows = self.values_list('pk', 'latitude', 'longitude', 'geo_cell').order_by('pk')
+        for pk, latitude, longitude, stored in rows.iterator(chunk_size=chunk_size):
+            cell = geo.cell_for(latitude, longitude)
+            if cell != stored:
+                yield pk, cell
+
+    def refresh_geo_cells(self, chunk_size=2000):
+        """Rewrite stale ``geo_cell`` values; returns how many rows changed."""
+        stale = [self.model(pk=pk, geo_cell=cell) for pk, cell in self.stale_geo_cells(chunk_size)]
+        self.model.objects.bulk_update(stale, ['geo_cell'], batch_size=chunk_size)
+        return len(stale)
 
 
 # Clinic Model
@@ -117,8 +278,66 @@ class Clinic(models.Model):
     email = models.EmailField()
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    # Grid bucket for nearest-clinic search, derived from latitude/longitude by
+    # save() and ClinicQuerySet. Rows written around both (raw SQL, fixtures)
+    # are repaired with the clinic_geo_cells command.
+    geo_cell = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ClinicQuerySet.as_manager()
+
     class Meta:
         db_table = 'clinic_table'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='clinic_created_id_idx'),
+            models.Index(fields=['geo_cell', 'latitude'], name='clinic_geo_cell_idx'),
+            # ?name= and ?email= lookups
+            models.Index(fields=['name', 'created_at', 'id'], name='clinic_name_created_idx'),
+            models.Index(fields=['email', 'created_at', 'id'], name='clinic_email_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.geo_cell = geo.cell_for(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geo_cell'}
+        super().save(*args, **kwargs)
+
+
+# Search Term Model: token index behind the IndexedSearchFilter
+class SearchTerm(models.Model):
+    model = models.CharField(max_length=64)
+    object_id = models.BigIntegerField()
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        db_table = 'search_term_table'
+        indexes = [
+            models.Index(fields=['model', 'term', 'object_id'], name='search_term_lookup_idx'),
+            models.Index(fields=['model', 'object_id'], name='search_term_object_idx'),
+        ]
+
+
+# Chat Message Model: persisted room history, written in batches by the ChatConsumer
+class ChatMessage(models.Model):
+    room = models.CharField(max_length=40)
+    sender = models.ForeignKey(User, on_delete=models.CASCADE)
+    body = models.TextField()
+    # Set when the message arrives, not when its batch is flushed
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'chat_message_table'
+        indexes = [models.Index(fields=['room', 'created_at', 'id'], name='chat_room_created_idx')]
+
+
+# Revoked Token Model: denylisted JWT ids, kept until the token would have expired anyway
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'revoked_token_table'
+        indexes = [models.Index(fields=['expires_at'], name='revoked_token_expires_idx')]
@@ -0,0 +1,175 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on ``(ordering field, id)``.
+
+    Pages are fetched with a range predicate on the key instead of an OFFSET,
+    and no COUNT(*) is issued, so a deep page costs the same as the first one.
+    The key follows the queryset's explicit ordering (``OrderingFilter``,
+    search ranking) and defaults to ``-created_at``; ``id`` always breaks ties.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Return the ordered, filtered and sliced queryset for the requested page.
+
+        Split from ``set_page`` so callers that evaluate the queryset
+        themselves (e.g. with ``aiterator``) can share the cursor logic.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        descending = self.descending
+        if self.cursor is not None and self.cursor['r']:
+            descending = not descending
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(prefix + self.field, prefix + 'pk')
+
+        if self.cursor is not None:
+            op = 'lt' if descending else 'gt'
+            value, pk = self.cursor['v'], self.cursor['pk']
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{op}': value}) | Q(**{self.field: value, f'pk__{op}': pk})
+            )
+
+        # Fetch one extra row to learn whether there is a following page.
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.cursor is not None and self.cursor['r']:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Return ``(field, descending)`` for the key used on this request.
+
+        An explicit ordering on the queryset, as applied by ``OrderingFilter``
+        or by search ranking, wins over the default ``ordering``.
+        """
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        field = ordering[0] if ordering else self.ordering
+        if field.startswith('-'):
+            return field[1:], True
+        return field, False
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if cursor['o'] != self.ordering_token() or not isinstance(cursor['r'], bool):
+                raise ValueError
+            if 'pk' not in cursor or 'v' not in cursor:
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, reverse):
+        value = self.get_key(row, self.field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif value is not None and not isinstance(value, (int, float, str, bool)):
+            value = str(value)
+
+        cursor = {'v': value, 'pk': self.get_key(row, 'pk'), 'r': reverse, 'o': self.ordering_token()}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def ordering_token(self):
+        return ('-' if self.descending else '') + self.field
+
+    @staticmethod
+    def get_key(row, field):
+        if isinstance(row, dict):
+            if field == 'pk':
+                field = 'pk' if 'pk' in row else 'id'
+            return row[field]
+        for part in field.split('__'):
+            row = getattr(row, part)
+        return row
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -21,3 +21,10 @@ class IsProfessionalOrReadOnly(BasePermission):
             return request.user.is_authenticated and hasattr(request.user, 'professional')
         # Non-professionals have full access (if authenticated)
         return request.user.is_authenticated
+
+
+class IsProfessional(BasePermission):
+    """Authenticated users with a professional profile, for views across patients."""
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and hasattr(request.user, 'professional_profile')
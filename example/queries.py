@@ -0,0 +1,41 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+
+class QueryRecorder:
+    """
+    Record every SQL statement run on any connection while active.
+
+    Uses ``execute_wrapper`` rather than ``connection.queries`` so it works
+    with ``DEBUG = False``.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
@@ -0,0 +1,173 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import REGISTRY
+
+DEFAULTS = {
+    'BACKEND': 'example.ratelimit.SharedMemoryBuckets',
+    'OPTIONS': {},
+    'RATES': {},
+}
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# One bucket: key hash (0 = free), tokens left, time.time() of the last update
+SLOT = struct.Struct('=Qdd')
+
+
+def parse_rate(rate):
+    """``'N/period'`` (as in DRF) -> ``(tokens per second, burst)``; the bucket holds N and refills N per period."""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    return count / PERIODS[period[0]], count
+
+
+class LocalBuckets:
+    """In-process token buckets; each worker limits on its own. Meant for tests and single-process servers."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            allowed, tokens = _refill_and_take(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+        return allowed, _wait(allowed, tokens, rate, cost)
+
+
+class SharedMemoryBuckets:
+    """
+    Token buckets in a memory-mapped file, shared by every worker process on the host.
+
+    The file is a fixed table of ``slots`` buckets; a key hashes to a run of
+    ``probes`` neighbouring slots and takes the matching one, a free one or,
+    failing both, the one idle the longest. Each update holds an ``fcntl``
+    record lock on just that run, so unrelated keys do not contend. Time is
+    wall-clock because the table outlives any one process.
+    """
+    probes = 8
+
+    def __init__(self, path=None, slots=65536):
+        if path is None:
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            path = os.path.join(directory, f'calm-ratelimit-{os.getuid()}')
+        self.path = path
+        self.slots = max(slots, self.probes)
+        size = self.slots * SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # fcntl locks belong to the process, so threads of one worker also need this
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        first = digest % (self.slots - self.probes + 1)
+        offset, length = first * SLOT.size, self.probes * SLOT.size
+        now = time.time()
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset)
+            try:
+                position, tokens, updated = self._find(digest, offset, now, burst)
+                allowed, tokens = _refill_and_take(tokens, updated, now, rate, burst, cost)
+                SLOT.pack_into(self._map, position, digest, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+        return allowed, _wait(allowed, tokens, rate, cost)
+
+    def _find(self, digest, offset, now, burst):
+        victim = None
+        for position in range(offset, offset + self.probes * SLOT.size, SLOT.size):
+            slot, tokens, updated = SLOT.unpack_from(self._map, position)
+            if slot == digest:
+                return position, tokens, updated
+            if victim is None or slot == 0 or updated < victim[1]:
+                victim = (position, 0 if slot == 0 else updated)
+        return victim[0], burst, now
+
+    def clear(self):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                self._map[:] = bytes(len(self._map))
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+def _refill_and_take(tokens, updated, now, rate, burst, cost):
+    # A clock that stepped backwards refills nothing rather than draining the bucket
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return True, tokens - cost
+    return False, tokens
+
+
+def _wait(allowed, tokens, rate, cost):
+    return 0.0 if allowed else (cost - tokens) / rate
+
+
+_store = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RATE_LIMIT', {})}
+
+
+def get_store():
+    global _store
+    if _store is None:
+        config = get_config()
+        _store = import_string(config['BACKEND'])(**config['OPTIONS'])
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting == 'RATE_LIMIT':
+        _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Limit unsafe requests to views with a ``throttle_scope`` listed in ``RATE_LIMIT['RATES']``.
+
+    There is one bucket per scope and client: the user when authenticated,
+    otherwise the client address, read from ``X-Forwarded-For`` only as far
+    as ``REST_FRAMEWORK['NUM_PROXIES']`` trusts it. Reads are never
+    throttled. A refused request gets DRF's 429 with ``Retry-After`` set to
+    when the next token is due.
+    """
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        scope = getattr(view, 'throttle_scope', None)
+        rate = get_config()['RATES'].get(scope)
+        if rate is None:
+            return True
+        user = getattr(request, 'user', None)
+        client = f'user:{user.pk}' if user is not None and user.is_authenticated else f'ip:{self.get_ident(request)}'
+        allowed, self.retry_after = get_store().take(f'{scope}|{client}', *parse_rate(rate))
+        if not allowed:
+            REGISTRY.inc('calm_http_rejected_total', {'reason': 'throttled', 'scope': scope})
+        return allowed
+
+    def wait(self):
+        return self.retry_after
@@ -0,0 +1,60 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+# U+2028/U+2029 in UTF-8; DRF escapes them so the output stays a JavaScript subset
+LINE_SEPARATORS = (b'\xe2\x80\xa8', b'\xe2\x80\xa9')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` encoding with orjson.
+
+    The output decodes to the same values as DRF's compact UTF-8 JSON:
+    dates, times, decimals and other non-JSON types go through DRF's
+    encoder. It is byte for byte the same except for floats written with an
+    exponent (``1e16`` rather than ``1e+16``, ``1.5e-7`` rather than
+    ``1.5e-07``) and NaN and infinities, which become null instead of
+    raising as under ``STRICT_JSON``. Indented output (the browsable API,
+    ``Accept: application/json; indent=4``), non-default
+    ``UNICODE_JSON``/``COMPACT_JSON`` settings and data orjson cannot encode,
+    such as integers wider than 64 bits, fall back to the standard library.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        import orjson
+
+        encoder = self.encoder_class()
+        try:
+            content = orjson.dumps(data, default=encoder.default,
+                                   option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson.JSONEncodeError, for integers over 64 bits among others
+            return super().render(data, accepted_media_type, renderer_context)
+        if LINE_SEPARATORS[0] in content or LINE_SEPARATORS[1] in content:
+            content = content.replace(LINE_SEPARATORS[0], b'\\u2028').replace(LINE_SEPARATORS[1], b'\\u2029')
+        return content
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Compact binary responses for ``Accept: application/msgpack``.
+
+    Values the JSON output carries as strings (dates, decimals, UUIDs) are
+    strings here too, so clients decode both formats into the same objects.
+    """
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        import msgpack
+
+        return msgpack.packb(data, default=encoders.JSONEncoder().default, use_bin_type=True)
@@ -1,6 +1,43 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
 from django.urls import path
-from consumer import ChatConsumer
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import user_for_token
+from .consumer import ChatConsumer
 
 websocket_urlpatterns = [
-    path('ws/chat/', ChatConsumer.as_asgi()),
-]
\ No newline at end of file
+    path('ws/chat/<str:room>/', ChatConsumer.as_asgi()),
+]
+
+
+# Kept out of example.authentication: only api.asgi imports this module, so the
+# WSGI deployment never loads Channels' runtime
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate WebSocket connections from an access token given as
+    ``?token=`` or in an ``Authorization: Bearer`` header.
+
+    Sits inside ``AuthMiddlewareStack``: a token, valid or not, replaces the
+    session user; without one the session user is kept.
+    """
+
+    async def __call__(self, scope, receive, send):
+        raw_token = self.get_raw_token(scope)
+        if raw_token is not None:
+            scope = dict(scope, user=await database_sync_to_async(user_for_token)(raw_token))
+        return await super().__call__(scope, receive, send)
+
+    @staticmethod
+    def get_raw_token(scope):
+        tokens = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+        if tokens:
+            return tokens[0].encode()
+        for name, value in scope.get('headers', ()):
+            if name == b'authorization':
+                parts = value.split()
+                if len(parts) == 2 and parts[0].decode('latin-1') in api_settings.AUTH_HEADER_TYPES:
+                    return parts[1]
+        return None
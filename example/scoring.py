@@ -0,0 +1,144 @@
+from collections import defaultdict
+
+from django.db.models import Count, DateField
+from django.db.models.functions import Trunc
+
+# Percentiles reported by cohort_stats
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class Instrument:
+    """
+    A questionnaire scored as the sum of its item answers.
+
+    ``bands`` are ``(lowest score, label)`` pairs in ascending order; the
+    first must start at 0.
+    """
+
+    def __init__(self, name, items, item_max, bands):
+        self.name = name
+        self.items = items
+        self.item_max = item_max
+        self.floors = tuple(floor for floor, _ in bands)
+        self.labels = tuple(label for _, label in bands)
+
+    @property
+    def max_score(self):
+        return self.items * self.item_max
+
+    def encode(self, answers):
+        """Pack item answers one byte each; raises ``ValueError`` if they do not fit the instrument."""
+        if len(answers) != self.items:
+            raise ValueError(f'{self.name} has {self.items} items, got {len(answers)} answers.')
+        if any(not 0 <= answer <= self.item_max for answer in answers):
+            raise ValueError(f'{self.name} answers range from 0 to {self.item_max}.')
+        return bytes(answers)
+
+
+INSTRUMENTS = {
+    instrument.name: instrument for instrument in (
+        Instrument('PHQ-9', 9, 3, ((0, 'minimal'), (5, 'mild'), (10, 'moderate'), (15, 'moderately severe'),
+                                   (20, 'severe'))),
+        Instrument('GAD-7', 7, 3, ((0, 'minimal'), (5, 'mild'), (10, 'moderate'), (15, 'severe'))),
+    )
+}
+
+
+def score_batch(instrument, responses):
+    """
+    Score many packed responses for one instrument in a single NumPy pass.
+
+    Returns ``(scores, bands)`` arrays, where ``bands`` indexes
+    ``instrument.labels``.
+    """
+    import numpy as np
+
+    matrix = np.frombuffer(b''.join(bytes(response) for response in responses), dtype=np.uint8)
+    matrix = matrix.reshape(-1, instrument.items)
+    scores = matrix.sum(axis=1, dtype=np.int16)
+    bands = np.searchsorted(np.asarray(instrument.floors), scores, side='right') - 1
+    return scores, bands
+
+
+def score_assessments(assessments):
+    """
+    Set ``score`` and ``severity`` on ``Assessment`` instances, one batch per instrument.
+
+    A blank ``result`` is filled in with the score for clients that only read
+    that. Assessments without item responses or for unknown instruments are
+    left unscored.
+    """
+    groups = defaultdict(list)
+    for assessment in assessments:
+        instrument = INSTRUMENTS.get(assessment.type)
+        if instrument is None or not assessment.responses:
+            assessment.score, assessment.severity = None, ''
+        else:
+            groups[instrument].append(assessment)
+    for instrument, group in groups.items():
+        scores, bands = score_batch(instrument, [assessment.responses for assessment in group])
+        for assessment, score, band in zip(group, scores.tolist(), bands.tolist()):
+            assessment.score, assessment.severity = score, instrument.labels[band]
+            if not assessment.result:
+                assessment.result = f'Score {score} ({assessment.severity})'
+
+
+def _percentiles(histograms, values):
+    """Nearest-rank percentiles for each row of a score histogram matrix."""
+    import numpy as np
+
+    cumulative = histograms.cumsum(axis=1)
+    totals = cumulative[:, -1:]
+    result = {}
+    for q in PERCENTILES:
+        ranks = np.maximum(np.ceil(totals * q / 100), 1)
+        result[f'p{q}'] = values[(cumulative >= ranks).argmax(axis=1)]
+    return result
+
+
+def cohort_stats(queryset, instrument, period='week'):
+    """
+    Score distribution, severity bands and a per-``period`` trend for ``instrument``.
+
+    The database makes the single pass over the assessments: it returns one
+    count per (bucket, score), read from the (type, created_at, score) index,
+    and everything else is computed from that histogram with NumPy.
+    """
+    import numpy as np
+
+    rows = list(queryset.filter(type=instrument.name, score__isnull=False).order_by()
+                .values_list(Trunc('created_at', period, output_field=DateField()), 'score')
+                .annotate(n=Count('id')))
+    buckets = sorted({bucket for bucket, _, _ in rows})
+    positions = {bucket: index for index, bucket in enumerate(buckets)}
+    histograms = np.zeros((len(buckets), instrument.max_score + 1), dtype=np.int64)
+    if rows:
+        bucket_column, score_column, sizes = zip(*rows)
+        np.add.at(histograms, ([positions[bucket] for bucket in bucket_column], score_column), sizes)
+
+    values = np.arange(instrument.max_score + 1)
+    floors = list(instrument.floors)
+    overall = histograms.sum(axis=0, keepdims=True)
+    total = int(overall.sum())
+    counts, sums = histograms.sum(axis=1), histograms @ values
+    bands = np.add.reduceat(histograms, floors, axis=1)
+    percentiles = _percentiles(histograms, values)
+    overall_percentiles = _percentiles(overall, values) if total else {}
+    return {
+        'type': instrument.name,
+        'period': period,
+        'count': total,
+        'mean': round(float(overall[0] @ values) / total, 2) if total else None,
+        'percentiles': {name: int(value[0]) for name, value in overall_percentiles.items()},
+        'severity': dict(zip(instrument.labels, np.add.reduceat(overall, floors, axis=1)[0].tolist())),
+        'trend': [
+            {
+                'bucket': bucket,
+                'count': int(counts[index]),
+                'mean': round(float(sums[index]) / counts[index], 2),
+                **{name: int(value[index]) for name, value in percentiles.items()},
+                'severity': dict(zip(instrument.labels, bands[index].tolist())),
+            }
+            for index, bucket in enumerate(buckets)
+        ],
+    }
@@ -0,0 +1,182 @@
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.apps import apps
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from rest_framework import filters
+
+from .models import SearchTerm
+
+# Fields kept in the token index per model; these mirror the viewsets'
+# search_fields so IndexedSearchFilter matches what SearchFilter searched.
+INDEXED_FIELDS = {
+    'example.user': ['name', 'email'],
+    'example.profile': ['user__name', 'location'],
+    'example.professional': ['user__name', 'specialization'],
+    'example.appointment': ['professional__user__name', 'status'],
+}
+
+TERM_MAX_LENGTH = SearchTerm._meta.get_field('term').max_length
+MAX_QUERY_TERMS = 8
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [token[:TERM_MAX_LENGTH] for token in TOKEN.findall(str(text or '').lower())]
+
+
+def indexed_fields(model):
+    return INDEXED_FIELDS.get(model._meta.label_lower)
+
+
+def resolve(instance, path):
+    value = instance
+    for part in path.split('__'):
+        value = getattr(value, part, None)
+        if value is None:
+            return ''
+    return value
+
+
+def terms_for(instance, fields):
+    return Counter(token for path in fields for token in tokenize(resolve(instance, path)))
+
+
+@lru_cache(maxsize=None)
+def dependents(model):
+    """
+    Return ``(indexed model, lookup)`` pairs whose terms are read through
+    ``model``, e.g. ``(Appointment, 'professional__user')`` for ``User``.
+    """
+    pairs = []
+    for label, fields in INDEXED_FIELDS.items():
+        indexed = apps.get_model(label)
+        lookups = set()
+        for path in fields:
+            current, parts = indexed, path.split('__')
+            for depth, part in enumerate(parts[:-1], start=1):
+                current = current._meta.get_field(part).related_model
+                if current is model:
+                    lookups.add('__'.join(parts[:depth]))
+        pairs.extend((indexed, lookup) for lookup in sorted(lookups))
+    return tuple(pairs)
+
+
+def watched_models():
+    """Models whose changes can alter the index: indexed ones and those they read through."""
+    models = set()
+    for label, fields in INDEXED_FIELDS.items():
+        current = apps.get_model(label)
+        models.add(current)
+        for path in fields:
+            model = current
+            for part in path.split('__')[:-1]:
+                model = model._meta.get_field(part).related_model
+                models.add(model)
+    return models
+
+
+def index_instance(instance):
+    """
+    Re-index one object; returns True when its terms changed.
+
+    Objects whose indexed text did not change are left alone, which also
+    spares their dependents from being re-indexed.
+    """
+    fields = indexed_fields(type(instance))
+    label = instance._meta.label_lower
+    terms = terms_for(instance, fields)
+    stored = SearchTerm.objects.filter(model=label, object_id=instance.pk)
+    if Counter(dict(stored.values_list('term', 'weight'))) == terms:
+        return False
+    stored.delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(model=label, object_id=instance.pk, term=term, weight=weight) for term, weight in terms.items()
+    )
+    return True
+
+
+def index_queryset(queryset, chunk_size=1000):
+    """Re-index every object in ``queryset`` with chunked deletes and inserts."""
+    fields = indexed_fields(queryset.model)
+    label = queryset.model._meta.label_lower
+    related = {path.rsplit('__', 1)[0] for path in fields if '__' in path}
+    queryset = queryset.select_related(*related) if related else queryset
+
+    chunk = []
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(instance)
+        if len(chunk) >= chunk_size:
+            _replace_terms(label, fields, chunk)
+            chunk = []
+    if chunk:
+        _replace_terms(label, fields, chunk)
+
+
+def _replace_terms(label, fields, instances):
+    SearchTerm.objects.filter(model=label, object_id__in=[instance.pk for instance in instances]).delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(model=label, object_id=instance.pk, term=term, weight=weight)
+        for instance in instances
+        for term, weight in terms_for(instance, fields).items()
+    )
+
+
+def unindex_instance(instance):
+    SearchTerm.objects.filter(model=instance._meta.label_lower, object_id=instance.pk).delete()
+
+
+def rank(model, terms):
+    """
+    Return ``SearchTerm`` rows grouped into ``(object_id, score)`` for the
+    objects matching every term as a prefix; exact token matches score double.
+
+    The result is a lazy queryset, meant to be used as a subquery of the
+    searched table so ranking, filtering and pagination all stay in SQL.
+    """
+    matches = Q()
+    matched_term = []
+    score = []
+    for position, term in enumerate(terms):
+        matches |= Q(term__startswith=term)
+        matched_term.append(When(term__startswith=term, then=Value(position)))
+        score.append(When(term=term, then=F('weight') * 2))
+        score.append(When(term__startswith=term, then=F('weight')))
+
+    return (
+        SearchTerm.objects.filter(matches, model=model._meta.label_lower)
+        .values('object_id')
+        .annotate(
+            hits=Count(Case(*matched_term, output_field=IntegerField()), distinct=True),
+            score=Sum(Case(*score, default=Value(0), output_field=IntegerField())),
+        )
+        .filter(hits=len(terms))
+    )
+
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for ``SearchFilter`` backed by the ``SearchTerm`` index.
+
+    Terms are matched as prefixes of indexed tokens (all terms must match) and
+    results are annotated with ``search_rank`` and ordered by it. Models
+    without an index entry fall back to ``SearchFilter``'s icontains scan.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if indexed_fields(queryset.model) is None:
+            return super().filter_queryset(request, queryset, view)
+
+        # Cut to the indexed token length like stored terms, or long words would never match
+        terms = list(dict.fromkeys(
+            term for text in self.get_search_terms(request) for term in tokenize(text)
+        ))[:MAX_QUERY_TERMS]
+        if not terms:
+            return queryset
+
+        ranked = rank(queryset.model, terms)
+        search_rank = Subquery(ranked.filter(object_id=OuterRef('pk')).values('score'), output_field=IntegerField())
+        return (queryset.filter(pk__in=ranked.values('object_id'))
+                .annotate(search_rank=search_rank)
+                .order_by('-search_rank', '-pk'))
@@ -1,43 +1,104 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import User, Profile, Assessment, HealthData, Feedback, Professional, Appointment, Clinic
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from . import images, scoring
+from .models import (User, Profile, Assessment, HealthData, Feedback, Professional, Appointment, Clinic,
+                     ChatMessage)
+from .sparse import SparseFieldsSerializerMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'name', 'email', 'password']
         extra_kwargs = {'password': {'write_only': True}}
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    # Thumbnail URLs by variant name ("64.jpg", "256.webp", ...)
+    profile_picture_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Profile
-        fields = '__all__'
+        exclude = ['profile_picture_hash']
+        expandable = {'user': UserSerializer}
+
+    def get_profile_picture_variants(self, obj):
+        if not obj.profile_picture:
+            return None
+        base = reverse('profile-detail', kwargs={'pk': obj.pk}, request=self.context.get('request'))
+        return {variant: f'{base}picture/{variant}/?v={obj.profile_picture_hash[:12]}'
+                for variant in images.VARIANTS}
+
+
+class ResponsesField(serializers.ListField):
+    # Item answers as a list of integers, stored packed (see example.scoring)
+    child = serializers.IntegerField(min_value=0, max_value=255)
 
+    def to_representation(self, data):
+        return list(bytes(data))
+
+    def to_internal_value(self, data):
+        return bytes(super().to_internal_value(data))
+
+
+class AssessmentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    responses = ResponsesField(required=False)
 
-class AssessmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Assessment
         fields = '__all__'
+        read_only_fields = ['user', 'score', 'severity']
+        extra_kwargs = {'result': {'required': False, 'allow_blank': True}}
+        expandable = {'user': UserSerializer}
+
+    def validate(self, data):
+        kind = data.get('type', getattr(self.instance, 'type', None))
+        responses = data.get('responses', getattr(self.instance, 'responses', b''))
+        result = data.get('result', getattr(self.instance, 'result', ''))
+        instrument = scoring.INSTRUMENTS.get(kind)
+        if instrument is None and responses:
+            raise serializers.ValidationError(
+                {'responses': f'Only {", ".join(scoring.INSTRUMENTS)} assessments are scored.'})
+        if not responses:
+            # Results recorded elsewhere, scored instruments included, are stored as given
+            if not result:
+                raise serializers.ValidationError({'result': 'This field is required.'})
+            return data
+        try:
+            instrument.encode(list(bytes(responses)))
+        except ValueError as exc:
+            raise serializers.ValidationError({'responses': str(exc)})
+        return data
 
 
-class HealthDataSerializer(serializers.ModelSerializer):
+class HealthDataSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = HealthData
         fields = '__all__'
+        expandable = {'user': UserSerializer}
+
 
+class HealthDataBulkSerializer(HealthDataSerializer):
+    # Rows in a bulk upload always belong to the uploading user
+    class Meta(HealthDataSerializer.Meta):
+        read_only_fields = ['user']
 
-class FeedbackSerializer(serializers.ModelSerializer):
+
+class FeedbackSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Feedback
         fields = '__all__'
+        expandable = {'user': UserSerializer}
 
 
-class ProfessionalSerializer(serializers.ModelSerializer):
+class ProfessionalSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Professional
         fields = '__all__'
         extra_kwargs = {'user': {'read_only': True}}
+        expandable = {'user': UserSerializer}
 
     def validate_user(self, value):
         # Check if a professional with this user already exists
@@ -51,18 +112,59 @@ class ProfessionalSerializer(serializers.ModelSerializer):
         return value
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = '__all__'
+        expandable = {'user': UserSerializer, 'professional': ProfessionalSerializer}
 
     def validate(self, data):
-        if data['start_time'] >= data['end_time']:
+        # A PATCH may move only one end; the other comes from the stored booking
+        start = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start >= end:
             raise serializers.ValidationError("End time must be after start time.")
         return data
 
-
-class ClinicSerializer(serializers.ModelSerializer):
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.check_overlap(Appointment(**validated_data))
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            proposed = Appointment(pk=instance.pk, professional_id=instance.professional_id,
+                                   start_time=instance.start_time, end_time=instance.end_time,
+                                   status=instance.status)
+            for attr, value in validated_data.items():
+                setattr(proposed, attr, value)
+            self.check_overlap(proposed)
+            return super().update(instance, validated_data)
+
+    def check_overlap(self, appointment):
+        # Lock the professional's row so concurrent bookings for the same
+        # professional queue up here while other professionals proceed.
+        Professional.objects.select_for_update().only('id').get(pk=appointment.professional_id)
+        if not appointment.is_blocking:
+            return
+        clashes = (Appointment.objects.blocking()
+                   .overlapping(appointment.start_time, appointment.end_time)
+                   .filter(professional_id=appointment.professional_id)
+                   .exclude(pk=appointment.pk))
+        if clashes.exists():
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["The professional is already booked for this time."]}
+            )
+
+
+class ClinicSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Clinic
-        fields = '__all__'
+        exclude = ['geo_cell']
+
+
+class ChatMessageSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ChatMessage
+        fields = ['id', 'room', 'sender', 'body', 'created_at']
+        expandable = {'sender': UserSerializer}
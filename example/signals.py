@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import authentication, cache, search, trends
+from .models import HealthData, User
+
+
+@receiver(pre_save, sender=HealthData)
+def remember_health_data(sender, instance, raw=False, **kwargs):
+    # Keep the stored row so post_save can move its counts to the new values
+    instance._trend_previous = None
+    if instance.pk is not None and not raw:
+        instance._trend_previous = HealthData.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=HealthData)
+def count_health_data(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_trend_previous', None)
+    if previous is not None:
+        if trends.as_rows([previous]) == trends.as_rows([instance]):
+            return
+        trends.forget([previous])
+    trends.record([instance])
+
+
+@receiver(post_delete, sender=HealthData)
+def uncount_health_data(sender, instance, **kwargs):
+    trends.forget([instance])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_principal(sender, instance, raw=False, **kwargs):
+    # Like the response cache: drop now and again on commit
+    authentication.forget_principal(instance.pk)
+    transaction.on_commit(lambda: authentication.forget_principal(instance.pk))
+
+
+def reindex(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    changed = True
+    if search.indexed_fields(sender) is not None:
+        changed = search.index_instance(instance)
+    if changed:
+        for model, lookup in search.dependents(sender):
+            search.index_queryset(model.objects.filter(**{lookup: instance}))
+
+
+def unindex(sender, instance, **kwargs):
+    if search.indexed_fields(sender) is not None:
+        search.unindex_instance(instance)
+
+
+for model in search.watched_models():
+    post_save.connect(reindex, sender=model, dispatch_uid=f'search-reindex-{model._meta.label_lower}')
+    post_delete.connect(unindex, sender=model, dispatch_uid=f'search-unindex-{model._meta.label_lower}')
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_responses(sender, **kwargs):
+    if sender._meta.app_label != 'example':
+        return
+    # Bump now, and again on commit so nothing cached while the write was
+    # still uncommitted survives it.
+    cache.invalidate(sender)
+    transaction.on_commit(lambda: cache.invalidate(sender))
@@ -0,0 +1,193 @@
+import functools
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+# Views answering with their serializer's output; other actions ignore ?fields= and ?expand=
+SPARSE_ACTIONS = ('list', 'retrieve')
+
+
+@functools.lru_cache(maxsize=None)
+def field_sources(serializer_class):
+    """``{name: source}`` for the fields ``serializer_class`` outputs, in output order."""
+    return {name: field.source for name, field in serializer_class().fields.items() if not field.write_only}
+
+
+def _names(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class Fieldset:
+    """
+    What one serializer should output: ``fields`` (None for all of them) and
+    a child ``Fieldset`` per relation in ``expand``.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.fields = None
+        self.expand = {}
+
+    @classmethod
+    def parse(cls, serializer_class, fields, expand):
+        """
+        Build a fieldset from ``?fields=`` and ``?expand=`` values.
+
+        Both are comma-separated; dotted paths reach into expanded relations
+        (``expand=professional.user&fields=id,professional.user.name``).
+        Raises ``ValidationError`` for names the serializer cannot output.
+        """
+        root = cls(serializer_class)
+        for path in _names(expand):
+            node = root
+            for name in path.split('.'):
+                expandable = getattr(node.serializer_class.Meta, 'expandable', {})
+                if name not in expandable:
+                    choices = ', '.join(expandable) or 'nothing'
+                    raise ValidationError({'expand': f'"{name}" cannot be expanded here; choose from {choices}.'})
+                node = node.expand.setdefault(name, cls(expandable[name]))
+        for path in _names(fields):
+            *relations, name = path.split('.')
+            node = root
+            for relation in relations:
+                if relation not in node.expand:
+                    raise ValidationError({'fields': f'Expand "{relation}" to select its fields.'})
+                node = node.expand[relation]
+            if name not in field_sources(node.serializer_class):
+                raise ValidationError({'fields': f'Unknown field "{path}".'})
+            node.fields = (node.fields or set()) | {name}
+        return root
+
+    def selected(self):
+        """Names to output; expanded relations are kept even when not listed in ``fields``."""
+        names = field_sources(self.serializer_class)
+        return [name for name in names if self.fields is None or name in self.fields or name in self.expand]
+
+    def columns(self, model, prefix=''):
+        """
+        Field paths for ``QuerySet.only()``, or None when a selected field is
+        not a plain column (a method field, a dotted source, a prefetched
+        relation), since deferring what it reads would cost a query per row.
+        """
+        sources = field_sources(self.serializer_class)
+        paths = [prefix + model._meta.pk.name]
+        for name in self.selected():
+            try:
+                field = model._meta.get_field(sources[name])
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete:
+                return None
+            paths.append(prefix + field.name)
+            if name in self.expand:
+                nested = self.expand[name].columns(field.related_model, f'{prefix}{field.name}__')
+                if nested is None:
+                    return None
+                paths.extend(nested)
+        return paths
+
+    def related(self, model, prefix='', prefetch=False):
+        """``(select_related, prefetch_related)`` paths loading every expanded relation up front."""
+        sources = field_sources(self.serializer_class)
+        selects, prefetches = [], []
+        for name, child in self.expand.items():
+            field = model._meta.get_field(sources[name])
+            path = prefix + field.name
+            # Single-valued forward relations join; anything else, or below a prefetch, is prefetched
+            nested_prefetch = prefetch or not (field.concrete and (field.many_to_one or field.one_to_one))
+            (prefetches if nested_prefetch else selects).append(path)
+            nested_selects, nested_prefetches = child.related(field.related_model, f'{path}__', nested_prefetch)
+            selects.extend(nested_selects)
+            prefetches.extend(nested_prefetches)
+        return selects, prefetches
+
+    def apply(self, queryset, keep=()):
+        """Restrict ``queryset`` to the columns this fieldset outputs (plus ``keep``) and load its expansions."""
+        selects, prefetches = self.related(queryset.model)
+        if selects:
+            queryset = queryset.select_related(*selects)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        columns = self.columns(queryset.model)
+        if columns is not None:
+            queryset = queryset.only(*dict.fromkeys([*columns, *keep]))
+        return queryset
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Output only the fields of a ``Fieldset`` and inline the relations it expands.
+
+    The top-level serializer reads the fieldset from ``context['fieldset']``
+    (see ``SparseFieldsMixin``); expanded relations become nested, read-only
+    serializers from ``Meta.expandable`` that get their part of it directly.
+    """
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fieldset = fieldset
+
+    def get_fieldset(self):
+        if self.fieldset is not None:
+            return self.fieldset
+        parent = getattr(self, 'parent', None)
+        if parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None):
+            return self.context.get('fieldset')
+        return None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return fields
+        for name, child in fieldset.expand.items():
+            fields[name] = child.serializer_class(fieldset=child, read_only=True)
+        return {name: fields[name] for name in fieldset.selected() if name in fields}
+
+
+class SparseFieldsMixin:
+    """
+    ``?fields=`` and ``?expand=`` for ``list`` and ``retrieve``.
+
+    The parsed ``Fieldset`` trims the serializer output and the SELECT column
+    list, and expanded relations are loaded with ``select_related`` or
+    ``prefetch_related`` so they add no query per row.
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            params = self.request.query_params
+            self._fieldset = None
+            if self.action in SPARSE_ACTIONS and ('fields' in params or 'expand' in params):
+                self._fieldset = Fieldset.parse(self.get_serializer_class(), params.get('fields'),
+                                                params.get('expand'))
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            context['fieldset'] = fieldset
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return queryset
+        # The pagination key is read from the last row of the page; annotations
+        # it orders by (search_rank) are selected anyway and cannot be deferred
+        ordering = [*queryset.query.order_by, getattr(self.paginator, 'ordering', None)]
+        names = [field.lstrip('-') for field in ordering if isinstance(field, str) and '__' not in field]
+        keep = [name for name in names if name not in queryset.query.annotations]
+        return fieldset.apply(queryset, keep=keep)
+
+    def get_fast_serializer(self):
+        fast = super().get_fast_serializer()
+        fieldset = self.get_fieldset()
+        if fast is None or fieldset is None:
+            return fast
+        if fieldset.expand:
+            return None
+        return fast.subset(fieldset.selected())
@@ -1,9 +1,70 @@
+import asyncio
+import csv
+import decimal
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from example import advisor, authentication, bench, coldstart, images, ratelimit, scoring, search, views
+from example.cache import LocalLRUBackend
+from example.chat import Outbox, WriteBehind, parse_room
+from example.consumer import ChatConsumer
+from example.db_router import ReplicaRouter
+from example.exports import ExportMixin
+from example.fastpath import compile_serializer
+from example.filters import CachedFilterBackend
+from example.layers import MeteredInMemoryChannelLayer
+from example.metrics import LATENCY_BUCKETS, REGISTRY, Histogram, RollingHistogram
+from example.middleware import LoadSheddingMiddleware, ReplicaStickinessMiddleware
+from example.models import (Profile, Appointment, Assessment, ChatMessage, Clinic, Feedback, HealthData,
+                            Professional, SearchTerm, User)
+from example.parsers import MessagePackParser
+from example.permissions import IsOwner
+from example.queries import QueryRecorder
+from example.renderers import FastJSONRenderer, MessagePackRenderer
+from example.routing import JWTAuthMiddleware
+from example.serializers import AssessmentSerializer, ClinicSerializer, HealthDataSerializer
+
+# Keep the host-wide buckets out of the suite: every run would share them
+_local_rate_limit = override_settings(RATE_LIMIT={'BACKEND': 'example.ratelimit.LocalBuckets',
+                                                  'RATES': {'users': '20/hour', 'token': '30/min'}})
+
 
-from example.models import Profile, Appointment, Clinic, Professional, User
+def setUpModule():
+    _local_rate_limit.enable()
+
+
+def tearDownModule():
+    _local_rate_limit.disable()
 
 
 class APITests(APITestCase):
@@ -173,3 +234,1788 @@ class APITests(APITestCase):
         response = self.client.patch(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['specialization'], "Updated Specialization")
+
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="pageuser@example.com",
+            name="Page User",
+            password="password123"
+        )
+        self.client.force_authenticate(user=self.user)
+        HealthData.objects.bulk_create([
+            HealthData(user=self.user, mood=f"Mood {i}", symptoms="None") for i in range(7)
+        ])
+
+    def test_list_is_paginated_with_cursor_links(self):
+        url = reverse('healthdata-list') + "?page_size=3"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+        self.assertNotIn('count', response.data)
+
+    def test_walking_cursors_visits_every_row_once(self):
+        seen = []
+        url = reverse('healthdata-list') + "?page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(sorted(seen), sorted(HealthData.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_previous_cursor_returns_the_earlier_page(self):
+        url = reverse('healthdata-list') + "?page_size=3"
+        first = self.client.get(url)
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([row['id'] for row in back.data['results']],
+                         [row['id'] for row in first.data['results']])
+
+    def test_ordering_filter_keys_the_cursor(self):
+        url = reverse('user-list') + "?ordering=name&page_size=1"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_invalid_cursor(self):
+        url = reverse('healthdata-list') + "?cursor=not-a-cursor"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_size_is_bounded(self):
+        url = reverse('healthdata-list') + "?page_size=100000"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(response.data['results']), 500)
+
+
+class NearbyClinicTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for name, lat, lng in [("Near", 10.01, 20.01), ("Mid", 10.2, 20.2), ("Far", 12.0, 22.0),
+                               ("East of antimeridian", -17.0, 179.99), ("West of antimeridian", -17.0, -179.99)]:
+            Clinic.objects.create(name=name, address="1 St", phone="555", email=f"{lat}@example.com",
+                                  latitude=lat, longitude=lng)
+
+    def test_nearby_sorted_by_distance_within_radius(self):
+        url = reverse('clinic-list') + "?near=10.0,20.0&radius_km=50"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['name'] for c in response.data], ["Near", "Mid"])
+        self.assertLess(response.data[0]['distance_km'], response.data[1]['distance_km'])
+
+    def test_nearby_without_radius_widens_until_limit(self):
+        url = reverse('clinic-list') + "?near=10.0,20.0&limit=3"
+        response = self.client.get(url)
+        self.assertEqual([c['name'] for c in response.data], ["Near", "Mid", "Far"])
+
+    def test_nearby_across_antimeridian(self):
+        url = reverse('clinic-list') + "?near=-17.0,179.9&radius_km=50"
+        response = self.client.get(url)
+        self.assertEqual({c['name'] for c in response.data}, {"East of antimeridian", "West of antimeridian"})
+
+    def test_bulk_writes_keep_cells_current(self):
+        url = reverse('clinic-list') + "?near=40.0,-74.0&radius_km=10"
+        Clinic.objects.bulk_create([Clinic(name="Bulk", address="1 St", phone="555", email="bulk@example.com",
+                                           latitude=40.01, longitude=-74.01)])
+        Clinic.objects.filter(name="Far").update(latitude=40.02, longitude=-73.99)
+        moved = Clinic.objects.get(name="Mid")
+        moved.latitude, moved.longitude = 39.99, -74.0
+        Clinic.objects.bulk_update([moved], ['latitude', 'longitude'])
+        self.assertEqual({c['name'] for c in self.client.get(url).data}, {"Bulk", "Far", "Mid"})
+
+    def test_geo_cell_command_repairs_stale_rows(self):
+        # As rows written before the column existed
+        Clinic.objects.filter(name="Near").update(geo_cell=0)
+        with self.assertRaises(CommandError):
+            call_command('clinic_geo_cells', '--verify', stdout=io.StringIO())
+        call_command('clinic_geo_cells', stdout=io.StringIO())
+        call_command('clinic_geo_cells', '--verify', stdout=io.StringIO())
+        response = self.client.get(reverse('clinic-list') + "?near=10.0,20.0&radius_km=5")
+        self.assertEqual([c['name'] for c in response.data], ["Near"])
+
+    def test_nearby_rejects_malformed_point(self):
+        response = self.client.get(reverse('clinic-list') + "?near=north")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('near', response.data)
+
+    def test_nearby_rejects_non_finite_radius(self):
+        for radius in ('nan', 'inf'):
+            response = self.client.get(reverse('clinic-list') + f"?near=10.0,20.0&radius_km={radius}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('radius_km', response.data)
+
+
+class AvailabilityTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = User.objects.create_user(email="patient@example.com", name="Patient", password="password123")
+        self.professionals = []
+        for i in range(3):
+            user = User.objects.create_user(email=f"pro{i}@example.com", name=f"Pro {i}", password="password123")
+            self.professionals.append(Professional.objects.create(
+                user=user, specialization="Therapist" if i < 2 else "Dentist", bio=""))
+        self.day = datetime(2024, 10, 10, tzinfo=timezone.get_current_timezone())
+
+    def book(self, professional, start_hour, end_hour, status="Scheduled"):
+        return Appointment.objects.create(
+            user=self.patient, professional=professional, status=status,
+            start_time=self.day + timedelta(hours=start_hour),
+            end_time=self.day + timedelta(hours=end_hour),
+        )
+
+    def availability(self, **params):
+        params.setdefault('start_time', '2024-10-10T09:00:00Z')
+        params.setdefault('end_time', '2024-10-10T17:00:00Z')
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.client.get(reverse('professional-availability') + '?' + query)
+
+    def test_free_intervals_merge_overlapping_appointments(self):
+        first = self.professionals[0]
+        self.book(first, 10, 12)
+        self.book(first, 11, 13)
+        self.book(first, 15, 18)
+        self.book(first, 13, 14, status="Cancelled")
+
+        response = self.availability()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        free = {row['professional']: row['free'] for row in response.data['results']}
+        self.assertEqual(free[first.id], [
+            {'start': '2024-10-10T09:00:00Z', 'end': '2024-10-10T10:00:00Z'},
+            {'start': '2024-10-10T13:00:00Z', 'end': '2024-10-10T15:00:00Z'},
+        ])
+        self.assertEqual(free[self.professionals[1].id],
+                         [{'start': '2024-10-10T09:00:00Z', 'end': '2024-10-10T17:00:00Z'}])
+
+    def test_slots_and_specialization(self):
+        self.book(self.professionals[0], 9, 16)
+        response = self.availability(specialization='therapist', slot_minutes=30)
+        rows = {row['professional']: row['free'] for row in response.data['results']}
+        self.assertEqual(set(rows), {self.professionals[0].id, self.professionals[1].id})
+        self.assertEqual(len(rows[self.professionals[0].id]), 2)
+        self.assertEqual(len(rows[self.professionals[1].id]), 16)
+
+    def test_list_with_window_uses_availability(self):
+        url = reverse('professional-list') + '?start_time=2024-10-10T09:00:00Z&end_time=2024-10-10T10:00:00Z'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_query_count_is_independent_of_professionals(self):
+        for professional in self.professionals:
+            self.book(professional, 10, 11)
+        with self.assertNumQueries(2):
+            self.availability()
+
+    def test_rejects_inverted_window(self):
+        response = self.availability(start_time='2024-10-10T17:00:00Z', end_time='2024-10-10T09:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rejects_impossible_date(self):
+        response = self.availability(start_time='2024-02-30T09:00:00Z')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('start_time', response.data)
+
+
+class BookingTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="booker@example.com", name="Booker", password="password123")
+        self.client.force_authenticate(user=self.user)
+        pro_user = User.objects.create_user(email="bookedpro@example.com", name="Booked Pro", password="password123")
+        self.professional = Professional.objects.create(user=pro_user, specialization="Therapist", bio="")
+
+    def book(self, start, end, status="Scheduled"):
+        data = {
+            "user": self.user.id,
+            "professional": self.professional.id,
+            "start_time": start,
+            "end_time": end,
+            "status": status,
+        }
+        return self.client.post(reverse('appointment-list'), data, format='json')
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book("2024-10-10T10:00:00Z", "2024-10-10T11:00:00Z").status_code,
+                         status.HTTP_201_CREATED)
+        response = self.book("2024-10-10T10:30:00Z", "2024-10-10T11:30:00Z")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', response.data)
+
+    def test_adjacent_and_cancelled_bookings_are_allowed(self):
+        self.assertEqual(self.book("2024-10-10T10:00:00Z", "2024-10-10T11:00:00Z").status_code,
+                         status.HTTP_201_CREATED)
+        self.assertEqual(self.book("2024-10-10T11:00:00Z", "2024-10-10T12:00:00Z").status_code,
+                         status.HTTP_201_CREATED)
+        self.assertEqual(self.book("2024-10-10T10:30:00Z", "2024-10-10T11:30:00Z", "Cancelled").status_code,
+                         status.HTTP_201_CREATED)
+
+    def test_overlap_check_runs_under_the_professional_lock(self):
+        # ConcurrentBookingTests needs SELECT ... FOR UPDATE and is skipped on
+        # SQLite; this checks the statement order that the lock relies on on
+        # every backend: lock the professional, look for clashes, then insert.
+        with CaptureQueriesContext(connection) as queries:
+            self.book("2024-10-10T10:00:00Z", "2024-10-10T11:00:00Z")
+        statements = [query['sql'] for query in queries.captured_queries]
+        insert = next(i for i, sql in enumerate(statements) if sql.startswith('INSERT INTO "appointment_table"'))
+        lock = max(i for i, sql in enumerate(statements[:insert]) if 'FROM "professional_table"' in sql)
+        clash = max(i for i, sql in enumerate(statements[:insert]) if 'FROM "appointment_table"' in sql)
+        self.assertLess(lock, clash)
+        self.assertTrue(any(sql.startswith('SAVEPOINT') for sql in statements[:lock]))
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', statements[lock])
+
+    def test_rescheduling_does_not_clash_with_itself(self):
+        created = self.book("2024-10-10T10:00:00Z", "2024-10-10T11:00:00Z")
+        url = reverse('appointment-detail', args=[created.data['id']])
+        data = {**created.data, "end_time": "2024-10-10T11:30:00Z"}
+        response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_partial_reschedule_is_validated_against_the_stored_times(self):
+        self.book("2024-10-10T12:00:00Z", "2024-10-10T13:00:00Z")
+        created = self.book("2024-10-10T10:00:00Z", "2024-10-10T11:00:00Z")
+        url = reverse('appointment-detail', args=[created.data['id']])
+        response = self.client.patch(url, {"end_time": "2024-10-10T11:30:00Z"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(url, {"start_time": "2024-10-10T12:00:00Z"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', response.data)
+        response = self.client.patch(url, {"end_time": "2024-10-10T12:30:00Z"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('already booked', str(response.data))
+
+
+# SQLite has no row locks (and serializes writers anyway), so this only runs on
+# MySQL/PostgreSQL; BookingTests checks the lock-then-check order everywhere.
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingTests(TransactionTestCase):
+    threads = 16
+    attempts_per_thread = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="crowd@example.com", name="Crowd", password="password123")
+        self.professionals = [
+            Professional.objects.create(
+                user=User.objects.create_user(email=f"busy{i}@example.com", name=f"Busy {i}", password="x"),
+                specialization="Therapist", bio="")
+            for i in range(4)
+        ]
+
+    def test_parallel_bookings_never_overlap(self):
+        start = datetime(2024, 10, 10, 9, tzinfo=timezone.get_current_timezone())
+        barrier = threading.Barrier(self.threads)
+
+        def worker(seed):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            rng = random.Random(seed)
+            barrier.wait()
+            try:
+                for _ in range(self.attempts_per_thread):
+                    begin = start + timedelta(minutes=30 * rng.randrange(16))
+                    client.post(reverse('appointment-list'), {
+                        "user": self.user.id,
+                        "professional": rng.choice(self.professionals).id,
+                        "start_time": begin.isoformat(),
+                        "end_time": (begin + timedelta(hours=1)).isoformat(),
+                        "status": "Scheduled",
+                    }, format='json')
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.threads) as pool:
+            list(pool.map(worker, range(self.threads)))
+
+        for professional in self.professionals:
+            rows = list(professional.appointment_set.order_by('start_time').values_list('start_time', 'end_time'))
+            for (_, previous_end), (next_start, _) in zip(rows, rows[1:]):
+                self.assertLessEqual(previous_end, next_start)
+        self.assertGreater(Appointment.objects.count(), 0)
+
+
+class HealthDataBulkTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="bulk@example.com", name="Bulk", password="password123")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('healthdata-bulk')
+
+    def test_json_array_reports_per_row_errors(self):
+        rows = [
+            {"mood": "Good", "symptoms": "None"},
+            {"mood": "Bad"},
+            {"mood": "Okay", "symptoms": "Headache"},
+        ]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertIn('symptoms', response.data['errors'][0]['errors'])
+        self.assertEqual(HealthData.objects.filter(user=self.user).count(), 2)
+
+    def test_ndjson_stream_is_inserted_in_batches(self):
+        body = "\n".join(json.dumps({"mood": f"Mood {i % 5}", "symptoms": "None"}) for i in range(2500))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2500)
+        self.assertLess(len(queries), 50)  # not one INSERT per row
+
+    def test_malformed_ndjson_inserts_nothing(self):
+        body = '{"mood": "Good", "symptoms": "None"}\nnot json\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(HealthData.objects.exists())
+
+    def test_rejects_single_object(self):
+        response = self.client.post(self.url, {"mood": "Good", "symptoms": "None"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class HealthTrendTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="trend@example.com", name="Trend", password="password123")
+        self.client.force_authenticate(user=self.user)
+
+    def trends(self, period):
+        response = self.client.get(reverse('healthdata-trends') + f"?period={period}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['buckets']
+
+    def test_rollups_follow_create_update_and_delete(self):
+        first = HealthData.objects.create(user=self.user, mood="Good", symptoms="Headache, Fatigue")
+        HealthData.objects.create(user=self.user, mood="Good", symptoms="headache")
+        third = HealthData.objects.create(user=self.user, mood="Bad", symptoms="")
+
+        [bucket] = self.trends('day')
+        self.assertEqual(bucket['total'], 3)
+        self.assertEqual(bucket['moods'], {"Good": 2, "Bad": 1})
+        self.assertEqual(bucket['symptoms'], {"headache": 2, "fatigue": 1})
+
+        first.mood = "Bad"
+        first.save()
+        third.delete()
+        [bucket] = self.trends('month')
+        self.assertEqual(bucket['moods'], {"Good": 1, "Bad": 1})
+
+    def test_bulk_upload_updates_rollups(self):
+        rows = [{"mood": "Calm", "symptoms": "None"}] * 3
+        self.client.post(reverse('healthdata-bulk'), rows, format='json')
+        [bucket] = self.trends('week')
+        self.assertEqual(bucket['moods'], {"Calm": 3})
+
+    def test_reads_do_not_scan_rows(self):
+        HealthData.objects.bulk_create([HealthData(user=self.user, mood="Good", symptoms="") for _ in range(50)])
+        with CaptureQueriesContext(connection) as queries:
+            self.trends('day')
+        self.assertFalse(any('health_data_table' in query['sql'] for query in queries))
+
+    def test_backfill_and_verify_command(self):
+        HealthData.objects.bulk_create([HealthData(user=self.user, mood="Good", symptoms="Cough") for _ in range(5)])
+        with self.assertRaises(CommandError):
+            call_command('healthdata_trends', '--verify', stdout=io.StringIO())
+        call_command('healthdata_trends', stdout=io.StringIO())
+        call_command('healthdata_trends', '--verify', stdout=io.StringIO())
+        [bucket] = self.trends('day')
+        self.assertEqual(bucket['symptoms'], {"cough": 5})
+
+    def test_unknown_period(self):
+        response = self.client.get(reverse('healthdata-trends') + "?period=year")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_trends_are_for_professionals(self):
+        other = User.objects.create_user(email="other@example.com", name="Other", password="password123")
+        url = reverse('healthdata-trends') + f"?user={other.pk}"
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        Professional.objects.create(user=self.user, specialization="Therapist", bio="")
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+class IndexedSearchTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.jane = User.objects.create_user(email="jane.doe@example.com", name="Jane Doe", password="password123")
+        self.john = User.objects.create_user(email="john@example.com", name="John Janeway", password="password123")
+        self.client.force_authenticate(user=self.jane)
+        self.professional = Professional.objects.create(user=self.jane, specialization="Child Psychology", bio="")
+        Appointment.objects.create(user=self.john, professional=self.professional, status="Scheduled",
+                                   start_time=timezone.now(), end_time=timezone.now() + timezone.timedelta(hours=1))
+
+    def search(self, name, query):
+        response = self.client.get(reverse(f'{name}-list') + f"?search={query}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_prefix_and_multi_term_queries(self):
+        self.assertEqual({u['id'] for u in self.search('user', 'jan')}, {self.jane.id, self.john.id})
+        self.assertEqual([u['id'] for u in self.search('user', 'jan doe')], [self.jane.id])
+        self.assertEqual(self.search('user', 'nobody'), [])
+
+    def test_exact_matches_rank_first(self):
+        self.assertEqual([u['id'] for u in self.search('user', 'jane')], [self.jane.id, self.john.id])
+
+    def test_ranked_results_paginate_by_rank(self):
+        first = self.client.get(reverse('user-list') + "?search=jane&page_size=1")
+        second = self.client.get(first.data['next'])
+        self.assertEqual([u['id'] for u in first.data['results'] + second.data['results']],
+                         [self.jane.id, self.john.id])
+
+    def test_related_fields_are_indexed_and_follow_renames(self):
+        self.assertEqual(len(self.search('professional', 'psych')), 1)
+        self.assertEqual(len(self.search('appointment', 'jane')), 1)
+
+        self.jane.name = "Janet Smith"
+        self.jane.save()
+        self.assertEqual(len(self.search('appointment', 'smith')), 1)
+        self.assertEqual(self.search('appointment', 'doe'), [])
+
+    def test_deleted_objects_leave_the_index(self):
+        self.john.delete()
+        self.assertFalse(SearchTerm.objects.filter(model='example.user', object_id=self.john.id).exists())
+
+    def test_rebuild_command_restores_the_index(self):
+        SearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(len(self.search('professional', 'child')), 1)
+
+    def test_search_does_not_scan_the_searched_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search('user', 'jane')
+        self.assertFalse(any('"user_table"."name" LIKE' in query['sql'] for query in queries))
+
+    def test_filters_apply_to_ranked_results(self):
+        response = self.client.get(reverse('user-list') + "?search=jane&email=john@example.com")
+        self.assertEqual([u['id'] for u in response.data['results']], [self.john.id])
+
+    def test_every_match_is_reachable_through_pages(self):
+        users = User.objects.bulk_create(User(email=f"pat{i}@example.com", name=f"Pat {i}") for i in range(7))
+        search.index_queryset(User.objects.filter(pk__in=[user.pk for user in users]))
+        seen, url = [], reverse('user-list') + "?search=pat&page_size=3"
+        while url:
+            response = self.client.get(url)
+            seen.extend(u['id'] for u in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(sorted(seen), sorted(user.pk for user in users))
+
+    def test_terms_longer_than_the_index_still_match(self):
+        word = "x" * (search.TERM_MAX_LENGTH + 10)
+        user = User.objects.create_user(email="long@example.com", name=f"Long {word}", password="x")
+        self.assertEqual([u['id'] for u in self.search('user', word)], [user.id])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.clinic = Clinic.objects.create(name="Cached Clinic", address="1 St", phone="555",
+                                            email="cached@example.com", latitude=1.0, longitude=2.0)
+        self.url = reverse('clinic-list')
+
+    def test_repeat_reads_skip_the_database(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_invalidate_entries(self):
+        etag = self.client.get(self.url)['ETag']
+        self.clinic.name = "Renamed Clinic"
+        self.clinic.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['name'], "Renamed Clinic")
+
+    def test_related_user_changes_invalidate_professionals(self):
+        user = User.objects.create_user(email="cachedpro@example.com", name="Before", password="password123")
+        Professional.objects.create(user=user, specialization="Therapist", bio="")
+        url = reverse('professional-list')
+        self.client.get(url)
+        user.name = "After"
+        user.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertGreater(len(queries), 0)
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url + "?name=Other")
+        self.assertEqual(response.data['results'], [])
+
+    def test_host_is_part_of_the_key(self):
+        Clinic.objects.create(name="Second Clinic", address="2 St", phone="555", email="second@example.com",
+                              latitude=1.0, longitude=2.0)
+        self.client.get(self.url + "?page_size=1", HTTP_HOST='localhost')
+        # Not the first host's entry, whose pagination links point at that host
+        response = self.client.get(self.url + "?page_size=1", HTTP_HOST='127.0.0.1')
+        self.assertIn('//127.0.0.1/', json.loads(response.content)['next'])
+
+    def test_browsable_api_is_not_cached(self):
+        user = User.objects.create_user(email="browser@example.com", name="Browser", password="password123")
+        self.client.force_authenticate(user=user)
+        self.client.get(self.url, HTTP_ACCEPT='text/html')
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url, HTTP_ACCEPT='text/html')
+        self.assertNotContains(response, "Browser")
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_lru_evicts_oldest_entries(self):
+        backend = LocalLRUBackend(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            backend.set(key, key)
+        self.assertIsNone(backend.get('a'))
+        self.assertEqual(backend.get('c'), 'c')
+
+
+class QueryBudgetTestMixin:
+    """Fail when an endpoint's query count grows with the number of rows it returns."""
+
+    def count_queries(self, url):
+        with QueryRecorder() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return recorder.count
+
+    def assertConstantQueries(self, name, make_rows, small=2, large=12):
+        make_rows(small)
+        url = reverse(f'{name}-list')
+        few = self.count_queries(f'{url}?page_size={small}')
+        make_rows(large - small)
+        many = self.count_queries(f'{url}?page_size={large}')
+        self.assertEqual(few, many, f'{name} list ran {few} queries for {small} rows but {many} for {large}')
+
+
+class ConstantQueryTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="budget@example.com", name="Budget", password="password123")
+        self.client.force_authenticate(user=self.user)
+        self.serial = 0
+
+    def count_queries(self, url):
+        # A fresh instance per request, as real requests get, so relations looked up once are not cached across them
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        return super().count_queries(url)
+
+    def make_users(self, count):
+        users = []
+        for _ in range(count):
+            self.serial += 1
+            users.append(User(email=f"budget{self.serial}@example.com", name=f"Budget {self.serial}"))
+        return User.objects.bulk_create(users)
+
+    def make_professionals(self, count):
+        return Professional.objects.bulk_create(
+            Professional(user=user, specialization="Therapist", bio="") for user in self.make_users(count))
+
+    def test_users(self):
+        self.assertConstantQueries('user', self.make_users)
+
+    def test_profiles(self):
+        self.assertConstantQueries('profile', lambda count: Profile.objects.bulk_create(
+            Profile(user=user, bio="", location="Here", privacy_settings="Public")
+            for user in self.make_users(count)))
+
+    def test_assessments(self):
+        self.assertConstantQueries('assessment', lambda count: Assessment.objects.bulk_create(
+            Assessment(user=self.user, type="PHQ-9", result="5") for _ in range(count)))
+
+    def test_healthdata(self):
+        self.assertConstantQueries('healthdata', lambda count: HealthData.objects.bulk_create(
+            HealthData(user=self.user, mood="Good", symptoms="") for _ in range(count)))
+
+    def test_feedback(self):
+        self.assertConstantQueries('feedback', lambda count: Feedback.objects.bulk_create(
+            Feedback(user=self.user, message="Thanks") for _ in range(count)))
+
+    def test_professionals(self):
+        self.assertConstantQueries('professional', self.make_professionals)
+
+    def test_appointments(self):
+        def make_appointments(count):
+            start = timezone.now()
+            return Appointment.objects.bulk_create(
+                Appointment(user=self.user, professional=professional, status="Scheduled",
+                            start_time=start, end_time=start + timezone.timedelta(hours=1))
+                for professional in self.make_professionals(count))
+        self.assertConstantQueries('appointment', make_appointments)
+
+    def test_clinics(self):
+        self.assertConstantQueries('clinic', lambda count: Clinic.objects.bulk_create(
+            Clinic(name="Clinic", address="1 St", phone="555", email="c@example.com", latitude=1, longitude=2)
+            for _ in range(count)))
+
+    def test_feedback_filtered_by_professional(self):
+        professional = Professional.objects.create(user=self.user, specialization="Therapist", bio="")
+        Feedback.objects.create(user=self.user, message="Helpful")
+        response = self.client.get(reverse('feedback-list') + f"?professional={professional.id}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_middleware_warns_over_budget(self):
+        with self.settings(QUERY_BUDGET=0), self.assertLogs('example.middleware', level='WARNING') as logs:
+            self.client.get(reverse('feedback-list'))
+        self.assertIn('queries (budget 0)', logs.output[0])
+
+
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        REGISTRY.clear()
+
+    def test_server_timing_header_lists_phases(self):
+        response = self.client.get(reverse('appointment-list'))
+        phases = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(set(phases), {'auth', 'serialize', 'render', 'db', 'total'})
+        self.assertIn('queries', response['Server-Timing'])
+
+    def test_metrics_endpoint_exposes_route_histograms(self):
+        for _ in range(3):
+            self.client.get(reverse('clinic-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('calm_http_request_duration_seconds_count{method="GET",route="clinic-list"} 3', body)
+        self.assertIn('calm_http_request_duration_seconds_quantile{method="GET",route="clinic-list",quantile="0.99"}',
+                      body)
+        self.assertIn('calm_http_request_queries_bucket{route="clinic-list",le="+Inf"} 3', body)
+
+    def test_metric_labels_do_not_follow_arbitrary_input(self):
+        for verb in ('BREW', 'PROPFIND'):
+            self.client.generic(verb, reverse('clinic-list'))
+        self.client.get('/no/such/page/')
+        self.client.get('/no/other/page/')
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('calm_http_request_duration_seconds_count{method="other",route="clinic-list"} 2', body)
+        self.assertIn('calm_http_request_duration_seconds_count{method="GET",route="unmatched"} 2', body)
+        self.assertNotIn('BREW', body)
+
+    def test_metrics_endpoint_needs_an_allowed_address_or_the_token(self):
+        remote = {'REMOTE_ADDR': '203.0.113.7'}
+        self.assertEqual(self.client.get(reverse('metrics'), **remote).status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong', **remote)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret', **remote)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram((1, 2, 3, 4))
+        for value in (0.5, 1.5, 2.5, 3.5):
+            histogram.observe(value)
+        self.assertAlmostEqual(histogram.quantile(0.5), 2.0)
+        self.assertAlmostEqual(histogram.quantile(1.0), 4.0)
+
+
+class FastListTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="fast@example.com", name="Fast User", password="password123")
+        for i in range(5):
+            Assessment.objects.create(user=self.user, type="Anxiety", result=f"Score {i}")
+            HealthData.objects.create(user=self.user, mood="Calm", symptoms="" if i % 2 else "Headache")
+            Clinic.objects.create(name=f"Clinic {i}", address="1 St", phone="555", email=f"c{i}@example.com",
+                                  latitude="40.712776", longitude="-74.005974")
+        self.client.force_authenticate(self.user)
+
+    def assertMatchesSerializer(self, url, model, serializer_class, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [row['id'] for row in response.data['results']]
+        instances = sorted(model.objects.filter(id__in=ids), key=lambda obj: ids.index(obj.id))
+        expected = serializer_class(instances, many=True).data
+        self.assertEqual(JSONRenderer().render(response.data['results']), JSONRenderer().render(expected))
+        return response
+
+    def test_output_is_byte_identical(self):
+        self.assertMatchesSerializer(reverse('assessment-list'), Assessment, AssessmentSerializer)
+        self.assertMatchesSerializer(reverse('healthdata-list'), HealthData, HealthDataSerializer)
+        self.assertMatchesSerializer(reverse('clinic-list'), Clinic, ClinicSerializer)
+
+    def test_active_timezone_is_honoured(self):
+        with timezone.override('America/New_York'):
+            response = self.assertMatchesSerializer(reverse('healthdata-list'), HealthData, HealthDataSerializer)
+        self.assertTrue(response.data['results'][0]['created_at'].endswith(('-04:00', '-05:00')))
+
+    def test_cursor_pages_follow_the_keyset(self):
+        url = reverse('assessment-list')
+        first = self.assertMatchesSerializer(url, Assessment, AssessmentSerializer, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        seen = [row['id'] for row in first.data['results'] + second.data['results']]
+        self.assertEqual(seen, list(Assessment.objects.order_by('-created_at', '-pk').values_list('id', flat=True)[:4]))
+
+    def test_filters_still_apply(self):
+        other = User.objects.create_user(email="other@example.com", name="Other", password="password123")
+        Assessment.objects.create(user=other, type="Mood", result="Fine")
+        Professional.objects.create(user=self.user, specialization="Psychiatrist", bio="Bio")
+        response = self.client.get(reverse('assessment-list'), {'user': other.id})
+        self.assertEqual([row['result'] for row in response.data['results']], ["Fine"])
+
+    def test_unsupported_serializers_fall_back(self):
+        class AnnotatedSerializer(serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Clinic
+                fields = ['id', 'label']
+
+            def get_label(self, obj):
+                return obj.name
+
+        self.assertIsNone(compile_serializer(AnnotatedSerializer))
+        self.assertIsNotNone(compile_serializer(ClinicSerializer))
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="export@example.com", name="Export User", password="password123")
+        self.other = User.objects.create_user(email="other@example.com", name="Other User", password="password123")
+        for i in range(7):
+            HealthData.objects.create(user=self.user, mood=f"Mood {i}", symptoms="Cough, fever")
+        HealthData.objects.create(user=self.other, mood="=SUM(A1:A2)", symptoms="")
+        Assessment.objects.create(user=self.user, type="Anxiety", result="Mild")
+        self.client.force_authenticate(user=self.user)
+
+    def export(self, model, export_format, params=None):
+        response = self.client.get(reverse(f'{model}-export', kwargs={'export_format': export_format}), params,
+                                    HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_csv_streams_all_rows_in_batches(self):
+        with mock.patch.object(ExportMixin, 'export_chunk_size', 3):
+            body = self.export('healthdata', 'csv')
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0], ['id', 'mood', 'symptoms', 'created_at', 'user'])
+        expected = list(HealthData.objects.filter(user=self.user).order_by('pk').values_list('pk', flat=True))
+        self.assertEqual([int(row[0]) for row in rows[1:]], expected)
+
+    def test_only_professionals_export_other_users_rows(self):
+        body = self.export('healthdata', 'csv', {'user': self.other.id})
+        self.assertEqual(len(body.decode().splitlines()), 1)
+        Professional.objects.create(user=self.user, specialization="Therapist", bio="")
+        body = self.export('healthdata', 'csv')
+        self.assertEqual(len(body.decode().splitlines()), 1 + HealthData.objects.count())
+
+    def test_csv_defuses_text_that_looks_like_a_formula(self):
+        self.client.force_authenticate(user=self.other)
+        HealthData.objects.create(user=self.other, mood="-12.5", symptoms="@cmd|' /C calc'!A0")
+        rows = list(csv.reader(io.StringIO(self.export('healthdata', 'csv').decode())))
+        self.assertEqual([row[1:3] for row in rows[1:]], [["'=SUM(A1:A2)", ""], ["-12.5", "'@cmd|' /C calc'!A0"]])
+
+    def test_ndjson_matches_api_representation_and_filters(self):
+        body = self.export('healthdata', 'ndjson', {'user': self.user.id})
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(lines), 7)
+        expected = HealthDataSerializer(HealthData.objects.order_by('pk').first()).data
+        self.assertEqual(lines[0], dict(expected))
+
+    def test_xlsx_keeps_text_that_looks_like_a_formula(self):
+        from openpyxl import load_workbook
+
+        self.client.force_authenticate(user=self.other)
+        workbook = load_workbook(io.BytesIO(self.export('healthdata', 'xlsx')))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('id', 'mood', 'symptoms', 'created_at', 'user'))
+        self.assertEqual(rows[1][1], "=SUM(A1:A2)")
+        self.assertEqual(workbook.active['B2'].data_type, 's')
+
+    def test_assessment_export(self):
+        body = self.export('assessment', 'csv')
+        self.assertEqual(len(body.decode().splitlines()), 2)
+
+    async def test_asgi_exports_stream_a_batch_at_a_time(self):
+        read = []
+        export_rows = ExportMixin.export_rows
+
+        def tracked_rows(view, queryset):
+            names, rows = export_rows(view, queryset)
+            return names, (read.append(row) or row for row in rows)
+
+        url = reverse('healthdata-export', kwargs={'export_format': 'ndjson'})
+        token = RefreshToken.for_user(self.user).access_token
+        with mock.patch.object(ExportMixin, 'export_rows', tracked_rows), mock.patch('example.exports.FLUSH_SIZE', 1):
+            response = await AsyncClient().get(url, headers={'Authorization': f'Bearer {token}'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.is_async)
+            # Django would have read a synchronous iterator to the end by now
+            first = await anext(aiter(response.streaming_content))
+            self.assertEqual(len(read), 1)
+            rest = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(b''.join([first, *rest]).decode().splitlines()), 7)
+
+    async def test_asgi_xlsx_exports_are_streamed(self):
+        from openpyxl import load_workbook
+
+        url = reverse('healthdata-export', kwargs={'export_format': 'xlsx'})
+        token = RefreshToken.for_user(self.user).access_token
+        response = await AsyncClient().get(url, headers={'Authorization': f'Bearer {token}'})
+        self.assertTrue(response.is_async)
+        self.assertIn('attachment', response['Content-Disposition'])
+        workbook = load_workbook(io.BytesIO(b''.join([chunk async for chunk in response.streaming_content])))
+        self.assertEqual(len(list(workbook.active.iter_rows())), 8)
+
+    def test_export_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('healthdata-export', kwargs={'export_format': 'csv'}))
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+
+class ChatRoomTests(TransactionTestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(email="patient@example.com", name="Patient", password="x")
+        self.stranger = User.objects.create_user(email="stranger@example.com", name="Stranger", password="x")
+        self.professional = Professional.objects.create(
+            user=User.objects.create_user(email="doctor@example.com", name="Doctor", password="x"),
+            specialization="Therapist", bio="")
+        self.room = f'{self.patient.id}-{self.professional.id}'
+        REGISTRY.clear()
+
+    @staticmethod
+    async def connect(room, user, consumer=ChatConsumer):
+        scope = {'type': 'websocket', 'path': f'/ws/chat/{room}/', 'headers': [], 'subprotocols': [],
+                 'user': user, 'url_route': {'args': (), 'kwargs': {'room': room}}}
+        communicator = ApplicationCommunicator(consumer.as_asgi(), scope)
+        await communicator.send_input({'type': 'websocket.connect'})
+        return communicator, await communicator.receive_output(5)
+
+    @staticmethod
+    async def disconnect(*communicators):
+        for communicator in communicators:
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(5)
+
+    def test_only_room_members_may_connect(self):
+        async def attempt():
+            accepted = []
+            for room, user in ((self.room, self.patient), (self.room, self.professional.user),
+                               (self.room, self.stranger), ('not-a-room', self.patient)):
+                communicator, event = await self.connect(room, user)
+                accepted.append(event['type'] == 'websocket.accept')
+                if accepted[-1]:
+                    await self.disconnect(communicator)
+            return accepted
+
+        self.assertEqual(async_to_sync(attempt)(), [True, True, False, False])
+
+    def test_messages_stay_in_their_room(self):
+        other = Professional.objects.create(
+            user=User.objects.create_user(email="other@example.com", name="Other", password="x"),
+            specialization="Therapist", bio="")
+
+        async def exchange():
+            patient, _ = await self.connect(self.room, self.patient)
+            doctor, _ = await self.connect(self.room, self.professional.user)
+            elsewhere, _ = await self.connect(f'{self.patient.id}-{other.id}', self.patient)
+            await patient.send_input({'type': 'websocket.receive', 'text': json.dumps({'message': 'hello'})})
+            received = [json.loads((await c.receive_output(5))['text']) for c in (patient, doctor)]
+            self.assertTrue(await elsewhere.receive_nothing(0.2))
+            await self.disconnect(patient, doctor, elsewhere)
+            return received
+
+        self.assertEqual(async_to_sync(exchange)(), [{'message': 'hello'}, {'message': 'hello'}])
+        self.assertEqual(REGISTRY.get('calm_ws_messages_total', consumer='chat', direction='in'), 1)
+        self.assertEqual(REGISTRY.get('calm_ws_handler_duration_seconds', consumer='chat', handler='receive').count, 1)
+
+    def test_bursts_are_coalesced_for_slow_sockets(self):
+        class SlowConsumer(ChatConsumer):
+            async def send_frame(self, messages):
+                await asyncio.sleep(0.02)
+                await super().send_frame(messages)
+
+        async def burst():
+            patient, _ = await self.connect(self.room, self.patient)
+            doctor, _ = await self.connect(self.room, self.professional.user, SlowConsumer)
+            for i in range(20):
+                await patient.send_input({'type': 'websocket.receive', 'text': json.dumps({'message': str(i)})})
+            messages, frames = [], 0
+            while len(messages) < 20:
+                body = json.loads((await doctor.receive_output(5))['text'])
+                messages.extend(body['messages'] if 'messages' in body else [body['message']])
+                frames += 1
+            await self.disconnect(patient, doctor)
+            return messages, frames
+
+        messages, frames = async_to_sync(burst)()
+        self.assertEqual(messages, [str(i) for i in range(20)])
+        self.assertLess(frames, 20)
+
+    def test_outbox_batches_while_sending_and_refuses_when_full(self):
+        batches = []
+
+        async def send(items):
+            batches.append(items)
+            await asyncio.sleep(0.01)
+
+        async def run():
+            outbox = Outbox(send, maxsize=5, max_batch=3)
+            self.assertTrue(outbox.put([1]))
+            await asyncio.sleep(0)
+            self.assertTrue(outbox.put([2, 3, 4, 5]))
+            self.assertFalse(outbox.put([6, 7]))
+            await outbox.flush()
+
+        async_to_sync(run)()
+        self.assertEqual(batches, [[1], [2, 3, 4], [5]])
+
+    def test_full_channel_layer_counts_dropped_messages(self):
+        async def overflow():
+            layer = MeteredInMemoryChannelLayer(capacity=2)
+            channel = await layer.new_channel('chat-hub.')
+            await layer.group_add('room', channel)
+            for i in range(3):
+                await layer.group_send('room', {'type': 'chat.batch', 'messages': [str(i)]})
+
+        async_to_sync(overflow)()
+        self.assertEqual(REGISTRY.get('calm_ws_dropped_total', channel='chat-hub'), 1)
+
+    def test_messages_are_saved_in_batches_and_flushed_on_disconnect(self):
+        async def converse():
+            patient, _ = await self.connect(self.room, self.patient)
+            for i in range(5):
+                await patient.send_input({'type': 'websocket.receive', 'text': json.dumps({'message': f'm{i}'})})
+                await patient.receive_output(5)
+            await self.disconnect(patient)
+
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(converse)()
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "chat_message_table"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(list(ChatMessage.objects.order_by('created_at').values_list('room', 'sender', 'body')),
+                         [(self.room, self.patient.id, f'm{i}') for i in range(5)])
+
+    def test_write_behind_flushes_on_size_and_retries_failures(self):
+        writes, failures = [], [1]
+
+        async def write(rows):
+            if failures:
+                failures.pop()
+                raise RuntimeError('database unavailable')
+            writes.append(rows)
+
+        async def run():
+            buffer = WriteBehind(write, max_rows=3, max_delay=60)
+            for i in range(3):
+                buffer.add(i)
+            await asyncio.sleep(0)
+            buffer.add(3)
+            await buffer.flush()
+            await asyncio.sleep(0)
+
+        with self.assertLogs('example.chat', 'ERROR'):
+            async_to_sync(run)()
+        self.assertEqual(writes, [[0, 1, 2, 3]])
+
+    def test_write_behind_retries_on_its_own_then_gives_up(self):
+        attempts = []
+
+        async def write(rows):
+            attempts.append(list(rows))
+            raise RuntimeError('database unavailable')
+
+        async def run():
+            buffer = WriteBehind(write, max_rows=100, max_delay=0.01, max_retries=2)
+            buffer.add(0)
+            buffer.add(1)
+            await asyncio.sleep(0.2)
+            return buffer.rows
+
+        with self.assertLogs('example.chat', 'ERROR') as logs:
+            pending = async_to_sync(run)()
+        self.assertEqual(attempts, [[0, 1]] * 3)
+        self.assertEqual(pending, [])
+        self.assertIn('Dropping 2 buffered rows', logs.output[-1])
+
+
+class ChatHistoryTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = User.objects.create_user(email="history@example.com", name="Patient", password="x")
+        self.professional = Professional.objects.create(
+            user=User.objects.create_user(email="histdoc@example.com", name="Doctor", password="x"),
+            specialization="Therapist", bio="")
+        self.room = f'{self.patient.id}-{self.professional.id}'
+        start = timezone.now()
+        ChatMessage.objects.bulk_create(
+            ChatMessage(room=self.room, sender=self.patient, body=f'm{i}', created_at=start + timezone.timedelta(seconds=i))
+            for i in range(5)
+        )
+        self.url = reverse('chat-message-list', kwargs={'room': self.room})
+
+    def test_history_pages_backwards_from_newest(self):
+        self.client.force_authenticate(user=self.professional.user)
+        first = self.client.get(self.url, {'page_size': 3})
+        self.assertEqual([row['body'] for row in first.data['results']], ['m4', 'm3', 'm2'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual([row['body'] for row in second.data['results']], ['m1', 'm0'])
+
+    def test_non_members_are_refused(self):
+        self.client.force_authenticate(user=User.objects.create_user(email="nosy@example.com", name="N",
+                                                                     password="x"))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProfilePictureTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        from PIL import Image
+        image = Image.new('RGB', (800, 400), 'red')
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'  # Make
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees to display
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        self.upload = buffer.getvalue()
+        user = User.objects.create_user(email="picture@example.com", name="Pictured", password="x")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.profile = Profile.objects.create(
+                user=user, bio="", location="Here", privacy_settings="Public",
+                profile_picture=SimpleUploadedFile('me.jpg', self.upload, content_type='image/jpeg'))
+        self.run_jobs(callbacks)
+        self.profile.refresh_from_db()
+        self.client = APIClient()
+
+    @staticmethod
+    def image_jobs(callbacks):
+        return [callback for callback in callbacks if getattr(callback, 'func', None) is images.submit]
+
+    def run_jobs(self, callbacks):
+        # Run the jobs the callbacks would submit to the thumbnail pool here
+        # instead, where the test transaction's rows are visible
+        for callback in self.image_jobs(callbacks):
+            callback.args[0](*callback.args[1:])
+
+    def test_serializer_lists_variant_urls(self):
+        response = self.client.get(reverse('profile-detail', kwargs={'pk': self.profile.pk}))
+        variants = response.data['profile_picture_variants']
+        self.assertEqual(set(variants), {'64.jpg', '64.webp', '256.jpg', '256.webp', '512.jpg', '512.webp'})
+        self.assertIn(f'/picture/256.webp/?v={self.profile.profile_picture_hash[:12]}', variants['256.webp'])
+        self.assertNotIn('profile_picture_hash', response.data)
+
+    def test_variants_are_square_stripped_and_cached(self):
+        from PIL import Image
+
+        url = reverse('profile-picture', kwargs={'pk': self.profile.pk, 'variant': '256.webp'})
+        response = self.client.get(url, HTTP_ACCEPT='image/webp')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        thumbnail = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (256, 256)))
+        self.assertFalse(thumbnail.getexif())
+
+        jpeg = Image.open(io.BytesIO(b''.join(self.client.get(
+            reverse('profile-picture', kwargs={'pk': self.profile.pk, 'variant': '64.jpg'})).streaming_content)))
+        self.assertEqual((jpeg.format, jpeg.size), ('JPEG', (64, 64)))
+        self.assertFalse(jpeg.getexif())
+
+        with mock.patch('example.images.render_variants') as render:
+            again = self.client.get(url)
+        render.assert_not_called()
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+    def test_unknown_variant_is_not_found(self):
+        response = self.client.get(f"{reverse('profile-detail', kwargs={'pk': self.profile.pk})}picture/100.jpg/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stored_original_is_upright_and_stripped(self):
+        from PIL import Image
+
+        self.profile.refresh_from_db()
+        with self.profile.profile_picture.open('rb') as stored:
+            original = Image.open(io.BytesIO(stored.read()))
+        self.assertEqual((original.format, original.size), ('JPEG', (400, 800)))
+        self.assertFalse(original.getexif())
+        with self.profile.profile_picture.open('rb') as stored:
+            self.assertEqual(images.content_hash(stored), self.profile.profile_picture_hash)
+
+    def test_uploads_are_stripped_off_the_request_and_published_after(self):
+        first = self.profile.profile_picture.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.profile.profile_picture = SimpleUploadedFile('new.jpg', self.upload, content_type='image/jpeg')
+            self.profile.save()
+        self.assertEqual(len(self.image_jobs(callbacks)), 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.profile_picture.name, first)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'profiles', 'incoming'))), 1)
+
+        self.run_jobs(callbacks)
+        self.profile.refresh_from_db()
+        self.assertNotEqual(self.profile.profile_picture.name, first)
+        self.assertFalse(self.profile.profile_picture.name.startswith('profiles/incoming/'))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'profiles', 'incoming')), [])
+
+    def test_slow_rendering_answers_503(self):
+        url = reverse('profile-picture', kwargs={'pk': self.profile.pk, 'variant': '512.jpg'})
+        with mock.patch('example.images.get_variant', side_effect=futures.TimeoutError):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '5')
+
+
+class JWTAuthTests(APITestCase):
+    def setUp(self):
+        authentication.get_principal_cache().clear()
+        authentication.get_denylist().clear()
+        self.user = User.objects.create_user(email="jwt@example.com", name="JWT User", password="password123")
+        self.client = APIClient()
+
+    def obtain(self):
+        response = self.client.post(reverse('token-obtain'), {'email': 'jwt@example.com', 'password': 'password123'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def user_queries(self, context):
+        return [q['sql'] for q in context.captured_queries if 'user_table' in q['sql']]
+
+    def test_wrong_password_is_rejected(self):
+        response = self.client.post(reverse('token-obtain'), {'email': 'jwt@example.com', 'password': 'nope'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_principal_skips_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.obtain()['access']}")
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get(reverse('feedback-list')).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self.client.get(reverse('feedback-list')).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.user_queries(first)), 1)
+        self.assertEqual(self.user_queries(second), [])
+
+    def test_saving_user_refreshes_principal(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.obtain()['access']}")
+        self.client.get(reverse('feedback-list'))
+        User.objects.filter(pk=self.user.pk).update(name="Stale")
+        self.user.name = "Renamed"
+        self.user.save()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('feedback-list'))
+        self.assertEqual(len(self.user_queries(context)), 1)
+
+    def test_revoked_tokens_are_rejected(self):
+        tokens = self.obtain()
+        response = self.client.post(reverse('token-revoke'), tokens, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get(reverse('feedback-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Other workers pick the revocation up from the table
+        authentication.get_denylist().clear()
+        self.assertIn(RefreshToken(tokens['refresh'])['jti'], authentication.get_denylist())
+
+    def test_refresh_issues_access_token(self):
+        response = self.client.post(reverse('token-refresh'), {'refresh': self.obtain()['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(reverse('feedback-list')).status_code, status.HTTP_200_OK)
+
+    def test_websocket_token_sources(self):
+        access = self.obtain()['access']
+        get_raw_token = JWTAuthMiddleware.get_raw_token
+        self.assertEqual(get_raw_token({'query_string': f'token={access}'.encode(), 'headers': []}), access.encode())
+        self.assertEqual(get_raw_token({'query_string': b'', 'headers': [(b'authorization', f'Bearer {access}'.encode())]}),
+                         access.encode())
+        self.assertIsNone(get_raw_token({'query_string': b'', 'headers': []}))
+        self.assertEqual(authentication.user_for_token(access.encode()).pk, self.user.pk)
+        self.assertFalse(authentication.user_for_token(b'not-a-token').is_authenticated)
+
+
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="async@example.com", name="Async User", password="password123")
+        pro_user = User.objects.create_user(email="asyncpro@example.com", name="Async Pro", password="password123")
+        self.professional = Professional.objects.create(user=pro_user, specialization="Therapist", bio="")
+        start = timezone.now()
+        for i in range(5):
+            HealthData.objects.create(user=self.user, mood="Calm", symptoms="" if i % 2 else "Headache")
+            Clinic.objects.create(name=f"Clinic {i}", address="1 St", phone="555", email=f"a{i}@example.com",
+                                  latitude="40.712776", longitude="-74.005974")
+            Appointment.objects.create(user=self.user, professional=self.professional, status="scheduled",
+                                       start_time=start + timezone.timedelta(hours=i),
+                                       end_time=start + timezone.timedelta(hours=i, minutes=30))
+
+    def test_pages_match_the_sync_endpoints(self):
+        for basename in ('professional', 'clinic', 'appointment', 'healthdata'):
+            with self.subTest(basename):
+                sync = self.client.get(reverse(f'{basename}-list'), {'page_size': 2}).json()
+                page = self.client.get(reverse(f'async-{basename}-list'), {'page_size': 2}).json()
+                self.assertEqual(page['results'], sync['results'])
+                following = self.client.get(page['next']).json() if page['next'] else {'results': []}
+                sync_following = self.client.get(sync['next']).json() if sync['next'] else {'results': []}
+                self.assertEqual(following['results'], sync_following['results'])
+
+    def test_retrieve_matches_the_sync_endpoint(self):
+        clinic = Clinic.objects.first()
+        response = self.client.get(reverse('async-clinic-detail', kwargs={'pk': clinic.pk}))
+        self.assertEqual(response.json(), self.client.get(reverse('clinic-detail', kwargs={'pk': clinic.pk})).json())
+        missing = self.client.get(reverse('async-clinic-detail', kwargs={'pk': 10 ** 9}))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filters(self):
+        other = User.objects.create_user(email="asyncother@example.com", name="Other", password="password123")
+        HealthData.objects.create(user=other, mood="Low", symptoms="")
+        response = self.client.get(reverse('async-healthdata-list'), {'user': other.pk})
+        self.assertEqual([row['mood'] for row in response.json()['results']], ["Low"])
+        self.assertEqual(self.client.get(reverse('async-healthdata-list'), {'user': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('async-clinic-list'), {'latitude': 'north'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_viewset_permissions_apply(self):
+        url = reverse('async-healthdata-list')
+        with mock.patch.object(views.HealthDataViewSet, 'get_permissions', lambda view: [IsAuthenticated()]):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertTrue(response.has_header('WWW-Authenticate'))
+            token = RefreshToken.for_user(self.user).access_token
+            response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_object_permissions_apply_to_retrieve(self):
+        other = User.objects.create_user(email="asyncother@example.com", name="Other", password="password123")
+        row = HealthData.objects.create(user=other, mood="Low", symptoms="")
+        self.client.force_authenticate(user=self.user)
+        with mock.patch.object(views.HealthDataViewSet, 'get_permissions',
+                               lambda view: [IsAuthenticated(), IsOwner()]):
+            response = self.client.get(reverse('async-healthdata-detail', kwargs={'pk': row.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_served_natively_under_asgi(self):
+        response = await AsyncClient().get(reverse('async-clinic-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    def route(self, request, write=False):
+        # Where a read made at the end of the request would go
+        def view(request):
+            if write:
+                ReplicaRouter().db_for_write(Clinic)
+            request.routed_to = ReplicaRouter().db_for_read(Clinic)
+            return HttpResponse()
+        response = ReplicaStickinessMiddleware(view)(request)
+        return request.routed_to, response
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Clinic), 'default')
+
+    def test_safe_reads_go_to_a_replica(self):
+        routed_to, response = self.route(RequestFactory().get('/'))
+        self.assertEqual(routed_to, 'replica')
+        self.assertNotIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+
+    def test_unsafe_methods_and_transactions_use_the_primary(self):
+        self.assertEqual(self.route(RequestFactory().post('/'))[0], 'default')
+        with transaction.atomic():
+            self.assertEqual(self.route(RequestFactory().get('/'))[0], 'default')
+
+    def test_a_write_pins_the_rest_of_the_request_and_the_next_ones(self):
+        routed_to, response = self.route(RequestFactory().get('/'), write=True)
+        self.assertEqual(routed_to, 'default')
+        cookie = response.cookies[ReplicaStickinessMiddleware.cookie_name]
+
+        request = RequestFactory().get('/')
+        request.COOKIES[cookie.key] = cookie.value
+        self.assertEqual(self.route(request)[0], 'default')
+        request.COOKIES[cookie.key] = str(time.time() - 1)
+        self.assertEqual(self.route(request)[0], 'replica')
+
+
+class BenchmarkTests(APITestCase):
+    def test_seed_dataset_fills_every_model_with_consistent_rows(self):
+        counts = bench.scaled_counts(0.0005)
+        bench.seed_dataset(counts, random.Random(0), batch_size=100)
+        self.assertEqual(User.objects.count(), counts['users'])
+        self.assertEqual(HealthData.objects.count(), counts['health_data'])
+        self.assertEqual(Appointment.objects.count(), counts['appointments'])
+        # Explicit timestamps survive bulk_create, and auto_now is restored afterwards
+        oldest = HealthData.objects.order_by('created_at').first().created_at
+        self.assertLess(oldest, timezone.now() - timezone.timedelta(days=1))
+        self.assertTrue(HealthData._meta.get_field('created_at').auto_now_add)
+        room = ChatMessage.objects.values_list('room', flat=True).first()
+        self.assertIsNotNone(parse_room(room))
+
+    def test_compare_flags_slower_latency_and_extra_queries(self):
+        stats = {'p50_ms': 10.0, 'p99_ms': 20.0, 'rps': 100.0, 'queries_mean': 3.0}
+        baseline = {'endpoints': {'clinic:list': stats}}
+        self.assertEqual(bench.compare({'endpoints': {'clinic:list': dict(stats, p50_ms=11.0)}}, baseline), [])
+        regressions = bench.compare({'endpoints': {'clinic:list': dict(stats, p99_ms=30.0, queries_mean=4.0)}},
+                                    baseline)
+        self.assertEqual([metric for _, metric, _, _ in regressions], ['p99_ms', 'queries_mean'])
+
+
+class ColdStartTests(APITestCase):
+    def test_parse_importtime(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     django.utils.version\n'
+            'import time:       300 |        420 |   django\n'
+            'Some warning\n'
+        )
+        modules = coldstart.parse_importtime(stderr)
+        self.assertEqual(modules, {'django.utils.version': (120, 120), 'django': (300, 420)})
+        self.assertAlmostEqual(coldstart.by_package(modules)['django'], 0.00042)
+
+    def test_wsgi_cold_start_serves_without_loading_channels(self):
+        result = coldstart.run_probe(['/api/_metrics'])
+        self.assertEqual(result['responses'][0]['status'], 200)
+        self.assertIn('example.views', result['imports'])
+        self.assertFalse([name for name in result['imports'] if name.partition('.')[0] == 'channels'])
+        self.assertNotIn('example.consumer', result['imports'])
+
+    def test_filterset_class_is_built_once_per_view(self):
+        user = User.objects.create_user(email='filter@example.com', name='Filter', password='x')
+        self.client.force_authenticate(user)
+        with mock.patch.dict(CachedFilterBackend._filterset_classes, clear=True):
+            self.client.get(reverse('healthdata-list'), {'user': user.pk})
+            built = dict(CachedFilterBackend._filterset_classes)
+            self.client.get(reverse('healthdata-list'), {'user': user.pk})
+            self.assertEqual(CachedFilterBackend._filterset_classes, built)
+            self.assertTrue(any(filterset_class is not None for filterset_class in built.values()))
+
+
+class AssessmentScoringTests(APITestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(email="patient@example.com", name="Patient", password="x")
+        clinician = User.objects.create_user(email="clinician@example.com", name="Clinician", password="x")
+        Professional.objects.create(user=clinician, specialization="Psychiatrist", bio="Bio")
+        self.clinician = clinician
+
+    def test_score_batch_totals_and_bands(self):
+        phq9 = scoring.INSTRUMENTS['PHQ-9']
+        scores, bands = scoring.score_batch(phq9, [bytes([3] * 9), bytes(9), bytes([1] * 5 + [0] * 4)])
+        self.assertEqual(scores.tolist(), [27, 0, 5])
+        self.assertEqual([phq9.labels[band] for band in bands.tolist()], ['severe', 'minimal', 'mild'])
+        with self.assertRaises(ValueError):
+            phq9.encode([4] * 9)
+
+    def test_create_scores_the_responses(self):
+        self.client.force_authenticate(self.patient)
+        response = self.client.post(reverse('assessment-list'), {'type': 'GAD-7', 'responses': [2, 2, 2, 2, 1, 1, 0]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['score'], 10)
+        self.assertEqual(response.data['severity'], 'moderate')
+        self.assertEqual(response.data['responses'], [2, 2, 2, 2, 1, 1, 0])
+        self.assertEqual(response.data['user'], self.patient.pk)
+        self.assertEqual(Assessment.objects.get().result, 'Score 10 (moderate)')
+
+        response = self.client.post(reverse('assessment-list'), {'type': 'GAD-7', 'responses': [1, 2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('responses', response.data)
+
+    def test_bulk_scores_in_batches_and_threshold_filter_uses_scores(self):
+        self.client.force_authenticate(self.patient)
+        rows = [{'type': 'PHQ-9', 'responses': [answer] * 9} for answer in (0, 1, 2, 3)]
+        rows.append({'type': 'PHQ-9', 'responses': [9] * 9})
+        response = self.client.post(reverse('assessment-bulk'), rows, format='json')
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(response.data['errors'][0]['index'], 4)
+        self.assertEqual(sorted(Assessment.objects.values_list('score', flat=True)), [0, 9, 18, 27])
+
+        response = self.client.get(reverse('assessment-list'), {'type': 'PHQ-9', 'score__gte': 15})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.clinician)
+        response = self.client.get(reverse('assessment-list'), {'type': 'PHQ-9', 'score__gte': 15})
+        self.assertEqual(sorted(row['score'] for row in response.data['results']), [18, 27])
+
+    def test_patients_read_only_their_own_assessments(self):
+        other = User.objects.create_user(email="other@example.com", name="Other", password="x")
+        mine = Assessment.objects.create(user=self.patient, type='PHQ-9', responses=bytes([1] * 9))
+        theirs = Assessment.objects.create(user=other, type='PHQ-9', responses=bytes([3] * 9))
+        self.assertEqual(self.client.get(reverse('assessment-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.patient)
+        response = self.client.get(reverse('assessment-list'), {'user': other.pk})
+        self.assertEqual(response.data['results'], [])
+        response = self.client.get(reverse('assessment-list'))
+        self.assertEqual([row['id'] for row in response.data['results']], [mine.pk])
+        response = self.client.get(reverse('assessment-detail', args=[theirs.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(self.clinician)
+        response = self.client.get(reverse('assessment-detail', args=[theirs.pk]))
+        self.assertEqual(response.data['score'], 27)
+
+    def test_scored_instruments_accept_a_result_without_responses(self):
+        self.client.force_authenticate(self.patient)
+        response = self.client.post(reverse('assessment-list'), {'type': 'PHQ-9', 'result': 'Score 12 (paper)'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertIsNone(response.data['score'])
+        self.assertEqual(response.data['result'], 'Score 12 (paper)')
+
+        response = self.client.post(reverse('assessment-list'), {'type': 'PHQ-9'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('result', response.data)
+
+    def test_cohort_stats_and_flagged_users(self):
+        now = timezone.now()
+        other = User.objects.create_user(email="other@example.com", name="Other", password="x")
+        for user, answers in ((self.patient, [3] * 9), (self.patient, [1] * 9), (other, [2] * 9), (other, [0] * 9)):
+            Assessment.objects.create(user=user, type='PHQ-9', responses=bytes(answers))
+        Assessment.objects.create(user=other, type='Mood', result='Fine')
+
+        self.client.force_authenticate(self.patient)
+        self.assertEqual(self.client.get(reverse('assessment-cohort'), {'type': 'PHQ-9'}).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.clinician)
+        stats = self.client.get(reverse('assessment-cohort'), {'type': 'PHQ-9', 'period': 'day'}).data
+        self.assertEqual(stats['count'], 4)
+        self.assertEqual(stats['mean'], 13.5)
+        self.assertEqual(stats['percentiles']['p50'], 9)
+        self.assertEqual(stats['severity'], {'minimal': 1, 'mild': 1, 'moderate': 0, 'moderately severe': 1,
+                                             'severe': 1})
+        self.assertEqual(len(stats['trend']), 1)
+        self.assertEqual(stats['trend'][0]['count'], 4)
+
+        response = self.client.get(reverse('assessment-flagged'), {'type': 'PHQ-9', 'threshold': 15})
+        self.assertEqual([(row['user'], row['score']) for row in response.data['users']],
+                         [(self.patient.pk, 27), (other.pk, 18)])
+        response = self.client.get(reverse('assessment-flagged'), {
+            'type': 'PHQ-9', 'threshold': 15, 'since': (now + timezone.timedelta(hours=1)).isoformat()})
+        self.assertEqual(response.data['users'], [])
+
+        response = self.client.get(reverse('assessment-flagged'), {'type': 'PHQ-9', 'threshold': 0})
+        self.assertEqual([row['user'] for row in response.data['users']], [self.patient.pk, other.pk])
+        response = self.client.get(reverse('assessment-flagged'), {'type': 'PHQ-9', 'threshold': -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IndexAdvisorTests(APITestCase):
+    def test_plan_steps_are_classified(self):
+        self.assertEqual(advisor._sqlite_step('SCAN health_data_table')[:2], ('health_data_table', advisor.FULL_SCAN))
+        self.assertEqual(advisor._sqlite_step('SCAN clinic_table USING INDEX clinic_created_id_idx')[1:3],
+                         (advisor.INDEX_WALK, 'clinic_created_id_idx'))
+        self.assertEqual(advisor._sqlite_step('SEARCH clinic_table USING INDEX clinic_name_created_idx (name=?)')[1:3],
+                         (None, 'clinic_name_created_idx'))
+        self.assertEqual(advisor._sqlite_step('USE TEMP B-TREE FOR ORDER BY')[1], advisor.SORT)
+        step = advisor._mysql_step({'table': 'clinic_table', 'type': 'ALL', 'key': None, 'rows': 5000,
+                                    'extra': 'Using where; Using filesort'})
+        self.assertEqual(step[:3], ('clinic_table', advisor.FULL_SCAN, None))
+
+    def test_suggestions_follow_filters_then_keyset_order(self):
+        columns = advisor.suggest_columns(HealthData, ['user'], ['-created_at'])
+        self.assertEqual(columns, ['user_id', 'created_at', 'id'])
+        indexes = advisor.table_indexes(connection, HealthData._meta.db_table)
+        self.assertEqual(advisor.covering_index(indexes, columns), 'health_data_user_created_idx')
+        self.assertIsNone(advisor.covering_index(indexes, ['mood']))
+
+    # Planner choices on near-empty tables are only predictable on SQLite
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_filtered_pages_use_the_composite_indexes(self):
+        user = User.objects.create_user(email="plan@example.com", name="Plan", password="x")
+        for queryset, index in ((HealthData.objects.filter(user=user), 'health_data_user_created_idx'),
+                                (Clinic.objects.filter(name='Calm'), 'clinic_name_created_idx')):
+            sql, params = queryset.order_by('-created_at', '-id')[:51].query.sql_with_params()
+            plan = advisor.explain(connection, sql, params)
+            self.assertIn(index, {step[2] for step in plan})
+            self.assertNotIn(advisor.SORT, {step[1] for step in plan})
+
+    def test_sql_lists_nothing_when_the_schema_is_current(self):
+        out = io.StringIO()
+        call_command('index_advisor', '--sql', stdout=out)
+        self.assertEqual(out.getvalue(), '')
+
+
+def _take_tokens(path, attempts, results):
+    store = ratelimit.SharedMemoryBuckets(path=path, slots=64)
+    results.put(sum(store.take('feedback|user:1', 0.001, 10)[0] for _ in range(attempts)))
+
+
+class RateLimitTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="limited@example.com", name="Limited", password="x")
+        self.client.force_authenticate(user=self.user)
+
+    def limit(self, **rates):
+        return override_settings(RATE_LIMIT={'BACKEND': 'example.ratelimit.LocalBuckets', 'RATES': rates})
+
+    def test_rates_parse_like_drf(self):
+        self.assertEqual(ratelimit.parse_rate('30/min'), (0.5, 30))
+        self.assertEqual(ratelimit.parse_rate('20/hour'), (20 / 3600, 20))
+
+    def test_buckets_are_shared_between_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'buckets')
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [context.Process(target=_take_tokens, args=(path, 10, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sum(results.get() for _ in workers), 10)
+
+        store = ratelimit.SharedMemoryBuckets(path=path, slots=64)
+        allowed, wait = store.take('feedback|user:1', 0.5, 10)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 2, delta=0.1)
+        self.assertTrue(store.take('feedback|user:2', 0.5, 10)[0])
+        store.clear()
+        self.assertTrue(store.take('feedback|user:1', 0.5, 10)[0])
+
+    def test_writes_over_the_limit_get_429_with_retry_after(self):
+        url = reverse('feedback-list')
+        with self.limit(feedback='2/min'):
+            for _ in range(2):
+                self.assertEqual(self.client.post(url, {'user': self.user.pk, 'message': 'Hi'}, format='json')
+                                 .status_code, status.HTTP_201_CREATED)
+            response = self.client.post(url, {'user': self.user.pk, 'message': 'Hi'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '30')
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+            other = User.objects.create_user(email="other@example.com", name="Other", password="x")
+            self.client.force_authenticate(user=other)
+            self.assertEqual(self.client.post(url, {'user': other.pk, 'message': 'Hi'}, format='json').status_code,
+                             status.HTTP_201_CREATED)
+        self.assertGreaterEqual(REGISTRY.get('calm_http_rejected_total', reason='throttled', scope='feedback'), 1)
+
+    def test_anonymous_sign_ups_are_limited_per_address(self):
+        self.client.force_authenticate(user=None)
+        data = {"name": "New", "email": "new@example.com", "password": "newpassword123"}
+        with self.limit(users='1/hour'):
+            self.assertEqual(self.client.post(reverse('user-list'), data, format='json').status_code,
+                             status.HTTP_201_CREATED)
+            response = self.client.post(reverse('user-list'), {**data, "email": "again@example.com"}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            response = self.client.post(reverse('user-list'), {**data, "email": "elsewhere@example.com"},
+                                        format='json', REMOTE_ADDR='10.0.0.2')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_forwarded_for_is_only_trusted_behind_proxies(self):
+        self.client.force_authenticate(user=None)
+        data = {"name": "New", "password": "newpassword123"}
+        url = reverse('user-list')
+        with self.limit(users='1/hour'):
+            self.client.post(url, {**data, "email": "first@example.com"}, format='json')
+            response = self.client.post(url, {**data, "email": "spoofed@example.com"}, format='json',
+                                        HTTP_X_FORWARDED_FOR='203.0.113.9')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+            with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+                # The proxy appends the address it saw; whatever the client sent comes before it
+                response = self.client.post(url, {**data, "email": "proxied@example.com"}, format='json',
+                                            HTTP_X_FORWARDED_FOR='203.0.113.9, 198.51.100.7')
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+                response = self.client.post(url, {**data, "email": "again@example.com"}, format='json',
+                                            HTTP_X_FORWARDED_FOR='203.0.113.10, 198.51.100.7')
+                self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class LoadSheddingTests(APITestCase):
+    def test_rolling_histogram_forgets_old_observations(self):
+        histogram = RollingHistogram(LATENCY_BUCKETS, window=10, slices=10)
+        with mock.patch('example.metrics.time.monotonic', return_value=100.0):
+            histogram.observe(3.0)
+        with mock.patch('example.metrics.time.monotonic', return_value=105.0):
+            histogram.observe(0.01)
+            self.assertEqual(histogram.snapshot().count, 2)
+        with mock.patch('example.metrics.time.monotonic', return_value=111.0):
+            window = histogram.snapshot()
+        self.assertEqual(window.count, 1)
+        self.assertLessEqual(window.quantile(0.99), 0.01)
+
+    @override_settings(LOAD_SHEDDING={'MIN_SAMPLES': 5, 'P99_SECONDS': 1, 'RETRY_AFTER': 7})
+    def test_slow_responses_shed_writes_but_not_reads(self):
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+        for _ in range(5):
+            middleware.latency.observe(4.0)
+        response = middleware(RequestFactory().post('/api/feedback/'))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(middleware(RequestFactory().get('/api/feedback/')).status_code, status.HTTP_200_OK)
+
+    @override_settings(LOAD_SHEDDING={'MAX_IN_FLIGHT': 1})
+    def test_writes_over_the_in_flight_limit_are_shed(self):
+        def view(request):
+            # A second request arriving while this one is still running
+            nested = middleware(RequestFactory().post('/api/healthdata/'))
+            return HttpResponse(status=nested.status_code)
+        middleware = LoadSheddingMiddleware(view)
+        self.assertEqual(middleware(RequestFactory().get('/')).status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(middleware.in_flight, 0)
+        self.assertEqual(middleware.latency.snapshot().count, 0)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="sparse@example.com", name="Sparse", password="x")
+        self.client.force_authenticate(user=self.user)
+        pro_user = User.objects.create_user(email="pro@example.com", name="Doctor Pro", password="x")
+        self.professional = Professional.objects.create(user=pro_user, specialization="Therapist")
+        start = timezone.now()
+        for hours in range(3):
+            Appointment.objects.create(user=self.user, professional=self.professional,
+                                       start_time=start + timezone.timedelta(hours=hours),
+                                       end_time=start + timezone.timedelta(hours=hours, minutes=30))
+
+    def test_fields_trim_the_output_and_the_select(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('appointment-list'), {'fields': 'id,status'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status'})
+        select = next(query['sql'] for query in queries if 'FROM "appointment_table"' in query['sql'])
+        self.assertNotIn('"appointment_table"."end_time"', select)
+
+    def test_expanded_relations_are_inlined_without_extra_queries(self):
+        url = reverse('appointment-list')
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as expanded:
+            response = self.client.get(url, {'expand': 'user,professional.user',
+                                             'fields': 'id,professional.specialization,professional.user.name'})
+        self.assertEqual(len(expanded), len(plain))
+        item = response.data['results'][0]
+        self.assertEqual(item['user'], {'id': self.user.pk, 'name': 'Sparse', 'email': 'sparse@example.com'})
+        self.assertEqual(item['professional'], {'specialization': 'Therapist', 'user': {'name': 'Doctor Pro'}})
+        self.assertNotIn('start_time', item)
+        select = next(query['sql'] for query in expanded if 'FROM "appointment_table"' in query['sql'])
+        self.assertNotIn('"password"', select)
+
+    def test_detail_and_fast_list_paths_honour_fields(self):
+        response = self.client.get(reverse('professional-detail', args=[self.professional.pk]),
+                                   {'expand': 'user', 'fields': 'specialization'})
+        self.assertEqual(response.data, {'user': {'id': self.professional.user_id, 'name': 'Doctor Pro',
+                                                  'email': 'pro@example.com'},
+                                         'specialization': 'Therapist'})
+        HealthData.objects.create(user=self.user, mood="calm", symptoms="none")
+        response = self.client.get(reverse('healthdata-list'), {'fields': 'id,mood'})
+        self.assertEqual(response.data['results'], [{'id': HealthData.objects.get().pk, 'mood': 'calm'}])
+        response = self.client.get(reverse('healthdata-list'), {'expand': 'user', 'fields': 'mood'})
+        self.assertEqual(response.data['results'][0]['user']['name'], 'Sparse')
+
+    def test_pages_still_link_with_trimmed_columns(self):
+        url = reverse('appointment-list')
+        response = self.client.get(url, {'fields': 'id', 'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(set(response.data['results'][0]), {'id'})
+
+    def test_fields_combine_with_search(self):
+        response = self.client.get(reverse('user-list'), {'search': 'doctor', 'fields': 'name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'name': 'Doctor Pro'}])
+        response = self.client.get(reverse('appointment-list'), {'search': 'doctor', 'expand': 'user',
+                                                                 'fields': 'id'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_unknown_fields_and_relations_are_rejected(self):
+        url = reverse('appointment-list')
+        self.assertEqual(self.client.get(url, {'fields': 'nope'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'expand': 'status'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'fields': 'professional.bio'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('user-list'), {'fields': 'password'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class RendererTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="wire@example.com", name="Wire", password="x")
+        self.client.force_authenticate(user=self.user)
+        HealthData.objects.bulk_create([HealthData(user=self.user, mood=f"mood {i}", symptoms="headache, fatigue")
+                                        for i in range(40)])
+
+    def test_fast_json_matches_drf_byte_for_byte(self):
+        moment = timezone.now()
+        data = {'aware': moment, 'naive': moment.replace(tzinfo=None), 'day': moment.date(), 'n': 1.5,
+                'price': decimal.Decimal('1.10'), 'id': uuid.UUID(int=7), 'text': 'caf\u00e9 \u2028 \u2603',
+                1: [None, True], 'rows': AssessmentSerializer([], many=True).data}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_fast_json_edge_cases(self):
+        # Exponents are spelled differently but decode to the same floats
+        data = {'big': 1e16, 'small': 1.5e-7}
+        self.assertEqual(FastJSONRenderer().render(data), b'{"big":1e16,"small":1.5e-7}')
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        data = {'wide': 2 ** 70, 'n': 1}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_msgpack_is_negotiated_from_accept(self):
+        import msgpack
+
+        url = reverse('healthdata-list')
+        expected = self.client.get(url, {'page_size': 5}).json()
+        response = self.client.get(url, {'page_size': 5}, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+    def test_msgpack_request_bodies(self):
+        import msgpack
+
+        response = self.client.post(reverse('feedback-list'), msgpack.packb({'user': self.user.pk, 'message': 'Hi'}),
+                                    content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        rows = [{'mood': 'calm', 'symptoms': 'none'}, {'mood': 'sad', 'symptoms': 'fatigue'}]
+        response = self.client.post(reverse('healthdata-bulk'), msgpack.packb(rows),
+                                    content_type='application/msgpack')
+        self.assertEqual(response.data['created'], 2)
+        response = self.client.post(reverse('feedback-list'), b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(MessagePackParser.renderer_class, MessagePackRenderer)
+
+    def test_large_bodies_are_gzipped(self):
+        url = reverse('healthdata-list')
+        plain = self.client.get(url, {'page_size': 40})
+        self.assertNotIn('Content-Encoding', plain)
+        response = self.client.get(url, {'page_size': 40}, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        small = self.client.get(url, {'page_size': 1}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)
+
+    def test_weak_etags_from_gzip_still_revalidate(self):
+        for index in range(20):
+            Clinic.objects.create(name=f"Clinic {index}", address="1 St", phone="555",
+                                  email=f"clinic{index}@example.com", latitude=1.0, longitude=2.0)
+        url = reverse('clinic-list')
+        etag = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -0,0 +1,159 @@
+import re
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import HealthData, HealthTrend
+
+SYMPTOM_SEPARATORS = re.compile(r'[,;\n]+')
+VALUE_MAX_LENGTH = HealthTrend._meta.get_field('value').max_length
+
+
+def bucket_start(moment, period):
+    day = timezone.localtime(moment).date() if timezone.is_aware(moment) else moment.date()
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def symptom_values(symptoms):
+    values = (part.strip().lower() for part in SYMPTOM_SEPARATORS.split(symptoms or ''))
+    return {value[:VALUE_MAX_LENGTH] for value in values if value}
+
+
+def contributions(rows):
+    """
+    Count what ``(user_id, created_at, mood, symptoms)`` rows add to each
+    ``(user_id, period, bucket, kind, value)`` rollup key.
+    """
+    counts = Counter()
+    for user_id, created_at, mood, symptoms in rows:
+        values = [(HealthTrend.MOOD, (mood or '')[:VALUE_MAX_LENGTH])]
+        values += [(HealthTrend.SYMPTOM, value) for value in symptom_values(symptoms)]
+        for period in HealthTrend.PERIODS:
+            bucket = bucket_start(created_at, period)
+            for kind, value in values:
+                counts[user_id, period, bucket, kind, value] += 1
+    return counts
+
+
+def as_rows(entries):
+    return [(entry.user_id, entry.created_at, entry.mood, entry.symptoms) for entry in entries]
+
+
+def apply(counts, sign=1):
+    """Add (or with ``sign=-1`` subtract) ``counts`` to the stored rollups."""
+    if sign < 0:
+        for key, delta in counts.items():
+            rollup = _rollup(key)
+            rollup.filter(count__lte=delta).delete()
+            rollup.update(count=F('count') - delta)
+        return
+
+    # Existing rollups get an atomic F() increment; new ones are inserted in
+    # one bulk_create per (user, period, bucket), which is what a batch of
+    # fresh entries mostly produces.
+    scopes = defaultdict(dict)
+    for (user_id, period, bucket, kind, value), delta in counts.items():
+        scopes[user_id, period, bucket][kind, value] = delta
+
+    for (user_id, period, bucket), deltas in scopes.items():
+        existing = set(HealthTrend.objects.filter(user_id=user_id, period=period, bucket=bucket)
+                       .values_list('kind', 'value'))
+        missing = []
+        for (kind, value), delta in deltas.items():
+            if (kind, value) in existing:
+                _increment((user_id, period, bucket, kind, value), delta)
+            else:
+                missing.append(HealthTrend(user_id=user_id, period=period, bucket=bucket,
+                                           kind=kind, value=value, count=delta))
+        if not missing:
+            continue
+        try:
+            with transaction.atomic():
+                HealthTrend.objects.bulk_create(missing)
+        except IntegrityError:
+            # Another writer created some of these rows first; add to theirs
+            for rollup in missing:
+                _increment((user_id, period, bucket, rollup.kind, rollup.value), rollup.count)
+
+
+def _rollup(key):
+    user_id, period, bucket, kind, value = key
+    return HealthTrend.objects.filter(user_id=user_id, period=period, bucket=bucket, kind=kind, value=value)
+
+
+def _increment(key, delta):
+    if _rollup(key).update(count=F('count') + delta):
+        return
+    user_id, period, bucket, kind, value = key
+    try:
+        with transaction.atomic():
+            HealthTrend.objects.create(user_id=user_id, period=period, bucket=bucket,
+                                       kind=kind, value=value, count=delta)
+    except IntegrityError:
+        _rollup(key).update(count=F('count') + delta)
+
+
+def record(entries):
+    apply(contributions(as_rows(entries)))
+
+
+def forget(entries):
+    apply(contributions(as_rows(entries)), sign=-1)
+
+
+def read(user_id, period, start=None, end=None):
+    """
+    Return the rollup buckets for one user, oldest first.
+
+    Cost grows with the number of buckets, not with the user's history.
+    """
+    rollups = HealthTrend.objects.filter(user_id=user_id, period=period)
+    if start is not None:
+        rollups = rollups.filter(bucket__gte=bucket_start(start, period))
+    if end is not None:
+        rollups = rollups.filter(bucket__lte=end.date() if hasattr(end, 'date') else end)
+
+    buckets = defaultdict(lambda: {'total': 0, 'moods': {}, 'symptoms': {}})
+    for bucket, kind, value, count in rollups.order_by('bucket').values_list('bucket', 'kind', 'value', 'count'):
+        entry = buckets[bucket]
+        if kind == HealthTrend.MOOD:
+            entry['moods'][value] = count
+            entry['total'] += count
+        else:
+            entry['symptoms'][value] = count
+    return [{'bucket': bucket.isoformat(), **entry} for bucket, entry in buckets.items()]
+
+
+def recompute(chunk_size=2000):
+    """
+    Yield ``(user_id, counts)`` recomputed from the raw HealthData rows.
+
+    Rows are streamed in user order so only one user's counts are held at once.
+    """
+    rows = (HealthData.objects.order_by('user_id')
+            .values_list('user_id', 'created_at', 'mood', 'symptoms')
+            .iterator(chunk_size=chunk_size))
+    current, pending = None, []
+    for row in rows:
+        if row[0] != current and pending:
+            yield current, contributions(pending)
+            pending = []
+        current = row[0]
+        pending.append(row)
+    if pending:
+        yield current, contributions(pending)
+
+
+def stored(user_id):
+    return Counter({
+        (user_id, period, bucket, kind, value): count
+        for period, bucket, kind, value, count in HealthTrend.objects.filter(user_id=user_id)
+        .values_list('period', 'bucket', 'kind', 'value', 'count')
+    })
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import asyncviews, views
 
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet)
@@ -11,7 +11,25 @@ router.register(r'feedback', views.FeedbackViewSet, basename='feedback')
 router.register(r'professionals', views.ProfessionalViewSet)
 router.register(r'appointments', views.AppointmentViewSet)
 router.register(r'clinics', views.ClinicViewSet)
+router.register(r'chat/(?P<room>[^/.]+)/messages', views.ChatMessageViewSet, basename='chat-message')
+
+# Async list/retrieve for the hottest reads; served without a thread per request under ASGI
+async_urlpatterns = [
+    path('async/professionals/', asyncviews.AsyncProfessionalView.as_view(), name='async-professional-list'),
+    path('async/professionals/<int:pk>/', asyncviews.AsyncProfessionalView.as_view(), name='async-professional-detail'),
+    path('async/clinics/', asyncviews.AsyncClinicView.as_view(), name='async-clinic-list'),
+    path('async/clinics/<int:pk>/', asyncviews.AsyncClinicView.as_view(), name='async-clinic-detail'),
+    path('async/appointments/', asyncviews.AsyncAppointmentView.as_view(), name='async-appointment-list'),
+    path('async/appointments/<int:pk>/', asyncviews.AsyncAppointmentView.as_view(), name='async-appointment-detail'),
+    path('async/healthdata/', asyncviews.AsyncHealthDataView.as_view(), name='async-healthdata-list'),
+    path('async/healthdata/<int:pk>/', asyncviews.AsyncHealthDataView.as_view(), name='async-healthdata-detail'),
+]
 
 urlpatterns = [
+    path('_metrics', views.metrics, name='metrics'),
+    path('token/', views.TokenObtainView.as_view(), name='token-obtain'),
+    path('token/refresh/', views.TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/revoke/', views.TokenRevokeView.as_view(), name='token-revoke'),
+    *async_urlpatterns,
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,19 +1,92 @@
-from django.http import Http404
-from rest_framework import viewsets, filters, permissions, status
+import hmac
+import math
+from collections import Counter
+from concurrent import futures
+from datetime import datetime, time, timedelta
+from types import GeneratorType
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import mixins, viewsets, filters, permissions, serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed, NotFound, PermissionDenied, ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django_filters.rest_framework import DjangoFilterBackend
-from .models import User, Profile, Assessment, HealthData, Feedback, Professional, Appointment, Clinic
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .models import (User, Profile, Assessment, HealthData, HealthTrend, Feedback, Professional, Appointment, Clinic,
+                     ChatMessage)
 from .serializers import (UserSerializer, ProfileSerializer, AssessmentSerializer, HealthDataSerializer,
-                          FeedbackSerializer, ProfessionalSerializer, AppointmentSerializer, ClinicSerializer)
-from .permissions import IsOwner, IsProfessionalOrReadOnly
+                          HealthDataBulkSerializer, FeedbackSerializer, ProfessionalSerializer,
+                          AppointmentSerializer, ClinicSerializer, ChatMessageSerializer)
+from .permissions import IsOwner, IsProfessional, IsProfessionalOrReadOnly
+from . import authentication
+from . import chat
+from . import geo
+from . import images
+from . import scoring
+from . import trends as health_trends
+from .availability import availability
+from .cache import CachedResponseMixin
+from .exports import ExportMixin, ExportRenderer
+from .fastpath import FastListMixin
+from .filters import CachedFilterBackend
+from .metrics import REGISTRY, PhaseTimingMixin
+from .parsers import FastJSONParser, MessagePackParser, NDJSONParser
+from .search import IndexedSearchFilter
+from .sparse import SparseFieldsMixin
 from rest_framework.permissions import IsAuthenticated
 
 
-class UserViewSet(viewsets.ModelViewSet):
+def query_number(request, name, default, cast, maximum, allow_zero=False):
+    """Read a positive (or, with ``allow_zero``, non-negative) number from the query string, capped at ``maximum``."""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        value = cast(value)
+    except ValueError:
+        raise ValidationError({name: 'A number is required.'})
+    # float() accepts "nan" and "inf", which compare false against every bound
+    if not math.isfinite(value):
+        raise ValidationError({name: 'A finite number is required.'})
+    if value < 0 or (value == 0 and not allow_zero):
+        raise ValidationError({name: 'Must be zero or more.' if allow_zero else 'Must be greater than zero.'})
+    return min(value, maximum)
+
+
+def query_instrument(request):
+    instrument = scoring.INSTRUMENTS.get(request.query_params.get('type'))
+    if instrument is None:
+        raise ValidationError({'type': f'Choose one of {", ".join(scoring.INSTRUMENTS)}.'})
+    return instrument
+
+
+def query_datetime(request, name):
+    value = request.query_params.get(name)
+    try:
+        parsed = parse_datetime(value) if value else None
+    except ValueError:
+        # Well formed but impossible, such as February 30th
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'An ISO 8601 datetime is required.'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class UserViewSet(PhaseTimingMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    throttle_scope = 'users'
+    filter_backends = [CachedFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['id', 'email']
     search_fields = ['name', 'email']
     ordering_fields = ['id', 'name', 'email']
@@ -25,10 +98,10 @@ class UserViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ProfileViewSet(viewsets.ModelViewSet):
+class ProfileViewSet(PhaseTimingMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [CachedFilterBackend, IndexedSearchFilter]
     filterset_fields = ['user']
     search_fields = ['user__name', 'location']
 
@@ -44,27 +117,207 @@ class ProfileViewSet(viewsets.ModelViewSet):
             return Response({'error': 'You are not allowed to delete this profile.'}, status=403)
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=True, methods=['get'], url_path=r'picture/(?P<variant>\d+\.(?:jpg|webp))', url_name='picture',
+            renderer_classes=[JSONRenderer, ExportRenderer])
+    def picture(self, request, pk=None, variant=None):
+        # Square thumbnail of the profile picture, rendered on first request and cached by content hash
+        if variant not in images.VARIANTS:
+            raise Http404
+        profile = self.get_object()
+        if not profile.profile_picture:
+            raise Http404
+        if not profile.profile_picture_hash:
+            # Pictures uploaded before hashes were recorded
+            profile.profile_picture_hash = images.content_hash(profile.profile_picture)
+            Profile.objects.filter(pk=profile.pk).update(profile_picture_hash=profile.profile_picture_hash)
+
+        etag = f'"{profile.profile_picture_hash[:32]}-{variant}"'
+        if etag in {tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')}:
+            response = HttpResponseNotModified()
+        else:
+            try:
+                path = images.get_variant(profile, variant)
+            except images.InvalidImage:
+                raise NotFound('The profile picture could not be decoded.')
+            except futures.TimeoutError:
+                return Response({'detail': 'The picture is still being rendered; retry later.'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                headers={'Retry-After': str(images.RETRY_AFTER)})
+            response = FileResponse(open(path, 'rb'), content_type=images.content_type(variant))
+        response['ETag'] = etag
+        # Serializer URLs carry the hash, so those can be cached for good
+        if request.query_params.get('v') == profile.profile_picture_hash[:12]:
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'no-cache'
+        return response
 
-class AssessmentViewSet(viewsets.ReadOnlyModelViewSet):
+
+class AssessmentViewSet(PhaseTimingMixin, SparseFieldsMixin, ExportMixin, FastListMixin, mixins.CreateModelMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Assessment.objects.all()
     serializer_class = AssessmentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['user']
+    filter_backends = [CachedFilterBackend, filters.SearchFilter]
+    # type + created_at/score ranges are answered from the (type, created_at, score) index
+    filterset_fields = {'user': ['exact'], 'type': ['exact'], 'severity': ['exact'],
+                        'score': ['gte', 'lte'], 'created_at': ['gte', 'lt']}
+    # Filters that compare patients against each other
+    professional_filters = ('severity', 'score__gte', 'score__lte')
     search_fields = ['type']
+    bulk_max_rows = 10000
+    bulk_batch_size = 1000
+
+    def get_permissions(self):
+        if self.action in ('create', 'bulk', 'list', 'retrieve'):
+            return [permissions.IsAuthenticated()]
+        return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if IsProfessional().has_permission(self.request, self):
+            return queryset
+        return queryset.filter(user=self.request.user)
 
-class HealthDataViewSet(viewsets.ModelViewSet):
+    def filter_queryset(self, queryset):
+        if (any(name in self.request.query_params for name in self.professional_filters)
+                and not IsProfessional().has_permission(self.request, self)):
+            raise PermissionDenied('Only professionals can filter by severity or score.')
+        return super().filter_queryset(queryset)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['post'], parser_classes=[FastJSONParser, MessagePackParser, NDJSONParser])
+    def bulk(self, request):
+        # Accepts a JSON array or an NDJSON stream of assessments for the current user
+        rows = request.data
+        if not isinstance(rows, (list, GeneratorType)):
+            raise ValidationError({'detail': 'Expected a JSON array or an NDJSON stream.'})
+
+        serializer = AssessmentSerializer(context=self.get_serializer_context())
+        created, errors, batch = 0, [], []
+        with transaction.atomic():
+            for index, row in enumerate(rows):
+                if index >= self.bulk_max_rows:
+                    raise ValidationError({'detail': f'At most {self.bulk_max_rows} rows per request.'})
+                try:
+                    batch.append(Assessment(user=request.user, **serializer.run_validation(row)))
+                except ValidationError as exc:
+                    errors.append({'index': index, 'errors': exc.detail})
+                    continue
+                if len(batch) >= self.bulk_batch_size:
+                    # bulk_create skips save(), so each batch is scored here, one NumPy pass per instrument
+                    scoring.score_assessments(batch)
+                    created += len(Assessment.objects.bulk_create(batch))
+                    batch = []
+            if batch:
+                scoring.score_assessments(batch)
+                created += len(Assessment.objects.bulk_create(batch))
+
+        return Response({'created': created, 'errors': errors},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsProfessional])
+    def cohort(self, request):
+        # Score percentiles, severity bands and a trend for one instrument over the filtered assessments
+        instrument = query_instrument(request)
+        period = request.query_params.get('period', 'week')
+        if period not in HealthTrend.PERIODS:
+            raise ValidationError({'period': f'Choose one of {", ".join(HealthTrend.PERIODS)}.'})
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(scoring.cohort_stats(queryset, instrument, period))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsProfessional])
+    def flagged(self, request):
+        # Users who scored at least ?threshold= since ?since= (default: the start of this week)
+        instrument = query_instrument(request)
+        threshold = query_number(request, 'threshold', None, int, instrument.max_score, allow_zero=True)
+        if threshold is None:
+            raise ValidationError({'threshold': 'This parameter is required.'})
+        if 'since' in request.query_params:
+            since = query_datetime(request, 'since')
+        else:
+            today = timezone.localdate()
+            since = timezone.make_aware(datetime.combine(today - timedelta(days=today.weekday()), time.min))
+        limit = query_number(request, 'limit', 500, int, 5000)
+
+        rows = (Assessment.objects.filter(type=instrument.name, created_at__gte=since, score__gte=threshold)
+                .values('user').annotate(max_score=Max('score'), last_assessed=Max('created_at'))
+                .order_by('-max_score', 'user')[:limit])
+        return Response({'type': instrument.name, 'threshold': threshold, 'since': since,
+                         'users': [{'user': row['user'], 'score': row['max_score'],
+                                    'last_assessed': row['last_assessed']} for row in rows]})
+
+
+class HealthDataViewSet(PhaseTimingMixin, SparseFieldsMixin, ExportMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = HealthData.objects.all()
     serializer_class = HealthDataSerializer
+    throttle_scope = 'healthdata'
+    filter_backends = [CachedFilterBackend]
+    filterset_fields = ['user']
+    bulk_max_rows = 10000
+    bulk_batch_size = 1000
 
     def get_permissions(self):
-        if self.request.method in permissions.SAFE_METHODS:
+        if self.request.method in permissions.SAFE_METHODS and self.action not in ('export', 'trends'):
             return [permissions.AllowAny()]  # Allow GET, HEAD, OPTIONS
         return [permissions.IsAuthenticated()]  # Require authentication for other methods
 
+    @action(detail=False, methods=['post'], parser_classes=[FastJSONParser, MessagePackParser, NDJSONParser])
+    def bulk(self, request):
+        # Accepts a JSON array or an NDJSON stream of entries for the current user
+        rows = request.data
+        if not isinstance(rows, (list, GeneratorType)):
+            raise ValidationError({'detail': 'Expected a JSON array or an NDJSON stream.'})
+
+        serializer = HealthDataBulkSerializer(context=self.get_serializer_context())
+        created, errors, batch = 0, [], []
+        # bulk_create skips post_save, so the trend rollups are updated here, once per request
+        rollups = Counter()
+        with transaction.atomic():
+            for index, row in enumerate(rows):
+                if index >= self.bulk_max_rows:
+                    raise ValidationError({'detail': f'At most {self.bulk_max_rows} rows per request.'})
+                try:
+                    batch.append(HealthData(user=request.user, **serializer.run_validation(row)))
+                except ValidationError as exc:
+                    errors.append({'index': index, 'errors': exc.detail})
+                    continue
+                if len(batch) >= self.bulk_batch_size:
+                    created += len(HealthData.objects.bulk_create(batch))
+                    rollups.update(health_trends.contributions(health_trends.as_rows(batch)))
+                    batch = []
+            if batch:
+                created += len(HealthData.objects.bulk_create(batch))
+                rollups.update(health_trends.contributions(health_trends.as_rows(batch)))
+            health_trends.apply(rollups)
+
+        return Response({'created': created, 'errors': errors},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def trends(self, request):
+        # Precomputed mood/symptom counts per day, week or month for the current
+        # user; professionals may ask for any patient's with ?user=
+        period = request.query_params.get('period', 'day')
+        if period not in HealthTrend.PERIODS:
+            raise ValidationError({'period': f'Choose one of {", ".join(HealthTrend.PERIODS)}.'})
+
+        user_id = request.query_params.get('user', str(request.user.pk))
+        if not user_id.isdigit():
+            raise ValidationError({'user': 'A valid integer is required.'})
+        if int(user_id) != request.user.pk and not IsProfessional().has_permission(request, self):
+            raise PermissionDenied("Only professionals can read other users' trends.")
+
+        start = query_datetime(request, 'start') if 'start' in request.query_params else None
+        end = query_datetime(request, 'end') if 'end' in request.query_params else None
+        return Response({'user': int(user_id), 'period': period,
+                         'buckets': health_trends.read(user_id, period, start, end)})
+
 
-class FeedbackViewSet(viewsets.ModelViewSet):
+class FeedbackViewSet(PhaseTimingMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     serializer_class = FeedbackSerializer
+    throttle_scope = 'feedback'
     permission_classes = [IsAuthenticated]
     queryset = Feedback.objects.all()
 
@@ -85,43 +338,198 @@ class FeedbackViewSet(viewsets.ModelViewSet):
         if professional_id is not None:
             if not Professional.objects.filter(id=professional_id).exists():
                 raise Http404("Professional not found")  # This will return a 404 error
-            return queryset.filter(user__professional__id=professional_id)
+            return queryset.filter(user__professional_profile__id=professional_id)
         return queryset
 
 
-class ProfessionalViewSet(viewsets.ModelViewSet):
+class ProfessionalViewSet(PhaseTimingMixin, SparseFieldsMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Professional.objects.all()
     serializer_class = ProfessionalSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    cache_dependencies = (User,)
+    filter_backends = [CachedFilterBackend, IndexedSearchFilter]
     filterset_fields = ['user']
     search_fields = ['user__name', 'specialization']
 
+    availability_max_window = timedelta(days=31)
+
     def list(self, request, *args, **kwargs):
-        professionals = Professional.objects.all()
         start_time = request.query_params.get('start_time')
         end_time = request.query_params.get('end_time')
         if start_time and end_time:
-            appointments = Appointment.objects.filter(professional__in=professionals, start_time=start_time,
-                                                      end_time=end_time)
-            return Response({'professionals': professionals, 'appointments': appointments})
+            return self.availability(request)
         return super().list(request, *args, **kwargs)
 
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        # Free time per professional in [start_time, end_time), one appointment query per page
+        start = query_datetime(request, 'start_time')
+        end = query_datetime(request, 'end_time')
+        if start >= end:
+            raise ValidationError({'end_time': 'End time must be after start time.'})
+        if end - start > self.availability_max_window:
+            raise ValidationError({'end_time': 'The window may span at most 31 days.'})
+        slot_minutes = query_number(request, 'slot_minutes', None, int, 24 * 60)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        specialization = request.query_params.get('specialization')
+        if specialization:
+            queryset = queryset.filter(specialization__iexact=specialization)
+        queryset = queryset.select_related(None).only('id', 'specialization', 'created_at')
+
+        page = self.paginate_queryset(queryset)
+        professionals = page if page is not None else list(queryset)
+        free = availability([p.id for p in professionals], start, end, slot_minutes)
+
+        as_text = serializers.DateTimeField().to_representation
+        data = [
+            {
+                'professional': professional.id,
+                'specialization': professional.specialization,
+                'free': [{'start': as_text(s), 'end': as_text(e)} for s, e in free[professional.id]],
+            }
+            for professional in professionals
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
     # You might not need to override perform_create
     # def perform_create(self, serializer):
     #     serializer.save()
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(PhaseTimingMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [CachedFilterBackend, IndexedSearchFilter]
     filterset_fields = ['user', 'professional', 'status']
     search_fields = ['professional__user__name', 'status']
 
 
-class ClinicViewSet(viewsets.ModelViewSet):
+class ClinicViewSet(PhaseTimingMixin, SparseFieldsMixin, CachedResponseMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Clinic.objects.all()
     serializer_class = ClinicSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [CachedFilterBackend, filters.SearchFilter]
     filterset_fields = ['latitude', 'longitude', 'email', 'name']
     search_fields = ['name', 'email']
+    nearby_default_limit = 20
+    nearby_max_limit = 100
+    nearby_initial_radius_km = 10
+    nearby_max_radius_km = 1000
+
+    def list(self, request, *args, **kwargs):
+        if 'near' in request.query_params:
+            return self.nearby(request)
+        return super().list(request, *args, **kwargs)
+
+    def nearby(self, request):
+        # ?near=lat,lng[&radius_km=][&limit=]: closest clinics first, via the geo_cell index
+        lat, lng = self._parse_near(request.query_params['near'])
+        limit = query_number(request, 'limit', self.nearby_default_limit, int, self.nearby_max_limit)
+        queryset = self.filter_queryset(self.get_queryset())
+
+        if 'radius_km' in request.query_params:
+            radius = query_number(request, 'radius_km', None, float, self.nearby_max_radius_km)
+            results = geo.nearest(queryset, lat, lng, radius, limit)
+        else:
+            # No radius given: widen the search until enough clinics are found
+            radius = self.nearby_initial_radius_km
+            results = geo.nearest(queryset, lat, lng, radius, limit)
+            while len(results) < limit and radius < self.nearby_max_radius_km:
+                radius = min(radius * 4, self.nearby_max_radius_km)
+                results = geo.nearest(queryset, lat, lng, radius, limit)
+
+        data = []
+        for distance, clinic in results:
+            item = self.get_serializer(clinic).data
+            item['distance_km'] = round(distance, 3)
+            data.append(item)
+        return Response(data)
+
+    @staticmethod
+    def _parse_near(value):
+        try:
+            lat, lng = (float(part) for part in value.split(','))
+        except ValueError:
+            raise ValidationError({'near': 'Expected "lat,lng".'})
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValidationError({'near': 'Coordinates out of range.'})
+        return lat, lng
+
+
+class ChatMessageViewSet(PhaseTimingMixin, SparseFieldsMixin, FastListMixin, viewsets.ReadOnlyModelViewSet):
+    # History of one chat room, newest first; follow "next" for older messages
+    queryset = ChatMessage.objects.all()
+    serializer_class = ChatMessageSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        room = chat.parse_room(self.kwargs['room'])
+        if room is None or not chat.is_member(self.request.user, *room):
+            raise PermissionDenied('You are not a member of this room.')
+        return super().get_queryset().filter(room=chat.room_name(*room))
+
+
+class TokenView(APIView):
+    # Callers have no token yet (or an expired one), so never try to authenticate them
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get_authenticate_header(self, request):
+        # Keep bad credentials a 401; DRF turns it into 403 without a challenge
+        return authentication.CachedJWTAuthentication().authenticate_header(request)
+
+    @staticmethod
+    def validated(token_class, raw_token):
+        try:
+            token = token_class(raw_token)
+        except TokenError as exc:
+            raise InvalidToken(exc.args[0])
+        authentication.check_not_revoked(token)
+        return token
+
+
+class TokenObtainView(TokenView):
+    """Exchange an email and password for a refresh and an access token."""
+    throttle_scope = 'token'
+
+    def post(self, request):
+        email, password = request.data.get('email'), request.data.get('password')
+        if not email or not password:
+            raise ValidationError({'detail': 'Email and password are required.'})
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            User().set_password(password)
+        if user is None or not user.check_password(password):
+            raise AuthenticationFailed('No account matches these credentials.')
+        refresh = RefreshToken.for_user(user)
+        return Response({'refresh': str(refresh), 'access': str(refresh.access_token)})
+
+
+class TokenRefreshView(TokenView):
+    def post(self, request):
+        refresh = self.validated(RefreshToken, request.data.get('refresh', ''))
+        return Response({'access': str(refresh.access_token)})
+
+
+class TokenRevokeView(TokenView):
+    """Log out: revoke the refresh token and, if given, its access token."""
+
+    def post(self, request):
+        tokens = [self.validated(RefreshToken, request.data.get('refresh', ''))]
+        if request.data.get('access'):
+            tokens.append(self.validated(AccessToken, request.data['access']))
+        for token in tokens:
+            authentication.revoke(token)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def metrics(request):
+    # Prometheus text exposition of this worker's request and WebSocket metrics,
+    # for scrapers on METRICS_ALLOWED_IPS or sending "Authorization: Bearer <METRICS_TOKEN>"
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'calmBackend.settings')
+    # The test client speaks plain HTTP, which the production settings redirect
+    default = 'api.test_settings' if sys.argv[1:2] == ['test'] else 'api.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: